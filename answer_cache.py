@@ -0,0 +1,200 @@
+"""Persistent cache of AI assistant answers.
+
+Answers are keyed on the normalized question plus the prompt-template
+version, expire after a TTL and are evicted least-recently-used once the
+table grows past max_entries, in batches. An optional term index
+(semantic=True) matches near-duplicate wordings of a question that is
+already cached.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_SIMILARITY = 0.8
+# Eviction trims the table to this share of max_entries, so it is counted
+# once per batch of new answers rather than on every put
+EVICT_TO = 0.9
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+# Words that change the wording of a question but not what is being asked.
+# Question words stay in: "when to sow wheat" and "how to sow wheat" differ
+STOPWORDS = frozenset('''
+    a an the i we my our me you your is are am be do does did can could should would will
+    to of on in for at by with from about and or please tell
+'''.split())
+
+
+def normalize_question(question):
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(normalized, version):
+    return hashlib.sha256(f"{version}\x00{normalized}".encode()).hexdigest()
+
+
+class TermIndex:
+    """In-memory inverted index of content words for fuzzy question lookup."""
+
+    def __init__(self):
+        self._terms = {}
+        self._postings = {}
+
+    @staticmethod
+    def terms(text):
+        return {word for word in text.split() if word not in STOPWORDS}
+
+    def add(self, key, text):
+        self.remove(key)
+        terms = self.terms(text)
+        self._terms[key] = terms
+        for term in terms:
+            self._postings.setdefault(term, set()).add(key)
+
+    def remove(self, key):
+        for term in self._terms.pop(key, ()):
+            postings = self._postings.get(term)
+            if postings:
+                postings.discard(key)
+                if not postings:
+                    del self._postings[term]
+
+    def best_match(self, text, threshold):
+        """Return (key, jaccard) of the closest indexed text, or (None, 0.0)."""
+        terms = self.terms(text)
+        overlap = {}
+        for term in terms:
+            for key in self._postings.get(term, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+        best_key, best_score = None, 0.0
+        for key, shared in overlap.items():
+            score = shared / (len(terms) + len(self._terms[key]) - shared)
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_score < threshold:
+            return None, 0.0
+        return best_key, best_score
+
+
+class AnswerCache:
+    def __init__(self, pool, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 semantic=False, similarity=DEFAULT_SIMILARITY):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._indexes = {} if semantic else None
+        # Rows in answer_cache as far as this process knows; other processes
+        # add rows too, so it is recounted before anything is evicted
+        self._rows = None
+
+    def _index(self, conn, version):
+        # Built lazily per prompt version from whatever is already cached
+        index = self._indexes.get(version)
+        if index is None:
+            index = TermIndex()
+            for row in conn.execute("SELECT key, question FROM answer_cache WHERE version = ?", (version,)):
+                index.add(row['key'], row['question'])
+            self._indexes[version] = index
+        return index
+
+    def _lookup(self, conn, key, now):
+        row = conn.execute("SELECT answer, created_at FROM answer_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row['created_at'] > self.ttl:
+            self._delete(conn, [key])
+            return None
+        conn.execute("UPDATE answer_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        return row['answer']
+
+    def _delete(self, conn, keys):
+        deleted = conn.executemany("DELETE FROM answer_cache WHERE key = ?", [(key,) for key in keys]).rowcount
+        if self._rows is not None:
+            self._rows -= max(deleted, 0)
+        if self._indexes is not None:
+            for index in self._indexes.values():
+                for key in keys:
+                    index.remove(key)
+
+    def get(self, question, version):
+        """Return a cached answer for question, or None on a miss."""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock, self.pool.connection() as conn:
+            answer = self._lookup(conn, cache_key(normalized, version), now)
+            if answer is not None:
+                self.hits += 1
+                return answer
+
+            if self._indexes is not None:
+                key, _ = self._index(conn, version).best_match(normalized, self.similarity)
+                if key is not None:
+                    answer = self._lookup(conn, key, now)
+                    if answer is not None:
+                        self.semantic_hits += 1
+                        return answer
+
+            self.misses += 1
+            return None
+
+    def put(self, question, version, answer):
+        normalized = normalize_question(question)
+        key = cache_key(normalized, version)
+        now = time.time()
+        with self._lock, self.pool.connection() as conn:
+            replaced = conn.execute("SELECT 1 FROM answer_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute('''INSERT OR REPLACE INTO answer_cache
+                            (key, version, question, answer, created_at, last_used, hits)
+                            VALUES (?, ?, ?, ?, ?, ?, 0)''',
+                         (key, version, normalized, answer, now, now))
+            if self._indexes is not None and version in self._indexes:
+                self._indexes[version].add(key, normalized)
+
+            if self._rows is None:
+                self._count_rows(conn)
+            elif not replaced:
+                self._rows += 1
+            if self._rows > self.max_entries:
+                self._evict(conn)
+
+    def _count_rows(self, conn):
+        self._rows = conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+
+    def _evict(self, conn):
+        """Drop least recently used answers down to EVICT_TO of max_entries."""
+        self._count_rows(conn)
+        if self._rows <= self.max_entries:
+            return
+        overflow = self._rows - int(self.max_entries * EVICT_TO)
+        evicted = [row['key'] for row in conn.execute(
+            "SELECT key FROM answer_cache ORDER BY last_used LIMIT ?", (overflow,))]
+        self._delete(conn, evicted)
+
+    def purge_expired(self):
+        with self._lock, self.pool.connection() as conn:
+            expired = [row['key'] for row in conn.execute(
+                "SELECT key FROM answer_cache WHERE created_at < ?", (time.time() - self.ttl,))]
+            self._delete(conn, expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
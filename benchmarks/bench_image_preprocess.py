@@ -0,0 +1,82 @@
+"""Compare upload size and latency of crop photos before and after prepare_image().
+
+    python benchmarks/bench_image_preprocess.py --megapixels 12 --bandwidth-kbps 512
+
+Upload time is simulated from the payload size and the given link speed;
+the model call uses the offline FakeGenerativeModel.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from fake_model import FakeGenerativeModel  # noqa: E402
+from images import MODEL_JPEG_QUALITY, MODEL_MAX_EDGE, prepare_image  # noqa: E402
+
+ORIENTATION_TAG = 0x0112
+
+
+def synthetic_photo(megapixels):
+    """A noisy gradient JPEG with an EXIF rotation, roughly like a phone photo."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    noise = Image.effect_noise((width, height), 64)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (noise, gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = 6
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=92, exif=exif)
+    return buf.getvalue()
+
+
+def run(label, payload_for, data, model, bandwidth_kbps, rounds):
+    timings = []
+    payload = b""
+    for _ in range(rounds):
+        start = time.perf_counter()
+        image, payload = payload_for(data)
+        model.generate_content(["Analyze this crop image.", image])
+        elapsed = time.perf_counter() - start
+        upload = len(payload) * 8 / (bandwidth_kbps * 1000)
+        timings.append(elapsed + upload)
+    print(f"{label:<8} {len(payload) / 1e6:>9.2f} MB {statistics.median(timings):>10.2f} s")
+
+
+def raw_payload(data):
+    return Image.open(io.BytesIO(data)), data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--bandwidth-kbps", type=float, default=512)
+    parser.add_argument("--max-edge", type=int, default=MODEL_MAX_EDGE)
+    parser.add_argument("--quality", type=int, default=MODEL_JPEG_QUALITY)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_photo(args.megapixels)
+    model = FakeGenerativeModel(delay=0)
+
+    print(f"{args.megapixels} MP photo, {args.bandwidth_kbps} kbps link, "
+          f"max edge {args.max_edge}, JPEG quality {args.quality}")
+    print(f"{'':<8} {'upload':>12} {'median e2e':>12}")
+    run("before", raw_payload, data, model, args.bandwidth_kbps, args.rounds)
+    run("after", lambda d: prepare_image(d, args.max_edge, args.quality),
+        data, model, args.bandwidth_kbps, args.rounds)
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        prepare_image(data, args.max_edge, args.quality)
+    print(f"prepare_image: {(time.perf_counter() - start) / args.rounds * 1000:.0f} ms per photo")
+
+
+if __name__ == "__main__":
+    main()
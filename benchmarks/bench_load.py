@@ -0,0 +1,283 @@
+"""Load-test the hot pages with simulated sessions driven by Streamlit's AppTest.
+
+    python benchmarks/bench_load.py --scale 1k --workers 4 --sessions 10
+    python benchmarks/bench_load.py --scale 100k --db /tmp/farm-100k.db --keep   # seed once...
+    python benchmarks/bench_load.py --db /tmp/farm-100k.db --no-seed            # ...then rerun
+
+Seeds a database with synthetic users, posts, comments, likes, products and
+prices (--scale 1k/100k/1m, or a number of posts), then starts --workers
+processes that each run --sessions sessions one after another against it,
+all with the offline stand-in model. A session opens the login page, signs
+in, and visits each of --pages. AppTest cannot run scripts from several
+threads of one process, so each worker is its own process with its own
+caches and connection pool, like separate server replicas sharing farm.db.
+
+Reports throughput, per-step latency percentiles measured inside the
+script, and each worker's peak RSS.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_PAGES = ("community", "products", "prices")
+PASSWORD = "bench-password"
+CROPS = ["Wheat", "Rice", "Onion", "Tomato", "Soybean", "Cotton", "Gram", "Tur", "Maize", "Jowar",
+         "Bajra", "Potato", "Turmeric", "Groundnut", "Sugarcane"]
+WORDS = ("wheat rice onion tomato soybean cotton rust blight aphids neem irrigation drip "
+         "harvest mandi price rain sowing fertilizer urea organic compost seed yield pest").split()
+PLACES_CSV = os.path.join(ROOT, "data", "india_places.csv")
+
+
+def _timestamp(start, i, count, days=365):
+    """Timestamps spread evenly over the last `days` days, oldest first."""
+    return (start + timedelta(seconds=i * days * 86400 / max(count, 1))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _photos(count):
+    from PIL import Image
+    from images import store_image
+
+    hashes = []
+    for i in range(count):
+        buf = io.BytesIO()
+        Image.new("RGB", (1600, 1200), (40 + 20 * i, 140, 60)).save(buf, "JPEG")
+        hashes.append(store_image(buf.getvalue()))
+    return hashes
+
+
+def seed(db_path, posts, login_users, seed_value=1):
+    """Fill db_path with synthetic data scaled from the number of posts; returns row counts."""
+    from credentials import hash_password
+    from migrations import migrate
+    import prices as price_data
+
+    rng = random.Random(seed_value)
+    users = max(100, posts // 20)
+    comments = posts
+    products = max(100, posts // 10)
+    price_rows = posts
+    start = datetime.now() - timedelta(days=365)
+    with open(PLACES_CSV, newline="", encoding="utf-8") as f:
+        places = [(row["name"], float(row["lat"]), float(row["lon"]))
+                  for row in csv.DictReader(f) if row["kind"] != "pincode"]
+    photos = _photos(5)
+
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    counts = {}
+    with conn:
+        # Signing in costs a full scrypt hash, so only the accounts sessions use get their own
+        shared = hash_password(PASSWORD)
+        conn.executemany("INSERT INTO users (name, contact, password) VALUES (?, ?, ?)",
+                         ((f"Farmer {i}", f"farmer{i}@example.com",
+                           hash_password(PASSWORD) if i <= login_users else shared)
+                          for i in range(1, users + 1)))
+        counts["users"] = users
+
+        # Post i gets i % 5 likes from consecutive users, so posts.likes matches the likes table
+        conn.executemany("INSERT INTO posts (user_id, content, image_hash, likes, created_at) VALUES (?, ?, ?, ?, ?)",
+                         ((rng.randint(1, users), _text(rng, rng.randint(8, 40)),
+                           photos[i % len(photos)] if i % 20 == 0 else None, i % 5,
+                           _timestamp(start, i, posts))
+                          for i in range(posts)))
+        conn.executemany("INSERT INTO likes (post_id, user_id) VALUES (?, ?)",
+                         ((i + 1, (i * 7 + j) % users + 1) for i in range(posts) for j in range(i % 5)))
+        counts["posts"] = posts
+        counts["likes"] = conn.execute("SELECT COUNT(*) FROM likes").fetchone()[0]
+
+        conn.executemany("INSERT INTO comments (post_id, user_id, content, created_at) VALUES (?, ?, ?, ?)",
+                         ((rng.randint(1, posts), rng.randint(1, users), _text(rng, rng.randint(4, 20)),
+                           _timestamp(start, i, comments))
+                          for i in range(comments)))
+        counts["comments"] = comments
+
+        def product(i):
+            name, lat, lon = places[i % len(places)]
+            return (rng.randint(1, users), f"{rng.choice(CROPS)} {rng.choice(['seed', 'harvest', 'tractor hire', 'compost'])}",
+                    _text(rng, 15), f"₹{rng.randint(100, 5000)}", name, f"98{i:08d}",
+                    photos[i % len(photos)] if i % 3 == 0 else None, lat, lon, _timestamp(start, i, products))
+        conn.executemany('''INSERT INTO products (user_id, name, description, price, location, contact,
+                                                  image_hash, lat, lon, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (product(i) for i in range(products)))
+        counts["products"] = products
+
+        markets = [name for name, _, _ in places[:max(2, min(len(places), price_rows // 2000))]]
+        per_day = len(markets) * len(CROPS)
+        today = datetime.now().date()
+
+        def price(i):
+            low = 1000 + rng.randint(0, 3000)
+            return (markets[i % len(markets)], CROPS[(i // len(markets)) % len(CROPS)], "Other",
+                    low, low + 400, low + 200, (today - timedelta(days=i // per_day)).isoformat())
+        conn.executemany('''INSERT OR IGNORE INTO prices (market, crop, variety, min_price, max_price, modal_price, date)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''', (price(i) for i in range(price_rows)))
+        price_data.refresh_rollups(conn)
+        counts["prices"] = price_rows
+    conn.execute("ANALYZE")
+    conn.close()
+    return counts
+
+
+def child(app, sessions, pages, login_users, worker):
+    """Runs in a worker process; prints one JSON line of step timings."""
+    import streamlit as st
+    from bench_startup import patch_apptest, session, timed_run
+
+    patch_apptest()
+    # Stop at st.rerun() instead of following it, so the login submit and the
+    # dashboard it leads to are timed as separate steps
+    st.rerun = st.stop
+
+    result = {"steps": {}, "errors": []}
+
+    def step(name, at):
+        try:
+            seconds = timed_run(at)
+        except RuntimeError as e:
+            result["errors"].append(f"{name}: {e}")
+        else:
+            result["steps"].setdefault(name, []).append(seconds)
+
+    started = time.perf_counter()
+    result["cold_start"] = timed_run(session(app))
+    for i in range(sessions):
+        user = (worker * sessions + i) % login_users + 1
+        at = session(app)
+        step("login", at)
+        at.text_input(key="login_contact").input(f"farmer{user}@example.com")
+        at.text_input(key="login_password").input(PASSWORD)
+        next(b for b in at.button if b.label == "Login").click()
+        step("login_submit", at)
+        if at.session_state["user_id"] is None:
+            result["errors"].append(f"login failed for farmer{user}")
+            continue
+        step("dashboard", at)
+        for page in pages:
+            at.session_state.page = page
+            step(page, at)
+    result["wall"] = time.perf_counter() - started
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+
+def _spawn(app, workdir, args, worker, sessions):
+    env = dict(os.environ, KRISHI_FAKE_MODEL="1", KRISHI_FAKE_MODEL_DELAY="0")
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--app", app,
+               "--sessions", str(sessions), "--pages", ",".join(args.pages),
+               "--login-users", str(args.login_users), "--worker", str(worker)]
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.PIPE, text=True)
+
+
+def _collect(process):
+    output, _ = process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"worker exited with {process.returncode}")
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:9.1f}"
+
+
+def report(results, wall, out=sys.stdout):
+    steps = {}
+    for result in results:
+        for name, samples in result["steps"].items():
+            steps.setdefault(name, []).extend(samples)
+    total = sum(len(samples) for samples in steps.values())
+    sessions = len(steps.get("login_submit", []))
+    print(f"{total} page runs, {sessions} sessions in {wall:.1f}s: "
+          f"{total / wall:.1f} runs/s, {sessions / wall:.2f} sessions/s", file=out)
+    print(f"\n{'step':<14}{'runs':>6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+          file=out)
+    for name, samples in steps.items():
+        samples = sorted(samples)
+        print(f"{name:<14}{len(samples):>6}{_ms(statistics.mean(samples))}{_ms(_percentile(samples, 0.5))}"
+              f"{_ms(_percentile(samples, 0.95))}{_ms(_percentile(samples, 0.99))}{_ms(samples[-1])}", file=out)
+    rss = [result["peak_rss_mb"] for result in results]
+    cold = [result["cold_start"] for result in results]
+    print(f"\nCold start per worker: median {statistics.median(cold) * 1000:.0f}ms", file=out)
+    print(f"Peak RSS per worker: max {max(rss):.0f} MB, total {sum(rss):.0f} MB", file=out)
+    errors = [error for result in results for error in result["errors"]]
+    for error in errors[:10]:
+        print(f"ERROR {error}", file=out)
+    return not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--scale", default="1k", help="1k, 100k, 1m or a number of posts")
+    parser.add_argument("--db", help="database to seed and test (default: a temporary one)")
+    parser.add_argument("--no-seed", action="store_true", help="use --db as it is")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=10, help="sessions per worker")
+    parser.add_argument("--pages", type=lambda value: value.split(","), default=list(DEFAULT_PAGES))
+    parser.add_argument("--login-users", type=int, default=20,
+                        help="accounts sessions sign in as, each with its own password hash")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+
+    if args.child:
+        child(app, args.sessions, args.pages, args.login_users, args.worker)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="load_")
+    try:
+        db_path = os.path.join(workdir, "farm.db")
+        if args.db:
+            db_path = os.path.abspath(args.db)
+            # The app opens farm.db in its working directory
+            os.symlink(db_path, os.path.join(workdir, "farm.db"))
+        if not args.no_seed:
+            posts = SCALES.get(args.scale.lower()) or int(args.scale)
+            started = time.perf_counter()
+            # Seeded photos go to the media/ directory the workers will read
+            os.environ["KRISHI_MEDIA_DIR"] = os.path.join(workdir, "media")
+            counts = seed(db_path, posts, args.login_users)
+            print(f"Seeded {', '.join(f'{n:,} {table}' for table, n in counts.items())} "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+        # One session-less run first so app startup (schema, seed rows) happens once
+        _collect(_spawn(app, workdir, args, 0, 0))
+        started = time.perf_counter()
+        processes = [_spawn(app, workdir, args, worker, args.sessions) for worker in range(args.workers)]
+        results = [_collect(process) for process in processes]
+        ok = report(results, time.perf_counter() - started)
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Flood the model client with calls to a stalled stand-in model and check it reports busy, not offline.
+
+    python benchmarks/bench_model_client.py --calls 32 --workers 4 --stall 2
+
+Every call to the offline stand-in (KRISHI_FAKE_MODEL_STALL) takes longer
+than the client's per-attempt timeout, so abandoned attempts pile up on
+the client's worker threads. Callers that time out behind them must get
+ModelBusy; ModelOffline would send their requests to the outbox although
+the link is fine. A last call with KRISHI_FAKE_MODEL_OFFLINE=1 checks that
+a real network error still reports ModelOffline.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_model import FakeGenerativeModel  # noqa: E402
+from model_client import ModelBusy, ModelClient, ModelOffline  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=32, help="concurrent calls, each with its own prompt")
+    parser.add_argument("--workers", type=int, default=4, help="the client's worker threads")
+    parser.add_argument("--stall", type=float, default=2.0, help="seconds each upstream call takes")
+    parser.add_argument("--timeout", type=float, default=0.5, help="per-attempt timeout")
+    args = parser.parse_args()
+
+    os.environ["KRISHI_FAKE_MODEL_STALL"] = str(args.stall)
+    client = ModelClient(FakeGenerativeModel(delay=0), rpm=0, timeout=args.timeout,
+                         deadline=args.timeout * 8, base_delay=0.05, max_workers=args.workers)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def call(i):
+        try:
+            client.generate_content(f"question {i}")
+            outcome = "answered"
+        except Exception as e:
+            outcome = type(e).__name__
+        with lock:
+            outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(args.calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"{args.calls} calls in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{count} {outcome}" for outcome, count in outcomes.most_common()))
+    if outcomes[ModelOffline.__name__] or client.offline:
+        raise AssertionError("a saturated worker pool was reported as an unreachable model")
+    if not outcomes[ModelBusy.__name__]:
+        raise AssertionError("no call was turned away as busy; raise --calls or --stall")
+
+    os.environ["KRISHI_FAKE_MODEL_STALL"] = "0"
+    os.environ["KRISHI_FAKE_MODEL_OFFLINE"] = "1"
+    try:
+        ModelClient(FakeGenerativeModel(delay=0), rpm=0, base_delay=0.01, deadline=1).generate_content("offline")
+    except ModelOffline:
+        print("Network errors still report ModelOffline")
+    else:
+        raise AssertionError("a network error did not report ModelOffline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measure scrypt cost per login and pick a work factor for a latency budget.
+
+    python benchmarks/bench_password_hash.py --budget-ms 250
+
+Prints single-hash latency and logins/sec per core for each n, the
+largest n that fits the budget, and the throughput of PasswordVerifier
+under a burst of concurrent logins at the configured parameters.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import credentials  # noqa: E402
+
+
+def time_hash(n, r, p, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        credentials.hash_password("correct horse battery staple", n=n, r=r, p=p)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=250)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-log2n", type=int, default=18)
+    parser.add_argument("--logins", type=int, default=40, help="burst size for the verifier pool")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    r, p = credentials.SCRYPT_R, credentials.SCRYPT_P
+    print(f"r={r} p={p}, {os.cpu_count()} CPU(s)")
+    print(f"{'n':>8} {'memory':>9} {'latency':>9} {'logins/s/core':>14}")
+    chosen = None
+    for log2n in range(12, args.max_log2n + 1):
+        n = 2 ** log2n
+        seconds = time_hash(n, r, p, args.rounds)
+        print(f"{'2^%d' % log2n:>8} {128 * n * r / 2 ** 20:>7.0f}MB {seconds * 1000:>7.1f}ms {1 / seconds:>14.1f}")
+        if seconds * 1000 <= args.budget_ms:
+            chosen = n
+        else:
+            break
+    if chosen:
+        print(f"Largest n within {args.budget_ms:.0f}ms: 2^{chosen.bit_length() - 1} "
+              f"(set KRISHI_SCRYPT_N={chosen})")
+
+    stored = credentials.hash_password("correct horse battery staple")
+    verifier = credentials.PasswordVerifier(max_workers=args.workers, cache_ttl=0)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.logins) as script_threads:
+        results = list(script_threads.map(lambda _: verifier.verify("correct horse battery staple", stored),
+                                          range(args.logins)))
+    elapsed = time.perf_counter() - started
+    assert all(results)
+    print(f"Burst of {args.logins} logins at n={credentials.SCRYPT_N} on {args.workers} workers: "
+          f"{elapsed:.2f}s, {args.logins / elapsed:.1f} logins/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Measure bulk price ingestion throughput on a synthetic Agmarknet-style CSV.
+
+    python benchmarks/bench_price_ingest.py --rows 10000000
+
+The CSV and database are written to a temporary directory and removed
+afterwards unless --keep is given.
+"""
+import argparse
+import csv
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prices as price_data  # noqa: E402
+from ingest_prices import ingest, read_records  # noqa: E402
+
+CROPS = ["Wheat", "Paddy(Dhan)(Common)", "Onion", "Tomato", "Soyabean", "Cotton", "Gram",
+         "Tur", "Maize", "Jowar", "Bajra", "Potato", "Turmeric", "Groundnut", "Sugarcane"]
+COLUMNS = ["State", "District", "Market", "Commodity", "Variety", "Grade", "Arrival_Date",
+           "Min_x0020_Price", "Max_x0020_Price", "Modal_x0020_Price"]
+
+
+def write_csv(path, rows, markets):
+    start = date(2015, 1, 1)
+    per_day = markets * len(CROPS)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(rows):
+            crop = CROPS[(i // markets) % len(CROPS)]
+            day = (start + timedelta(days=i // per_day)).strftime("%d/%m/%Y")
+            low = 1000 + i % 2000
+            writer.writerow(["Maharashtra", "Pune", f"Market {i % markets}", crop, "Other", "FAQ",
+                             day, low, low + 400, low + 200])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--markets", type=int, default=3000)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="price_ingest_")
+    csv_path = os.path.join(workdir, "prices.csv")
+    db_path = os.path.join(workdir, "farm.db")
+    try:
+        started = time.perf_counter()
+        write_csv(csv_path, args.rows, args.markets)
+        print(f"Generated {args.rows:,} rows ({os.path.getsize(csv_path) / 1e6:,.0f} MB) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        conn = sqlite3.connect(db_path)
+        stats = ingest(conn, read_records(csv_path), args.batch_size, refresh=False)
+        print(f"Ingested {stats['rows']:,} rows ({stats['rejected']:,} rejected) in {stats['seconds']:.1f}s: "
+              f"{stats['rows'] / stats['seconds']:,.0f} rows/s")
+
+        started = time.perf_counter()
+        with conn:
+            price_data.refresh_rollups(conn)
+        print(f"Rebuilt price rollups in {time.perf_counter() - started:.1f}s")
+        conn.close()
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Measure the scheme catalog on a synthetic catalog of central and state schemes.
+
+    python benchmarks/bench_schemes.py --schemes 5000 --profiles 1000
+
+Reports the import time, the cost of building the catalog and of the
+pickle round trip st.cache_data would make on every cache hit (which is
+why the page shares one catalog through st.cache_resource instead), and
+eligibility matching through the in-memory index against the same filter
+in SQL.
+"""
+import argparse
+import os
+import pickle
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schemes  # noqa: E402
+from db import connect  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+CROPS = ["Rice", "Wheat", "Cotton", "Soybean", "Sugarcane", "Onion", "Tomato", "Maize", "Jowar",
+         "Bajra", "Pulses", "Groundnut", "Turmeric", "Potato", "Banana", "Mango", "Tea", "Coffee"]
+
+SQL_MATCH = '''SELECT s.id FROM schemes s
+               WHERE {attributes}
+                 AND (s.min_land_ha IS NULL OR s.min_land_ha <= ?)
+                 AND (s.max_land_ha IS NULL OR s.max_land_ha >= ?)'''
+SQL_ATTRIBUTE = '''(NOT EXISTS (SELECT 1 FROM scheme_eligibility e
+                                WHERE e.scheme_id = s.id AND e.attribute = '{attribute}')
+                    OR EXISTS (SELECT 1 FROM scheme_eligibility e
+                               WHERE e.attribute = '{attribute}' AND e.value = ? AND e.scheme_id = s.id))'''
+
+
+def synthetic_schemes(count, rng):
+    for i in range(count):
+        # About a fifth are central schemes open to every state
+        states = [] if rng.random() < 0.2 else [rng.choice(schemes.STATES)]
+        crops = rng.sample(CROPS, rng.choice([0, 0, 1, 2, 3]))
+        categories = rng.sample(schemes.CATEGORIES[1:], 1) if rng.random() < 0.15 else []
+        max_land = rng.choice(["", "", "1", "2", "5"])
+        yield {"code": f"scheme-{i}", "name": f"Scheme {i}", "description": "Synthetic scheme " * 8,
+               "eligibility": "Synthetic eligibility text", "type": "government",
+               "states": ";".join(states), "crops": ";".join(crops), "categories": ";".join(categories),
+               "min_land_ha": "", "max_land_ha": max_land}
+
+
+def random_profile(rng):
+    return {"state": rng.choice(schemes.STATES), "crop": rng.choice(CROPS),
+            "category": rng.choice(schemes.CATEGORIES), "land_ha": rng.choice([0.5, 1.5, 3.0, 8.0])}
+
+
+def sql_eligible(conn, profile):
+    query = SQL_MATCH.format(attributes=" AND ".join(SQL_ATTRIBUTE.format(attribute=a) for a in schemes.ATTRIBUTES))
+    params = [profile[a] for a in schemes.ATTRIBUTES] + [profile["land_ha"]] * 2
+    return [row[0] for row in conn.execute(query, params)]
+
+
+def _ms(samples):
+    samples = sorted(samples)
+    return (f"p50 {statistics.median(samples) * 1000:7.3f}ms  "
+            f"p95 {samples[int(0.95 * (len(samples) - 1))] * 1000:7.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--schemes", type=int, default=5000)
+    parser.add_argument("--profiles", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    workdir = tempfile.mkdtemp(prefix="schemes_")
+    try:
+        conn = connect(os.path.join(workdir, "farm.db"))
+        migrate(conn)
+        started = time.perf_counter()
+        with conn:
+            count = schemes.import_schemes(conn, synthetic_schemes(args.schemes, rng))
+        print(f"Imported {count:,} schemes in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        catalog = schemes.load_catalog(conn)
+        print(f"Built the catalog of {len(catalog):,} schemes in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        started = time.perf_counter()
+        blob = pickle.dumps(catalog)
+        pickle.loads(blob)
+        print(f"Pickle round trip (what st.cache_data adds per hit): {(time.perf_counter() - started) * 1000:.1f}ms, "
+              f"{len(blob) / 1e6:.1f} MB")
+
+        profiles = [random_profile(rng) for _ in range(args.profiles)]
+        index_times, sql_times = [], []
+        for profile in profiles:
+            started = time.perf_counter()
+            matches = catalog.eligible(profile)
+            index_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            expected = sql_eligible(conn, profile)
+            sql_times.append(time.perf_counter() - started)
+            if sorted(s["id"] for s in matches) != sorted(expected):
+                raise AssertionError(f"index and SQL disagree for {profile}")
+        print(f"Eligibility, inverted index: {_ms(index_times)}")
+        print(f"Eligibility, SQL:            {_ms(sql_times)}")
+        conn.close()
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
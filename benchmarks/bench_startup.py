@@ -0,0 +1,146 @@
+"""Measure cold start and per-rerun latency of the app with Streamlit's AppTest.
+
+    python benchmarks/bench_startup.py --reruns 20
+    python benchmarks/bench_startup.py --app /path/to/old/checkout/app.py
+
+Each scenario runs in a fresh interpreter against a temporary working
+directory (so farm.db and media/ start empty), with the offline stand-in
+model. Reports the first run of the login page on a new and an existing
+database, the median and p95 of login-page reruns, the first render and
+reruns of each signed-in page, and which heavy modules the login page
+pulled in.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("google.generativeai", "PIL.Image")
+PAGES = ("dashboard", "assistant", "analysis", "community", "products", "schemes", "prices")
+
+# AppTest polls for script completion every 100ms, so runs are timed inside
+# the script by this wrapper instead of around at.run()
+WRAPPER = """
+import runpy, time
+import bench_startup
+started = time.perf_counter()
+try:
+    runpy.run_path({app!r}, run_name="__main__")
+finally:
+    bench_startup.TIMINGS.append(time.perf_counter() - started)
+"""
+TIMINGS = []
+
+
+def patch_apptest():
+    """Work around AppTest limitations in the Streamlit version pinned here."""
+    import streamlit.testing.v1.local_script_runner as local_script_runner
+    from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+
+    def wait_for_run(runner, timeout=3):
+        # The stock wait returns on SCRIPT_STOPPED_*, which can race the SHUTDOWN event
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            # AppTest next reads client_state from the SHUTDOWN event's data;
+            # events is appended before event_data
+            if (runner.events and runner.events[-1] == ScriptRunnerEvent.SHUTDOWN
+                    and len(runner.event_data) == len(runner.events)):
+                return
+            time.sleep(0.001)
+        runner.request_stop()
+        runner.join()
+        raise RuntimeError(f"AppTest script run timed out after {timeout}s")
+
+    local_script_runner.require_widgets_deltas = wait_for_run
+
+
+def timed_run(at):
+    """Run at and return the script's own run time in seconds."""
+    import bench_startup
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return bench_startup.TIMINGS[-1]
+
+
+def session(app, **state):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_string(WRAPPER.format(app=app), default_timeout=60)
+    for key, value in state.items():
+        at.session_state[key] = value
+    return at
+
+
+def child(app, reruns):
+    """Runs in the fresh interpreter; prints one JSON line of timings."""
+    patch_apptest()
+    sys.path[:0] = [os.path.dirname(app), os.path.dirname(os.path.abspath(__file__))]
+
+    result = {}
+    at = session(app)
+    result["login_first"] = timed_run(at)
+    result["heavy_after_login"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    result["login_reruns"] = [timed_run(at) for _ in range(reruns)]
+
+    # A fresh AppTest per rerun: same server-side work as a rerun, without
+    # carrying one page's widget state into the next
+    user = {"user_id": 1, "user_name": "Bench"}
+    for page in PAGES:
+        first = timed_run(session(app, page=page, **user))
+        result[page] = [first, [timed_run(session(app, page=page, **user)) for _ in range(reruns)]]
+    print(json.dumps(result))
+
+
+def _spawn(app, workdir, reruns):
+    env = dict(os.environ, KRISHI_FAKE_MODEL="1", KRISHI_FAKE_MODEL_DELAY="0")
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--app", app,
+                             "--reruns", str(reruns)],
+                            cwd=workdir, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:8.1f}ms"
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"median {_ms(statistics.median(samples))}  p95 {_ms(p95)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+
+    if args.child:
+        child(app, args.reruns)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="startup_") as workdir:
+        fresh = _spawn(app, workdir, args.reruns)
+        # Second process on the database the first one created
+        warm = _spawn(app, workdir, args.reruns)
+
+    print(f"Login page, new process + new database:      {_ms(fresh['login_first'])}")
+    print(f"Login page, new process + existing database: {_ms(warm['login_first'])}")
+    print(f"Login page reruns:                           {_summary(warm['login_reruns'])}")
+    print(f"Heavy modules loaded by the login page:      {', '.join(warm['heavy_after_login']) or 'none'}")
+    print()
+    print(f"{'page':<10} {'first render':>12}   reruns")
+    for page in PAGES:
+        first, reruns = warm[page]
+        print(f"{page:<10} {_ms(first):>12}   {_summary(reruns)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Sync two kiosk replicas through a stand-in central instance and check they converge.
+
+    python benchmarks/bench_sync.py --posts 500 --likes 2000 --prices 5000
+
+Starts `sync.py serve` on a temporary central database in a subprocess,
+bootstraps two empty kiosks from it, then lets both kiosks post, comment,
+like, list products and register (one contact on both) while offline.
+After the kiosks sync, all three replicas must hold the same rows, every
+like must be counted once in posts.likes, and every photo must be on
+every replica. Reports the time of each round and the bytes on the wire
+against the uncompressed JSON.
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import images  # noqa: E402
+import metrics  # noqa: E402
+import sync  # noqa: E402
+from db import ConnectionPool, connect  # noqa: E402
+from likes import like_post  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+MARKETS = ["Pune", "Mumbai", "Nashik", "Nagpur", "Indore", "Jaipur"]
+CROPS = ["Wheat", "Rice", "Onion", "Tomato", "Soybean", "Cotton", "Maize", "Potato"]
+
+
+class Replica:
+    def __init__(self, workdir, name):
+        self.name = name
+        self.path = os.path.join(workdir, f"{name}.db")
+        self.media = os.path.join(workdir, f"{name}-media")
+        conn = connect(self.path)
+        migrate(conn)
+        conn.close()
+        self.pool = ConnectionPool(self.path, size=2)
+
+    def use_media(self):
+        # One process plays every kiosk; the image store follows whichever is active
+        images.MEDIA_DIR = self.media
+
+
+def _photo(rng):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), tuple(rng.randrange(256) for _ in range(3))).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def add_user(conn, name, contact):
+    return conn.execute("INSERT INTO users (name, contact, password) VALUES (?, ?, ?)",
+                        (name, contact, "x")).lastrowid
+
+
+def offline_activity(replica, rng, args):
+    """What farmers do at one kiosk while it has no link."""
+    replica.use_media()
+    with replica.pool.connection() as conn:
+        users = [add_user(conn, f"{replica.name} farmer {i}", f"{replica.name}-{i}") for i in range(20)]
+        # Registered on both kiosks while offline; merged into one account
+        users.append(add_user(conn, "Travelling farmer", "shared-contact"))
+        posts = [row[0] for row in conn.execute("SELECT id FROM posts")]
+        for i in range(args.posts):
+            image_hash = images.store_image(_photo(rng)) if i % 10 == 0 else None
+            posts.append(conn.execute("INSERT INTO posts (user_id, content, image_hash) VALUES (?, ?, ?)",
+                                      (rng.choice(users), f"{replica.name} post {i}", image_hash)).lastrowid)
+        for i in range(args.posts):
+            conn.execute("INSERT INTO comments (post_id, user_id, content) VALUES (?, ?, ?)",
+                         (rng.choice(posts), rng.choice(users), f"{replica.name} comment {i}"))
+        for _ in range(args.likes):
+            like_post(conn, rng.choice(posts), rng.choice(users))
+        for i in range(args.posts // 5):
+            conn.execute('''INSERT INTO products (user_id, name, description, price, location, contact, image_hash)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (rng.choice(users), f"{replica.name} product {i}", "Fresh produce", "₹100/kg", "Pune",
+                          "98xxxxxx", images.store_image(_photo(rng)) if i % 5 == 0 else None))
+
+
+def central_activity(replica, rng, args):
+    with replica.pool.connection() as conn:
+        users = [add_user(conn, f"central farmer {i}", f"central-{i}") for i in range(20)]
+        for i in range(args.posts):
+            conn.execute("INSERT INTO posts (user_id, content) VALUES (?, ?)",
+                         (rng.choice(users), f"central post {i}"))
+        rows = [(MARKETS[i % len(MARKETS)], CROPS[(i // len(MARKETS)) % len(CROPS)], "",
+                 1000 + i % 500, 1500 + i % 500, 1250 + i % 500,
+                 f"2024-{1 + (i // 48) % 12:02d}-{1 + (i // 576) % 28:02d}")
+                for i in range(args.prices)]
+        conn.executemany('''INSERT OR IGNORE INTO prices (market, crop, variety, min_price, max_price, modal_price, date)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+
+
+def snapshot(replica):
+    """Everything that must agree across replicas, named without local ids."""
+    with replica.pool.connection() as conn:
+        users = {row[0] for row in conn.execute("SELECT contact FROM users")}
+        posts = {(row[0], row[1], row[2]) for row in conn.execute(
+            "SELECT u.contact, p.content, p.image_hash FROM posts p JOIN users u ON u.id = p.user_id")}
+        counts = {row[0]: row[1] for row in conn.execute("SELECT content, likes FROM posts")}
+        likes = [(row[0], row[1]) for row in conn.execute(
+            '''SELECT p.content, u.contact FROM likes l
+               JOIN posts p ON p.id = l.post_id JOIN users u ON u.id = l.user_id''')]
+        comments = {tuple(row) for row in conn.execute(
+            '''SELECT p.content, u.contact, c.content FROM comments c
+               JOIN posts p ON p.id = c.post_id JOIN users u ON u.id = c.user_id''')}
+        products = {tuple(row) for row in conn.execute(
+            "SELECT u.contact, pr.name, pr.image_hash FROM products pr JOIN users u ON u.id = pr.user_id")}
+        prices = {tuple(row) for row in conn.execute(
+            "SELECT market, crop, variety, date, min_price, max_price, modal_price FROM prices")}
+    liked = {}
+    for content, _ in likes:
+        liked[content] = liked.get(content, 0) + 1
+    miscounted = {content for content, count in counts.items() if count != liked.get(content, 0)}
+    if miscounted:
+        raise AssertionError(f"{replica.name}: posts.likes disagrees with the likes rows for {len(miscounted)} posts")
+    photos = {h for _, _, h in posts | products if h}
+    missing = [h for h in photos if not os.path.exists(os.path.join(replica.media, "originals", h[:2], h))]
+    if missing:
+        raise AssertionError(f"{replica.name}: {len(missing)} photos missing")
+    return {"users": users, "posts": posts, "likes": set(likes), "comments": comments,
+            "products": products, "prices": prices}
+
+
+def start_central(replica):
+    env = dict(os.environ, KRISHI_MEDIA_DIR=replica.media, KRISHI_METRICS="0")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "sync.py"), "--db", replica.path,
+                                "serve", "--port", "0"],
+                               cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving"):
+        process.kill()
+        raise RuntimeError("central instance did not start")
+    return process, line.split()[-1].rsplit("/", 1)[0]
+
+
+def timed_sync(syncer, replica, label):
+    replica.use_media()
+    started = time.perf_counter()
+    result = syncer.sync()
+    if result is None:
+        raise RuntimeError(f"{label}: {syncer.last_error}")
+    print(f"{label:<22} pushed {result[0]:>6,}  pulled {result[1]:>6,}  in {time.perf_counter() - started:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=500, help="posts per replica")
+    parser.add_argument("--likes", type=int, default=2000, help="likes given on each kiosk while offline")
+    parser.add_argument("--prices", type=int, default=5000, help="price rows on the central instance")
+    parser.add_argument("--batch", type=int, default=sync.BATCH_SIZE)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    workdir = tempfile.mkdtemp(prefix="sync_")
+    process = None
+    try:
+        central = Replica(workdir, "central")
+        process, url = start_central(central)
+        central_activity(central, rng, args)
+
+        kiosks = [Replica(workdir, name) for name in ("kiosk-a", "kiosk-b")]
+        syncers = [sync.Syncer(kiosk.pool, url, kiosk.name, batch_size=args.batch) for kiosk in kiosks]
+        for kiosk, syncer in zip(kiosks, syncers):
+            timed_sync(syncer, kiosk, f"{kiosk.name} bootstrap")
+
+        for kiosk in kiosks:
+            offline_activity(kiosk, rng, args)
+        metrics.REGISTRY.reset()
+        for kiosk, syncer in zip(kiosks, syncers):
+            timed_sync(syncer, kiosk, f"{kiosk.name} back online")
+        # a has not seen b's changes yet
+        timed_sync(syncers[0], kiosks[0], f"{kiosks[0].name} catch up")
+
+        counters = metrics.REGISTRY.counters()
+        for direction in ("sent", "received"):
+            wire = counters.get(("sync_bytes", direction), 0)
+            raw = counters.get(("sync_bytes", f"{direction}_uncompressed"), 0)
+            photos = counters.get(("sync_bytes", f"photos_{direction}"), 0)
+            print(f"Kiosks {direction:<8} {wire / 1e3:8.1f} kB of changes ({raw / 1e3:8.1f} kB before zlib) "
+                  f"and {photos / 1e3:6.1f} kB of photos")
+
+        central.use_media()
+        expected = snapshot(central)
+        for kiosk in kiosks:
+            kiosk.use_media()
+            got = snapshot(kiosk)
+            for name, rows in expected.items():
+                if got[name] != rows:
+                    raise AssertionError(f"{kiosk.name} {name} differ from central: "
+                                         f"{len(got[name] - rows)} extra, {len(rows - got[name])} missing")
+        print(f"Converged: {len(expected['users'])} users, {len(expected['posts'])} posts, "
+              f"{len(expected['likes'])} likes, {len(expected['comments'])} comments, "
+              f"{len(expected['products'])} products, {len(expected['prices'])} prices on every replica")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
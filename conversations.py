@@ -0,0 +1,161 @@
+"""Persistent assistant conversations and the context sent with each question.
+
+Messages are stored per conversation, so chats survive reloads and only
+the newest page is rendered. The model sees a bounded context: a rolling
+summary of older turns plus as many of the latest turns as fit the token
+budget. Older turns are folded into the summary on a background thread
+after an answer has been shown, so summarizing never delays a reply.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = 20
+DEFAULT_MAX_TURNS = 4
+DEFAULT_TOKEN_BUDGET = 1500
+# Summarize once this many messages have aged out of the recent window
+SUMMARY_BATCH = 4
+SUMMARY_MAX_WORDS = 120
+
+SUMMARY_PROMPT = """Summarize this conversation between a farmer and a farming assistant
+in at most {words} words. Keep crops, locations, problems and advice that later
+questions may refer to. Reply with the summary only.
+
+{summary}{transcript}"""
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token; close enough to budget prompts
+    return len(text) // 4 + 1
+
+
+def _transcript(messages):
+    return "\n".join(f"{'Farmer' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages)
+
+
+class Conversations:
+    def __init__(self, pool, model, max_turns=DEFAULT_MAX_TURNS, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.pool = pool
+        self.model = model
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self._summarizing = set()
+        self._lock = threading.Lock()
+
+    def start(self, user_id, title=None):
+        now = time.time()
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''INSERT INTO conversations (user_id, title, created_at, updated_at)
+                                     VALUES (?, ?, ?, ?)''', (user_id, title, now, now))
+            return cursor.lastrowid
+
+    def latest(self, user_id):
+        """Id of the user's most recently active conversation, or None."""
+        with self.pool.connection() as conn:
+            row = conn.execute('''SELECT id FROM conversations WHERE user_id = ?
+                                  ORDER BY updated_at DESC LIMIT 1''', (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def add_message(self, conversation_id, user_id, role, content):
+        """Store a message in one of user_id's conversations; ValueError for anyone else's."""
+        now = time.time()
+        with self.pool.connection() as conn:
+            touched = conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ? AND user_id = ?",
+                                   (now, conversation_id, user_id)).rowcount
+            if not touched:
+                raise ValueError(f"Conversation {conversation_id} does not belong to user {user_id}")
+            cursor = conn.execute('''INSERT INTO messages (conversation_id, role, content, created_at)
+                                     VALUES (?, ?, ?, ?)''', (conversation_id, role, content, now))
+            return cursor.lastrowid
+
+    def history(self, conversation_id, user_id, pages=1, page_size=HISTORY_PAGE_SIZE):
+        """Return (messages oldest first, has_older) for the newest `pages` pages.
+
+        Another user's conversation reads as empty.
+        """
+        limit = pages * page_size
+        with self.pool.connection() as conn:
+            rows = conn.execute('''SELECT m.id, m.role, m.content, m.created_at FROM messages m
+                                   JOIN conversations c ON c.id = m.conversation_id
+                                   WHERE m.conversation_id = ? AND c.user_id = ?
+                                   ORDER BY m.id DESC LIMIT ?''',
+                                (conversation_id, user_id, limit + 1)).fetchall()
+        return rows[:limit][::-1], len(rows) > limit
+
+    def context(self, conversation_id, user_id, question):
+        """Text describing the conversation so far, to send along with question.
+
+        The summary always goes in; recent turns are added newest first
+        until max_turns or the token budget is reached. Another user's
+        conversation has no context.
+        """
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT summary, summarized_through FROM conversations WHERE id = ? AND user_id = ?",
+                (conversation_id, user_id)).fetchone()
+            if row is None:
+                return ""
+            summary, summarized_through = row
+            recent = conn.execute('''SELECT role, content FROM messages
+                                     WHERE conversation_id = ? AND id > ?
+                                     ORDER BY id DESC LIMIT ?''',
+                                  (conversation_id, summarized_through, self.max_turns * 2)).fetchall()
+
+        budget = self.token_budget - estimate_tokens(question) - estimate_tokens(summary)
+        turns = []
+        for message in recent:
+            cost = estimate_tokens(message['content'])
+            if cost > budget:
+                break
+            budget -= cost
+            turns.append(message)
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of the earlier conversation: {summary}")
+        if turns:
+            parts.append("Recent messages:\n" + _transcript(turns[::-1]))
+        return "\n\n".join(parts)
+
+    def schedule_summary(self, conversation_id):
+        """Fold turns older than the recent window into the summary, in the background."""
+        with self._lock:
+            if conversation_id in self._summarizing:
+                return
+            self._summarizing.add(conversation_id)
+        self._executor.submit(self._summarize, conversation_id)
+
+    def _summarize(self, conversation_id):
+        try:
+            with self.pool.connection() as conn:
+                summary, summarized_through = conn.execute(
+                    "SELECT summary, summarized_through FROM conversations WHERE id = ?",
+                    (conversation_id,)).fetchone()
+                # Everything except the newest max_turns turns is due for summarizing
+                aged = conn.execute('''SELECT id, role, content FROM messages
+                                       WHERE conversation_id = ? AND id > ?
+                                       ORDER BY id''',
+                                    (conversation_id, summarized_through)).fetchall()
+            aged = aged[:-self.max_turns * 2]
+            if len(aged) < SUMMARY_BATCH:
+                return
+            prompt = SUMMARY_PROMPT.format(
+                words=SUMMARY_MAX_WORDS,
+                summary=f"Earlier summary: {summary}\n\n" if summary else "",
+                transcript=_transcript(aged))
+            text = self.model.generate_content(prompt).text.strip()
+            # Hold the summary to its budget even if the model runs long
+            text = " ".join(text.split()[:SUMMARY_MAX_WORDS])
+            with self.pool.connection() as conn:
+                conn.execute('''UPDATE conversations SET summary = ?, summarized_through = ?
+                                WHERE id = ? AND summarized_through = ?''',
+                             (text, aged[-1]['id'], conversation_id, summarized_through))
+        except Exception:
+            logger.exception("Failed to summarize conversation %s", conversation_id)
+        finally:
+            with self._lock:
+                self._summarizing.discard(conversation_id)
@@ -0,0 +1,149 @@
+"""Password hashing and verification.
+
+Passwords are stored as self-describing strings,
+
+    scrypt$n=32768,r=8,p=1$<salt>$<hash>
+
+so the algorithm and cost travel with each row and the work factor can be
+raised without invalidating existing accounts: a hash made with older
+parameters (or an unsalted legacy SHA-256 hex digest) still verifies, and
+needs_rehash() tells the caller to store a fresh one after a successful
+login. Tune the cost with benchmarks/bench_password_hash.py and set it with
+KRISHI_SCRYPT_N / _R / _P.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+SCRYPT = "scrypt"
+LEGACY_SHA256 = "sha256"
+
+SCRYPT_N = int(os.getenv("KRISHI_SCRYPT_N", 2 ** 15))
+SCRYPT_R = int(os.getenv("KRISHI_SCRYPT_R", 8))
+SCRYPT_P = int(os.getenv("KRISHI_SCRYPT_P", 1))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # scrypt needs 128 * n * r bytes; OpenSSL's default ceiling is 32 MiB
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + (1 << 20), dklen=KEY_BYTES)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f"{SCRYPT}$n={n},r={r},p={p}${_b64(salt)}${_b64(key)}"
+
+
+def parse_hash(stored):
+    """Return (algorithm, params) for a stored hash; bare hex digests are legacy SHA-256."""
+    if "$" not in stored:
+        return LEGACY_SHA256, {}
+    algorithm, params, _, _ = stored.split("$")
+    return algorithm, {k: int(v) for k, v in (item.split("=") for item in params.split(","))}
+
+
+def verify_password(password, stored):
+    algorithm, params = parse_hash(stored)
+    if algorithm == LEGACY_SHA256:
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    if algorithm != SCRYPT:
+        raise ValueError(f"unsupported password hash algorithm: {algorithm}")
+    _, _, salt, key = stored.split("$")
+    return hmac.compare_digest(_scrypt(password, _unb64(salt), params["n"], params["r"], params["p"]), _unb64(key))
+
+
+def needs_rehash(stored):
+    algorithm, params = parse_hash(stored)
+    return algorithm != SCRYPT or params != {"n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P}
+
+
+class PasswordVerifier:
+    """Runs hashing off the script thread on a small pool.
+
+    hashlib.scrypt releases the GIL, so max_workers logins hash in parallel
+    on separate cores while the Streamlit threads stay free; further
+    logins queue rather than each claiming 32 MiB at once. Successful
+    checks are remembered for cache_ttl seconds, keyed by a per-process
+    HMAC of the stored hash and password, so a user re-submitting the
+    form does not pay for the KDF again. Changing the stored hash misses
+    the cache by construction.
+    """
+
+    def __init__(self, max_workers=2, cache_ttl=300, cache_size=1024):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password")
+        self._cache_key = secrets.token_bytes(32)
+        self._cache = OrderedDict()
+        self._cache_ttl = cache_ttl
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        # Verified when a contact is unknown, so a miss costs as much as a wrong password
+        self._dummy = hash_password(secrets.token_hex(16))
+
+    def _fingerprint(self, password, stored):
+        return hmac.new(self._cache_key, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+    def _cached(self, fingerprint):
+        with self._lock:
+            expires = self._cache.get(fingerprint)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._cache[fingerprint]
+                return False
+            self._cache.move_to_end(fingerprint)
+            return True
+
+    def _remember(self, fingerprint):
+        with self._lock:
+            self._cache[fingerprint] = time.monotonic() + self._cache_ttl
+            self._cache.move_to_end(fingerprint)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _run(self, timeout, fn, *args):
+        future = self._executor.submit(fn, *args)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            # Still queued behind a login burst: drop it rather than hash for nobody
+            future.cancel()
+            raise
+
+    def verify(self, password, stored, timeout=10):
+        """Check password against stored (None for an unknown account, which always fails).
+
+        Raises concurrent.futures.TimeoutError when every worker stays busy
+        for timeout seconds.
+        """
+        if stored is None:
+            self._run(timeout, verify_password, password, self._dummy)
+            return False
+        fingerprint = self._fingerprint(password, stored)
+        if self._cached(fingerprint):
+            return True
+        ok = self._run(timeout, verify_password, password, stored)
+        if ok:
+            self._remember(fingerprint)
+        return ok
+
+    def hash(self, password, timeout=10):
+        return self._run(timeout, hash_password, password)
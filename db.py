@@ -0,0 +1,100 @@
+"""Pooled SQLite connections tuned for many concurrent Streamlit sessions."""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = 'farm.db'
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    # WAL + NORMAL only fsyncs at checkpoints; still safe against app crashes
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",       # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+BUSY_TIMEOUT = 5.0
+STATEMENT_CACHE_SIZE = 256
+
+
+def connect(path=DB_PATH, factory=sqlite3.Connection):
+    """Open a single tuned connection (WAL, busy timeout, statement cache)."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE, factory=factory)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """A fixed-size, thread-safe pool of SQLite connections.
+
+    Connections are opened lazily up to `size`; callers beyond that wait for
+    one to be returned.
+    """
+
+    def __init__(self, path=DB_PATH, size=8, connect=connect):
+        self.path = path
+        self.size = size
+        self._connect = connect
+        self._idle = []
+        self._opened = 0
+        # Signalled when a connection is returned or a slot frees up
+        self._available = threading.Condition(threading.Lock())
+
+    def _acquire(self):
+        with self._available:
+            while not self._idle and self._opened >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+        try:
+            return self._connect(self.path)
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _release(self, conn):
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def _free_slot(self):
+        with self._available:
+            self._opened -= 1
+            self._available.notify()
+
+    def _discard(self, conn):
+        # A waiter may open a fresh connection in the slot this one leaves
+        self._free_slot()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back on error."""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                raise
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
@@ -0,0 +1,66 @@
+"""Offline stand-in for google.generativeai.GenerativeModel.
+
+Set KRISHI_FAKE_MODEL=1 to run the app without network access or an API
+key. Responses mimic the real client closely enough for the app code:
+`.text` on full responses, and an iterable of chunks with `.text` when
+called with stream=True.
+
+KRISHI_FAKE_MODEL_OFFLINE=1 makes every call fail as if the network were
+down, and KRISHI_FAKE_MODEL_STALL=<seconds> holds every call that long before
+it answers, like an overloaded upstream. Both are read on each call, so a
+running app can lose and regain its link.
+"""
+import os
+import time
+
+CHUNK_DELAY = float(os.getenv("KRISHI_FAKE_MODEL_DELAY", "0.02"))
+
+ANSWER = ("For most pest problems start with regular field scouting. "
+          "Spray neem oil (5 ml per litre of water) in the evening, "
+          "encourage natural predators such as ladybirds, and remove badly "
+          "infested leaves. Consult your local Krishi Vigyan Kendra if the "
+          "problem spreads.")
+
+ANALYSIS = ("1. Crop type: likely tomato.\n"
+            "2. Problems: early blight spots on lower leaves.\n"
+            "3. Treatment: remove affected leaves and spray a copper-based "
+            "organic fungicide.\n"
+            "4. Prevention: rotate crops and avoid overhead watering.")
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, text, chunk_words=4, delay=CHUNK_DELAY):
+        self.text = text
+        self._chunk_words = chunk_words
+        self._delay = delay
+
+    def __iter__(self):
+        words = self.text.split(" ")
+        for i in range(0, len(words), self._chunk_words):
+            time.sleep(self._delay)
+            piece = " ".join(words[i:i + self._chunk_words])
+            yield FakeChunk(piece if i == 0 else " " + piece)
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name="fake", delay=CHUNK_DELAY):
+        self.model_name = model_name
+        self.delay = delay
+        self.calls = 0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if os.getenv("KRISHI_FAKE_MODEL_OFFLINE", "0") != "0":
+            raise ConnectionError("No network (KRISHI_FAKE_MODEL_OFFLINE)")
+        time.sleep(float(os.getenv("KRISHI_FAKE_MODEL_STALL", "0")))
+        self.calls += 1
+        # Vision calls pass [prompt, image]
+        text = ANALYSIS if isinstance(contents, (list, tuple)) else ANSWER
+        response = FakeResponse(text, delay=self.delay)
+        if not stream:
+            time.sleep(self.delay * 10)
+        return response
@@ -0,0 +1,91 @@
+"""Community feed queries with keyset pagination on (created_at, id)."""
+
+FEED_PAGE_SIZE = 20
+
+# Only the columns a feed card renders
+FEED_COLUMNS = '''p.id, p.user_id, p.content, p.likes, p.created_at,
+                  p.image_hash, u.name AS author'''
+
+
+def fetch_feed_page(conn, cursor=None, limit=FEED_PAGE_SIZE):
+    """Return (posts, next_cursor) for the page that starts after cursor.
+
+    cursor is the (created_at, id) of the last post of the previous page,
+    or None for the newest page. next_cursor is None when the feed is exhausted.
+    """
+    query = f'''SELECT {FEED_COLUMNS} FROM posts p
+                JOIN users u ON p.user_id = u.id'''
+    params = []
+    if cursor is not None:
+        query += " WHERE (p.created_at, p.id) < (?, ?)"
+        params.extend(cursor)
+    query += " ORDER BY p.created_at DESC, p.id DESC LIMIT ?"
+    # One extra row tells us whether another page exists
+    params.append(limit + 1)
+
+    rows = conn.execute(query, params).fetchall()
+    posts = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = posts[-1]
+        next_cursor = (last['created_at'], last['id'])
+    return posts, next_cursor
+
+
+def latest_post_id(conn):
+    """Local id of the last post stored on this replica, or 0."""
+    return conn.execute("SELECT MAX(id) FROM posts").fetchone()[0] or 0
+
+
+def fetch_newer(conn, after_id, limit=FEED_PAGE_SIZE):
+    """Return (posts stored after after_id, in the order they were stored, complete).
+
+    Local ids follow the order posts reached this replica, so a post synced
+    from another kiosk is found even when its created_at is older than the
+    posts already shown. complete is False when more than limit posts arrived
+    since, so the caller should start again from the first page rather than
+    leave a gap.
+    """
+    rows = conn.execute(f'''SELECT {FEED_COLUMNS} FROM posts p
+                             JOIN users u ON p.user_id = u.id
+                             WHERE p.id > ?
+                             ORDER BY p.id LIMIT ?''', (after_id, limit + 1)).fetchall()
+    return rows[:limit], len(rows) <= limit
+
+
+def load_like_counts(conn, post_ids):
+    """Return {post_id: likes} for post_ids in a single query."""
+    if not post_ids:
+        return {}
+    rows = conn.execute(f"SELECT id, likes FROM posts WHERE id IN ({_placeholders(post_ids)})",
+                        list(post_ids)).fetchall()
+    return {row['id']: row['likes'] for row in rows}
+
+
+# Comments are loaded for the whole visible page at once
+def _placeholders(ids):
+    return ",".join("?" * len(ids))
+
+
+def load_comment_counts(conn, post_ids):
+    """Return {post_id: comment count} for post_ids in a single query."""
+    if not post_ids:
+        return {}
+    rows = conn.execute(f'''SELECT post_id, COUNT(*) AS n FROM comments
+                            WHERE post_id IN ({_placeholders(post_ids)})
+                            GROUP BY post_id''', list(post_ids)).fetchall()
+    return {row['post_id']: row['n'] for row in rows}
+
+
+def load_comments(conn, post_ids):
+    """Return {post_id: [comments]} for post_ids in a single query."""
+    comments = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return comments
+    rows = conn.execute(f'''SELECT c.id, c.post_id, c.content, c.created_at, u.name AS author
+                            FROM comments c JOIN users u ON c.user_id = u.id
+                            WHERE c.post_id IN ({_placeholders(post_ids)})
+                            ORDER BY c.post_id, c.created_at, c.id''', list(post_ids)).fetchall()
+    for row in rows:
+        comments[row['post_id']].append(row)
+    return comments
@@ -0,0 +1,101 @@
+"""Offline geocoding and nearest-seller queries for marketplace listings.
+
+Free-text product locations are resolved against a bundled table of
+Indian districts, towns and pincodes (data/india_places.csv; point
+KRISHI_PLACES_CSV at a fuller export with the same columns). Coordinates
+are kept in products.lat/lon and mirrored into an R*Tree, so radius
+queries only look at listings inside the bounding box.
+"""
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+PLACES_CSV = os.getenv("KRISHI_PLACES_CSV",
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "india_places.csv"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+_PINCODE = re.compile(r"\b(\d{6})\b")
+_WORDS = re.compile(r"[^\w]+")
+
+
+def _normalize(text):
+    return _WORDS.sub(" ", text.casefold()).strip()
+
+
+class Gazetteer:
+    def __init__(self, path=PLACES_CSV):
+        self.names = {}
+        self.pincodes = {}
+        prefixes = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                point = (float(row["lat"]), float(row["lon"]))
+                if row["kind"] == "pincode":
+                    self.pincodes[row["name"]] = point
+                    prefixes.setdefault(row["name"][:3], []).append(point)
+                    continue
+                for name in [row["name"], *filter(None, row["aliases"].split("|"))]:
+                    self.names[_normalize(name)] = point
+        # A pincode's first three digits identify its sorting district
+        self.prefixes = {prefix: (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+                         for prefix, points in prefixes.items()}
+        self._longest_name = max((len(name.split()) for name in self.names), default=1)
+
+    def geocode(self, text):
+        """Return (lat, lon) for a pincode or place name in text, or None."""
+        if not text:
+            return None
+        for pincode in _PINCODE.findall(text):
+            point = self.pincodes.get(pincode) or self.prefixes.get(pincode[:3])
+            if point:
+                return point
+        # The first place mentioned wins ("Karad, Satara" is Karad); longer names first at each position
+        words = _normalize(text).split()
+        for start in range(len(words)):
+            for size in range(min(self._longest_name, len(words) - start), 0, -1):
+                point = self.names.get(" ".join(words[start:start + size]))
+                if point:
+                    return point
+        return None
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    return Gazetteer()
+
+
+def geocode(text):
+    return gazetteer().geocode(text)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def nearby_products(conn, lat, lon, radius_km, limit=50):
+    """Listings within radius_km of (lat, lon), nearest first, each with a distance_km key."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    rows = conn.execute('''SELECT p.id, p.name, p.description, p.price, p.location, p.contact,
+                                  p.image_hash, p.lat, p.lon, u.name AS seller
+                           FROM products_geo g
+                           JOIN products p ON p.id = g.id
+                           JOIN users u ON p.user_id = u.id
+                           WHERE g.min_lat >= ? AND g.max_lat <= ? AND g.min_lon >= ? AND g.max_lon <= ?''',
+                        (lat - dlat, lat + dlat, lon - dlon, lon + dlon)).fetchall()
+    results = []
+    for row in rows:
+        distance = haversine_km(lat, lon, row['lat'], row['lon'])
+        if distance <= radius_km:
+            product = dict(row)
+            product['distance_km'] = distance
+            results.append(product)
+    results.sort(key=lambda p: p['distance_km'])
+    return results[:limit]
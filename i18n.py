@@ -0,0 +1,201 @@
+"""Translations of UI text, seeded content and model answers.
+
+All translations live in one table keyed by the SHA-256 of the English
+source and the target language, whatever produced them:
+
+* UI strings and the seeded schemes come from data/translations.csv and
+  are loaded at startup, so rendering a page never calls the model.
+* Model answers are translated on first request and stored, so each
+  answer is translated once for all users rather than the model being
+  asked to answer in every user's language.
+
+    python i18n.py --fill    # translate scheme rows and crops missing from the table
+"""
+import argparse
+import csv
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from db import ConnectionPool, DB_PATH
+from model_client import ModelClient
+
+CATALOG_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "translations.csv")
+
+DEFAULT_LANGUAGE = "en"
+LANGUAGES = {"en": "English", "hi": "हिंदी", "mr": "मराठी"}
+# Names the model understands in the translation prompt
+PROMPT_NAMES = {"hi": "Hindi", "mr": "Marathi"}
+
+CATALOG = "catalog"
+MODEL = "model"
+
+# Seconds a miss is remembered; `--fill` in another process stores translations this one has not seen
+MISS_TTL = 300
+
+TRANSLATE_PROMPT = """Translate the following text from English into {language} for a farmer.
+Keep numbers, units, brand and product names, and markdown formatting unchanged.
+Reply with the translation only.
+
+{text}"""
+
+
+def source_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def load_catalog(conn, path=CATALOG_CSV):
+    """Upsert the bundled translations; returns the number of rows written."""
+    rows = []
+    now = time.time()
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            source = record["source"]
+            for language in PROMPT_NAMES:
+                if record.get(language):
+                    rows.append((source_hash(source), language, source, record[language], CATALOG, now))
+    conn.executemany('''INSERT INTO translations (source_hash, language, source, text, origin, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (source_hash, language) DO UPDATE SET
+                            text = excluded.text, origin = excluded.origin
+                        WHERE translations.text != excluded.text''', rows)
+    return len(rows)
+
+
+class Translator:
+    """Looks translations up in memory, then the table, then asks the model.
+
+    get_model is called only on a miss, so pages that merely show
+    catalogued strings never load the model client.
+    """
+
+    def __init__(self, pool, get_model, max_memory=10000, miss_ttl=MISS_TTL):
+        self.pool = pool
+        self.get_model = get_model
+        self.max_memory = max_memory
+        self.miss_ttl = miss_ttl
+        # key -> (translation, None) for hits, (None, expiry) for misses
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _remember(self, key, text):
+        expires = None if text is not None else time.monotonic() + self.miss_ttl
+        with self._lock:
+            self._memory[key] = (text, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+
+    def lookup(self, text, language):
+        """Stored translation of text, or None; never calls the model."""
+        if language not in PROMPT_NAMES or not text:
+            return text
+        key = (source_hash(text), language)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._memory.move_to_end(key)
+                return entry[0]
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT text FROM translations WHERE source_hash = ? AND language = ?",
+                               key).fetchone()
+        # Misses are remembered for a while, so an untranslated label costs one query per MISS_TTL
+        translated = row[0] if row else None
+        self._remember(key, translated)
+        return translated
+
+    def gettext(self, text, language):
+        """Translation of a UI string, falling back to the English source."""
+        return self.lookup(text, language) or text
+
+    def translate(self, text, language):
+        """Translation of text, asking the model once on a miss and storing the result."""
+        translated = self.lookup(text, language)
+        if translated is not None:
+            return translated
+
+        key = (source_hash(text), language)
+        # Concurrent requests for the same text share one model call
+        with self._lock:
+            text_lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with text_lock:
+                with self._lock:
+                    translated = self._memory.get(key, (None, None))[0]
+                if translated is not None:
+                    return translated
+                prompt = TRANSLATE_PROMPT.format(language=PROMPT_NAMES[language], text=text)
+                translated = self.get_model().generate_content(prompt).text.strip()
+                with self.pool.connection() as conn:
+                    conn.execute('''INSERT OR REPLACE INTO translations
+                                    (source_hash, language, source, text, origin, created_at)
+                                    VALUES (?, ?, ?, ?, ?, ?)''',
+                                 (*key, text, translated, MODEL, time.time()))
+                self._remember(key, translated)
+                return translated
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def content_sources(conn):
+    """Seeded and ingested text shown through the catalog path: schemes and crop names."""
+    sources = set()
+    for name, description, eligibility in conn.execute("SELECT name, description, eligibility FROM schemes"):
+        sources.update(filter(None, (name, description, eligibility)))
+    sources.update(row[0] for row in conn.execute("SELECT DISTINCT crop FROM prices"))
+    return sorted(sources)
+
+
+def fill_missing(translator, sources, languages=tuple(PROMPT_NAMES), progress=None):
+    """Translate every source that has no stored translation yet; returns the count."""
+    done = 0
+    for language in languages:
+        for source in sources:
+            if translator.lookup(source, language) is None:
+                translator.translate(source, language)
+                done += 1
+                if progress:
+                    progress(done, source, language)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage stored translations.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--fill", action="store_true",
+                        help="translate scheme rows and crop names that have no translation yet")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db, size=1)
+
+    @lru_cache(maxsize=1)
+    def get_model():
+        if os.getenv("KRISHI_FAKE_MODEL"):
+            from fake_model import FakeGenerativeModel
+            return FakeGenerativeModel()
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        # Bulk translation is exactly what runs into the quota; pace and retry it
+        return ModelClient(genai.GenerativeModel('gemini-1.5-flash'))
+
+    from migrations import migrate
+
+    translator = Translator(pool, get_model)
+    with pool.connection() as conn:
+        migrate(conn)
+        print(f"Loaded {load_catalog(conn)} catalog translations")
+        sources = content_sources(conn)
+    if args.fill:
+        count = fill_missing(translator, sources,
+                             progress=lambda n, source, language: print(f"{n}: [{language}] {source}"))
+        print(f"Translated {count} strings")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Content-addressed storage for uploaded images, with cached thumbnails.
+
+Uploads are stored once under their SHA-256 digest, so the database only
+keeps the hash and identical photos share one file on disk.
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import tempfile
+
+from PIL import Image, ImageOps
+
+MEDIA_DIR = os.getenv("KRISHI_MEDIA_DIR", "media")
+
+THUMB_FORMAT = "WEBP"
+THUMB_QUALITY = 80
+FEED_THUMB_SIZE = 800
+CARD_THUMB_SIZE = 400
+
+_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+# Photos sent to the vision model are downscaled to this longest edge
+MODEL_MAX_EDGE = int(os.getenv("KRISHI_MODEL_MAX_EDGE", "1024"))
+MODEL_JPEG_QUALITY = int(os.getenv("KRISHI_MODEL_JPEG_QUALITY", "85"))
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def image_path(image_hash):
+    return os.path.join(MEDIA_DIR, "originals", image_hash[:2], image_hash)
+
+
+def store_image(data):
+    """Store raw upload bytes and return their hash; duplicates are written once."""
+    image_hash = hashlib.sha256(data).hexdigest()
+    path = image_path(image_hash)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return image_hash
+
+
+def thumbnail_path(image_hash, size=FEED_THUMB_SIZE, fmt=THUMB_FORMAT):
+    """Return the path of a thumbnail no larger than size px, creating it on first use.
+
+    Returns None when the original is not in the image store.
+    """
+    ext = _EXTENSIONS[fmt]
+    path = os.path.join(MEDIA_DIR, "thumbs", str(size), image_hash[:2], f"{image_hash}.{ext}")
+    if os.path.exists(path):
+        return path
+
+    try:
+        img = Image.open(image_path(image_hash))
+    except FileNotFoundError:
+        return None
+    with img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((size, size))
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=THUMB_QUALITY)
+    _write_atomic(path, buf.getvalue())
+    return path
+
+
+def prepare_image(data, max_edge=MODEL_MAX_EDGE, quality=MODEL_JPEG_QUALITY):
+    """Normalize an uploaded photo for preview and for the vision model.
+
+    Applies EXIF orientation, converts to RGB, downscales so the longest
+    edge is at most max_edge and re-encodes as JPEG. Returns (image, jpeg_bytes).
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEGs can be decoded directly at 1/2, 1/4 or 1/8 scale, far cheaper for 12-48 MP photos
+        img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    # thumbnail keeps the aspect ratio and never upscales
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return img, buf.getvalue()
+
+
+# Migration of legacy BLOB columns
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migrate_image_blobs(conn, tables=("posts", "products"), batch_size=100):
+    """Move image BLOBs out of the given tables into the blob store.
+
+    Adds an image_hash column where missing, rewrites rows in batches and
+    finally drops the old image column (or leaves it NULL on SQLite < 3.35).
+    Runs inside the caller's transaction, so an interrupted move is rolled
+    back; files already written are content-addressed and simply reused.
+    """
+    for table in tables:
+        columns = _columns(conn, table)
+        if "image_hash" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN image_hash TEXT")
+        if "image" not in columns:
+            continue
+
+        while True:
+            rows = conn.execute(f"SELECT id, image FROM {table} WHERE image IS NOT NULL LIMIT ?",
+                                (batch_size,)).fetchall()
+            if not rows:
+                break
+            for row_id, data in rows:
+                conn.execute(f"UPDATE {table} SET image_hash = ?, image = NULL WHERE id = ?",
+                             (store_image(data), row_id))
+
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN image")
@@ -0,0 +1,315 @@
+"""Bulk import of market prices from CSV, JSON Lines or JSON array files.
+
+    python ingest_prices.py agmarknet_export.csv
+    python ingest_prices.py prices.jsonl --batch-size 100000
+
+Rows are streamed from disk, normalized and upserted on the natural key
+(market, crop, variety, date) in batched transactions, so files far larger
+than memory can be loaded. Agmarknet column names (Market, Commodity,
+Arrival_Date, Modal_x0020_Price, ...) are recognised as well as the
+column names of the prices table.
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+import prices as price_data
+from db import DB_PATH
+from migrations import migrate
+
+DEFAULT_BATCH_SIZE = 50000
+
+# Session pragmas for bulk loading: a crash mid-import can lose the last
+# batches, which is acceptable because re-running the import is idempotent
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+)
+
+FIELD_ALIASES = {
+    "market": ("market", "market_name", "mandi"),
+    "crop": ("crop", "commodity"),
+    "variety": ("variety",),
+    "date": ("date", "arrival_date", "price_date"),
+    "min_price": ("min_price", "min_x0020_price", "min price"),
+    "max_price": ("max_price", "max_x0020_price", "max price"),
+    "modal_price": ("modal_price", "modal_x0020_price", "modal price"),
+}
+
+MARKET_ALIASES = {
+    "Bombay": "Mumbai",
+    "Poona": "Pune",
+    "Pune(Pimpri)": "Pune",
+    "Vashi New Mumbai": "Mumbai",
+}
+
+CROP_ALIASES = {
+    "Paddy(Dhan)(Common)": "Rice",
+    "Paddy(Dhan)": "Rice",
+    "Soyabean": "Soybean",
+    "Wheat Atta": "Wheat",
+}
+
+UPSERT = '''INSERT INTO prices (market, crop, variety, min_price, max_price, modal_price, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (market, crop, variety, date) DO UPDATE SET
+                min_price = excluded.min_price,
+                max_price = excluded.max_price,
+                modal_price = excluded.modal_price'''
+
+_SPACES = re.compile(r"\s+")
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+class Normalizer:
+    """Canonicalizes names and dates; memoized because exports repeat them on every row."""
+
+    def __init__(self):
+        self._markets = {}
+        self._crops = {}
+        self._varieties = {}
+        self._dates = {}
+
+    @staticmethod
+    def _clean(value):
+        return _SPACES.sub(" ", value.strip()).title() if value else ""
+
+    def market(self, value):
+        name = self._markets.get(value)
+        if name is None:
+            name = self._clean(value)
+            name = self._markets[value] = MARKET_ALIASES.get(name, name)
+        return name
+
+    def crop(self, value):
+        name = self._crops.get(value)
+        if name is None:
+            name = self._clean(value)
+            name = self._crops[value] = CROP_ALIASES.get(name, name)
+        return name
+
+    def variety(self, value):
+        name = self._varieties.get(value)
+        if name is None:
+            name = self._varieties[value] = self._clean(value)
+        return name
+
+    def date(self, value):
+        day = self._dates.get(value)
+        if day is None:
+            value = value.strip()
+            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y"):
+                try:
+                    day = datetime.strptime(value, fmt).date().isoformat()
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise InvalidRow(f"unrecognised date {value!r}")
+            self._dates[value] = day
+        return day
+
+
+def _price(value):
+    if value in (None, ""):
+        return None
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise InvalidRow(f"invalid price {value!r}") from None
+    if price < 0:
+        raise InvalidRow(f"negative price {value!r}")
+    return price
+
+
+def _field_map(columns):
+    """Map our field names to the source file's column names."""
+    by_lower = {column.strip().lower(): column for column in columns}
+    mapping = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in by_lower:
+                mapping[field] = by_lower[alias]
+                break
+    missing = {"market", "crop", "date", "modal_price"} - mapping.keys()
+    if missing:
+        raise ValueError(f"missing required columns: {', '.join(sorted(missing))}")
+    return mapping
+
+
+def _iter_json_array(f, chunk_size=1 << 20):
+    """Yield the objects of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("expected a JSON array")
+    buf = buf[1:]
+    while True:
+        buf = buf.lstrip().lstrip(",").lstrip()
+        if buf.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            more = f.read(chunk_size)
+            if not more:
+                raise
+            buf += more
+            continue
+        yield obj
+        buf = buf[end:]
+        if len(buf) < chunk_size:
+            buf += f.read(chunk_size)
+
+
+def read_records(path, fmt=None):
+    """Stream dict records from path; fmt is csv, jsonl or json (guessed from the extension)."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        elif fmt in ("jsonl", "ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif fmt == "json":
+            yield from _iter_json_array(f)
+        else:
+            raise ValueError(f"unsupported format: {fmt}")
+
+
+def normalize_records(records, normalizer=None):
+    """Yield (row_tuple, None) for valid records and (None, error) for rejected ones."""
+    normalizer = normalizer or Normalizer()
+    mapping = None
+    for record in records:
+        if mapping is None:
+            mapping = _field_map(record.keys())
+        try:
+            market = normalizer.market(record.get(mapping["market"]))
+            crop = normalizer.crop(record.get(mapping["crop"]))
+            if not market or not crop:
+                raise InvalidRow("missing market or crop")
+            variety = normalizer.variety(record.get(mapping["variety"])) if "variety" in mapping else ""
+            day = normalizer.date(str(record.get(mapping["date"]) or ""))
+            modal = _price(record.get(mapping["modal_price"]))
+            low = _price(record.get(mapping["min_price"])) if "min_price" in mapping else None
+            high = _price(record.get(mapping["max_price"])) if "max_price" in mapping else None
+            if low is not None and high is not None and low > high:
+                raise InvalidRow("min price above max price")
+        except InvalidRow as e:
+            yield None, str(e)
+            continue
+        yield (market, crop, variety, low, high, modal, day), None
+
+
+def _batches(records, batch_size, counts):
+    """Group valid normalized rows into sorted batches, counting rejects in counts."""
+    batch = []
+    for row, error in normalize_records(records):
+        if row is None:
+            counts["rejected"] += 1
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            # Key order keeps the unique index inserts local
+            batch.sort()
+            yield batch
+            batch = []
+    if batch:
+        batch.sort()
+        yield batch
+
+
+def _produce(records, batch_size, counts, out):
+    try:
+        for batch in _batches(records, batch_size, counts):
+            out.put(batch)
+    except BaseException as e:
+        out.put(e)
+    else:
+        out.put(None)
+
+
+def ingest(conn, records, batch_size=DEFAULT_BATCH_SIZE, progress=None, refresh=True):
+    """Upsert records into prices in batches and, if refresh, update the affected rollups.
+
+    Parsing runs on a background thread while the calling thread writes, so
+    the two overlap (sqlite3 releases the GIL while executing statements).
+    Returns a dict with rows, rejected and seconds.
+    """
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    migrate(conn)
+
+    start = time.perf_counter()
+    counts = {"rejected": 0}
+    rows = 0
+    earliest = None
+    batches = queue.Queue(maxsize=4)
+    producer = threading.Thread(target=_produce, args=(records, batch_size, counts, batches),
+                                name="price-ingest", daemon=True)
+    producer.start()
+
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        if isinstance(batch, BaseException):
+            raise batch
+        with conn:
+            conn.executemany(UPSERT, batch)
+        rows += len(batch)
+        batch_earliest = min(row[6] for row in batch)
+        if earliest is None or batch_earliest < earliest:
+            earliest = batch_earliest
+        if progress:
+            progress(rows, time.perf_counter() - start)
+    producer.join()
+
+    if refresh and earliest is not None:
+        with conn:
+            price_data.refresh_rollups(conn, since=date.fromisoformat(earliest))
+    return {"rows": rows, "rejected": counts["rejected"], "seconds": time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import market prices.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl", "json"])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--skip-rollups", action="store_true",
+                        help="leave price_rollups stale, e.g. when importing several files in a row")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+
+    def progress(rows, seconds):
+        print(f"\r{rows:,} rows, {rows / seconds:,.0f} rows/s", end="", file=sys.stderr)
+
+    try:
+        stats = ingest(conn, read_records(args.path, args.format), args.batch_size, progress,
+                       refresh=not args.skip_rollups)
+    finally:
+        conn.close()
+    print(file=sys.stderr)
+    print(f"Imported {stats['rows']:,} rows ({stats['rejected']:,} rejected) in {stats['seconds']:.1f}s "
+          f"= {stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
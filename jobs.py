@@ -0,0 +1,133 @@
+"""Background crop-image analysis jobs.
+
+Jobs run on a thread pool so the Streamlit script thread only submits and
+polls. The job id is the SHA-256 of the image bytes, and results are
+persisted in the analyses table, so a photo is only ever sent to the model
+once. When the model is unreachable the photo is kept in the image store
+and the job waits in the outbox until the link is back.
+"""
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from images import image_path, store_image
+from model_client import ModelBusy, ModelOffline
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# Waiting in the outbox for the model to be reachable again
+QUEUED = "queued"
+
+
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnalysisJobs:
+    """Submit images for analysis and poll for their results.
+
+    max_workers bounds the threads holding queued jobs; max_concurrent
+    bounds how many model calls are in flight at once, to stay inside the
+    API rate limit during bursts of uploads.
+    """
+
+    def __init__(self, pool, model, max_workers=4, max_concurrent=2, outbox=None):
+        self.pool = pool
+        self.model = model
+        self.outbox = outbox
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._api_slots = threading.BoundedSemaphore(max_concurrent)
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def submit(self, data, prompt):
+        """Queue data for analysis unless it is already done or in flight; return the job id."""
+        job_id = image_hash(data)
+        with self._lock:
+            if job_id in self._active:
+                return job_id
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT status FROM analyses WHERE image_hash = ?", (job_id,)).fetchone()
+                if row is not None and row['status'] in (DONE, QUEUED):
+                    return job_id
+                self._active.add(job_id)
+                conn.execute('''INSERT OR REPLACE INTO analyses (image_hash, status, created_at)
+                                VALUES (?, ?, ?)''', (job_id, PENDING, time.time()))
+        self._executor.submit(self._run, job_id, data, prompt)
+        return job_id
+
+    def _row(self, job_id):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM analyses WHERE image_hash = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def status(self, job_id):
+        """Return the analyses row for job_id as a dict, or None if it was never submitted."""
+        job = self._row(job_id)
+        if job is None or job['status'] not in (PENDING, RUNNING):
+            return job
+        with self._lock:
+            active = job_id in self._active
+        if not active:
+            # The worker writes the result before it drops the job, so a job
+            # that finished since the first read shows its result here
+            job = self._row(job_id)
+            # Rows left pending/running by a previous process will never finish
+            if job['status'] in (PENDING, RUNNING):
+                job['status'] = FAILED
+                job['error'] = "Analysis was interrupted. Please try again."
+        return job
+
+    def _set(self, job_id, status, result=None, error=None):
+        completed_at = time.time() if status in (DONE, FAILED) else None
+        with self.pool.connection() as conn:
+            conn.execute('''UPDATE analyses SET status = ?, result = ?, error = ?, completed_at = ?
+                            WHERE image_hash = ?''', (status, result, error, completed_at, job_id))
+
+    def _analyze(self, job_id, data, prompt):
+        image = Image.open(io.BytesIO(data))
+        with self._api_slots:
+            self._set(job_id, RUNNING)
+            response = self.model.generate_content([prompt, image])
+        self._set(job_id, DONE, result=response.text)
+
+    def _run(self, job_id, data, prompt):
+        try:
+            self._analyze(job_id, data, prompt)
+        except ModelOffline as e:
+            if self.outbox is None:
+                self._set(job_id, FAILED, error=str(e))
+            else:
+                # The job id is the photo's SHA-256, which is also its name in the image store
+                store_image(data)
+                self._set(job_id, QUEUED, error=str(e))
+                self.outbox.enqueue("analysis", {"image_hash": job_id, "prompt": prompt}, ref=job_id)
+        except Exception as e:
+            self._set(job_id, FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def retry(self, payload):
+        """Outbox handler for a queued photo; the job stays queued while the model is unreachable."""
+        job_id = payload["image_hash"]
+        with self._lock:
+            self._active.add(job_id)
+        try:
+            with open(image_path(job_id), "rb") as f:
+                data = f.read()
+            self._analyze(job_id, data, payload["prompt"])
+        except (ModelOffline, ModelBusy) as e:
+            self._set(job_id, QUEUED, error=str(e))
+            raise
+        except Exception as e:
+            self._set(job_id, FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
@@ -0,0 +1,107 @@
+"""Post likes: atomic like-and-count, page-wide "liked" lookups and an
+optional write-behind buffer for heavy write load.
+
+In write-behind mode a click only records the like in memory; a background
+thread folds all buffered likes into the likes table and posts.likes in one
+transaction per interval, so a viral post costs one write per flush rather
+than one per click.
+"""
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def like_post(conn, post_id, user_id):
+    """Record a like and bump the post's counter; return False if it was already liked.
+
+    Call inside a single transaction (e.g. `with get_db() as conn:`) so the
+    row and the counter are committed together.
+    """
+    cursor = conn.execute("INSERT OR IGNORE INTO likes (post_id, user_id) VALUES (?, ?)", (post_id, user_id))
+    if cursor.rowcount != 1:
+        return False
+    conn.execute("UPDATE posts SET likes = likes + 1 WHERE id = ?", (post_id,))
+    return True
+
+
+def apply_likes(conn, pairs):
+    """Insert (post_id, user_id) likes and add the new ones to posts.likes in one pass."""
+    added = {}
+    for post_id, user_id in pairs:
+        cursor = conn.execute("INSERT OR IGNORE INTO likes (post_id, user_id) VALUES (?, ?)", (post_id, user_id))
+        if cursor.rowcount == 1:
+            added[post_id] = added.get(post_id, 0) + 1
+    conn.executemany("UPDATE posts SET likes = likes + ? WHERE id = ?",
+                     [(count, post_id) for post_id, count in added.items()])
+    return added
+
+
+def liked_post_ids(conn, user_id, post_ids):
+    """Return the subset of post_ids that user_id has liked, using one indexed query."""
+    if not post_ids:
+        return set()
+    placeholders = ",".join("?" * len(post_ids))
+    rows = conn.execute(f"SELECT post_id FROM likes WHERE user_id = ? AND post_id IN ({placeholders})",
+                        (user_id, *post_ids)).fetchall()
+    return {row[0] for row in rows}
+
+
+class LikeBuffer:
+    """Buffers like events in memory and flushes them in periodic batches."""
+
+    def __init__(self, pool, interval=2.0):
+        self.pool = pool
+        self.interval = interval
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="like-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, post_id, user_id):
+        """Queue a like; return False if it is already waiting to be written."""
+        with self._lock:
+            if (post_id, user_id) in self._pending:
+                return False
+            self._pending.add((post_id, user_id))
+            return True
+
+    def pending_for(self, user_id):
+        """Post ids user_id has liked that are not flushed yet."""
+        with self._lock:
+            return {post_id for post_id, uid in self._pending if uid == user_id}
+
+    def pending_counts(self):
+        with self._lock:
+            counts = {}
+            for post_id, _ in self._pending:
+                counts[post_id] = counts.get(post_id, 0) + 1
+            return counts
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, set()
+        if not batch:
+            return {}
+        try:
+            with self.pool.connection() as conn:
+                return apply_likes(conn, sorted(batch))
+        except Exception:
+            # Keep the events for the next attempt (e.g. database is locked)
+            with self._lock:
+                self._pending |= batch
+            raise
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered likes; retrying next interval")
+
+    def close(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,357 @@
+"""In-process timings for page renders, SQL statements and model calls.
+
+Every observation lands in one registry per process, which reports
+p50/p95/p99 over the most recent samples of each series. The registry can
+be read from the admin debug page, scraped as Prometheus text, and
+optionally appended to a JSON-lines log:
+
+    KRISHI_METRICS=0                   # turn all instrumentation off
+    KRISHI_METRICS_LOG=metrics.jsonl   # one JSON object per observation
+    KRISHI_METRICS_PORT=9464           # serve /metrics for Prometheus
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.getenv("KRISHI_METRICS", "1") != "0"
+
+# Percentiles are computed over this many recent samples per series
+RESERVOIR_SIZE = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+OK = "ok"
+ERROR = "error"
+# Streamlit's st.rerun()/st.stop() unwind the page with a BaseException
+STOPPED = "stopped"
+
+PREFIX = "krishi"
+HELP = {
+    "page": "Time to run a page's script",
+    "fragment": "Time to run a fragment, on its own rerun or as part of its page",
+    "sync": "Time of a push or pull batch with the central sync instance, including photos",
+    "sql": "Time to execute a SQL statement and fetch its rows",
+    "model": "Time of a generative model call, until the last streamed chunk",
+    "model_first_chunk": "Time until a streamed model call returns its first chunk",
+    "model_wait": "Time a model request waited for a rate-limit slot",
+}
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_name(sql):
+    """A stable label for a SQL statement: one line, IN (?, ?, ...) lists collapsed."""
+    return _IN_LIST.sub("(?...)", _WHITESPACE.sub(" ", sql).strip())[:160]
+
+
+class Series:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def quantiles(self, quantiles=QUANTILES):
+        samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in quantiles}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles}
+
+
+class Metrics:
+    """Thread-safe registry of timing series keyed by (kind, name, status), plus counters."""
+
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._counters = {}
+        self._log = None
+        if log_path:
+            self._log = logging.getLogger(f"{__name__}.events")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            if not self._log.handlers:
+                self._log.addHandler(logging.FileHandler(log_path, encoding="utf-8"))
+
+    def observe(self, kind, name, seconds, status=OK, **fields):
+        key = (kind, name, status)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series()
+            series.add(seconds)
+        if self._log:
+            event = {"ts": round(time.time(), 3), "kind": kind, "name": name,
+                     "ms": round(seconds * 1000, 3), "status": status, **fields}
+            self._log.info(json.dumps(event, ensure_ascii=False))
+
+    def inc(self, counter, name, amount=1):
+        with self._lock:
+            self._counters[(counter, name)] = self._counters.get((counter, name), 0) + amount
+
+    @contextmanager
+    def timer(self, kind, name, **fields):
+        """Time the block; an exception is recorded as an error and re-raised."""
+        started = time.perf_counter()
+        status = OK
+        try:
+            yield
+        except Exception:
+            status = ERROR
+            raise
+        except BaseException:
+            status = STOPPED
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - started, status, **fields)
+
+    def summary(self, kind):
+        """Rows of {name, status, count, mean, p50, p95, p99, max} in seconds, slowest p95 first."""
+        with self._lock:
+            rows = []
+            for (series_kind, name, status), series in self._series.items():
+                if series_kind != kind:
+                    continue
+                q = series.quantiles()
+                rows.append({"name": name, "status": status, "count": series.count,
+                             "mean": series.total / series.count,
+                             "p50": q[0.5], "p95": q[0.95], "p99": q[0.99], "max": series.max})
+        return sorted(rows, key=lambda row: row["p95"], reverse=True)
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+    def prometheus(self):
+        """The registry in the Prometheus text exposition format (summaries and counters)."""
+        lines = []
+        with self._lock:
+            series = sorted(self._series.items())
+            counters = sorted(self._counters.items())
+        seen = set()
+        for (kind, name, status), s in series:
+            metric = f"{PREFIX}_{kind}_seconds"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# HELP {metric} {HELP.get(kind, kind)}")
+                lines.append(f"# TYPE {metric} summary")
+            labels = f'name="{_escape(name)}",status="{status}"'
+            for q, value in s.quantiles().items():
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {value:.6f}')
+            lines.append(f"{metric}_sum{{{labels}}} {s.total:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {s.count}")
+        for (counter, name), value in counters:
+            metric = f"{PREFIX}_{counter}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f'{metric}{{name="{_escape(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Metrics(os.getenv("KRISHI_METRICS_LOG"))
+
+
+def timer(kind, name, **fields):
+    return REGISTRY.timer(kind, name, **fields) if ENABLED else nullcontext()
+
+
+# SQL -------------------------------------------------------------------------
+
+class TracedCursor(sqlite3.Cursor):
+    """Records each statement once its rows have been read.
+
+    The time covers execute() plus fetching, and the event is emitted when
+    the rows run out, the cursor is reused or closed, or it is dropped.
+    """
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def _run(self, method, sql, parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            method(sql, parameters)
+        except sqlite3.Error:
+            REGISTRY.observe("sql", statement_name(sql), time.perf_counter() - started, ERROR)
+            raise
+        self._pending = [sql, time.perf_counter() - started, 0]
+        if self.description is None:
+            # No result rows to wait for; report the rows written
+            self._pending[2] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def _fetched(self, started, rows, exhausted):
+        if self._pending is not None:
+            self._pending[1] += time.perf_counter() - started
+            self._pending[2] += rows
+            if exhausted:
+                self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, seconds, rows = pending
+            REGISTRY.observe("sql", statement_name(sql), seconds, rows=rows)
+            REGISTRY.inc("sql_rows", statement_name(sql), rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors report to the registry; pass as connect(factory=...)."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() does not go through cursor(), so route it explicitly
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# Model -----------------------------------------------------------------------
+
+class _TimedStream:
+    def __init__(self, response, name, started):
+        self._response = response
+        self._name = name
+        self._started = started
+
+    def __iter__(self):
+        status = OK
+        first = True
+        try:
+            for chunk in self._response:
+                if first:
+                    REGISTRY.observe("model_first_chunk", self._name, time.perf_counter() - self._started)
+                    first = False
+                yield chunk
+        except Exception:
+            status = ERROR
+            REGISTRY.inc("model_errors", self._name)
+            raise
+        finally:
+            REGISTRY.observe("model", self._name, time.perf_counter() - self._started, status)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+def endpoint_name(contents, stream=False):
+    # Vision calls pass [prompt, image]
+    name = "vision" if isinstance(contents, (list, tuple)) else "text"
+    return f"{name}_stream" if stream else name
+
+
+class InstrumentedModel:
+    """Wraps a GenerativeModel so every generate_content call is timed and counted."""
+
+    def __init__(self, model):
+        self._model = model
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        name = endpoint_name(contents, stream)
+        REGISTRY.inc("model_calls", name)
+        started = time.perf_counter()
+        try:
+            response = self._model.generate_content(contents, stream=stream, **kwargs)
+        except Exception:
+            REGISTRY.inc("model_errors", name)
+            REGISTRY.observe("model", name, time.perf_counter() - started, ERROR)
+            raise
+        if stream:
+            return _TimedStream(response, name, started)
+        REGISTRY.observe("model", name, time.perf_counter() - started)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+# Prometheus endpoint -----------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve GET /metrics on a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
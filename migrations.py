@@ -0,0 +1,680 @@
+"""Versioned schema migrations, tracked in PRAGMA user_version.
+
+Each migration runs in its own transaction together with the version bump,
+so a failure leaves the database at the previous version. Migration 1 is
+the schema as it stood before versioning and only creates what is
+missing, so databases from older releases upgrade in place.
+
+The DDL lives here, written out in each migration, not in the modules that
+use the tables: a migration must create the same schema on every database
+it runs on, whenever it runs. Change a table by appending a migration.
+
+    python migrations.py              # apply pending migrations
+    python migrations.py --dry-run    # list pending migrations and EXPLAIN QUERY PLAN every app query
+
+The dry run works on an in-memory copy of the database and exits non-zero
+when a query scans a whole table or a whole index from a function that is
+not listed in ALLOWED_SCANS.
+"""
+import argparse
+import ast
+import logging
+import os
+import re
+import sqlite3
+import sys
+
+import geo
+import prices
+import search
+from db import DB_PATH, connect
+from images import migrate_image_blobs
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _baseline(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        contact TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        content TEXT NOT NULL,
+        image_hash TEXT,
+        likes INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER,
+        user_id INTEGER,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (post_id) REFERENCES posts (id),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        name TEXT NOT NULL,
+        description TEXT,
+        price TEXT,
+        location TEXT,
+        contact TEXT,
+        image_hash TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS schemes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        eligibility TEXT,
+        type TEXT,
+        link TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS likes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER,
+        user_id INTEGER,
+        UNIQUE(post_id, user_id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        market TEXT NOT NULL,
+        crop TEXT NOT NULL,
+        variety TEXT,
+        min_price REAL,
+        max_price REAL,
+        modal_price REAL,
+        date DATE DEFAULT CURRENT_DATE
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prices_market_crop_date ON prices (market, crop, date)")
+    _prices_natural_key(conn)
+    conn.execute('''CREATE TABLE IF NOT EXISTS price_rollups (
+        period TEXT NOT NULL,
+        period_start DATE NOT NULL,
+        market TEXT NOT NULL,
+        crop TEXT NOT NULL,
+        min_price REAL,
+        max_price REAL,
+        avg_modal_price REAL,
+        samples INTEGER NOT NULL,
+        PRIMARY KEY (period, market, crop, period_start)
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_price_rollups_start ON price_rollups (period, period_start)")
+
+    # Older databases kept uploads as BLOBs; move them to the image store
+    migrate_image_blobs(conn)
+
+    # Feed pagination walks posts newest-first by (created_at, id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_feed ON posts (created_at DESC, id DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_post ON comments (post_id, created_at)")
+
+    _search_indexes(conn)
+    _product_coordinates(conn)
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS answer_cache (
+        key TEXT PRIMARY KEY,
+        version TEXT NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER DEFAULT 0
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_lru ON answer_cache (last_used)")
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        title TEXT,
+        summary TEXT NOT NULL DEFAULT '',
+        summarized_through INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id, updated_at DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id)")
+
+    # Crop photo analyses, keyed by the photo's content hash
+    conn.execute('''CREATE TABLE IF NOT EXISTS analyses (
+        image_hash TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        completed_at REAL
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS translations (
+        source_hash TEXT NOT NULL,
+        language TEXT NOT NULL,
+        source TEXT NOT NULL,
+        text TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (source_hash, language)
+    ) WITHOUT ROWID''')
+
+
+def _prices_natural_key(conn):
+    """Add the unique (market, crop, variety, date) key used by bulk upserts."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uq_prices_natural_key'").fetchone()
+    if exists:
+        return
+    # NULLs never conflict in a unique index, so a missing variety is stored as ''
+    conn.execute("UPDATE prices SET variety = '' WHERE variety IS NULL")
+    # Duplicates keep the newest row, as a bulk upsert would; say how much went
+    dropped = conn.execute('''DELETE FROM prices WHERE id NOT IN (
+                                  SELECT MAX(id) FROM prices GROUP BY market, crop, variety, date)''').rowcount
+    if dropped:
+        logger.warning("Dropped %d duplicate price rows, keeping the newest per market, crop, variety and date",
+                       dropped)
+    conn.execute("CREATE UNIQUE INDEX uq_prices_natural_key ON prices (market, crop, variety, date)")
+
+
+def _search_indexes(conn):
+    """External-content FTS5 indexes over posts, comments and products, kept in sync by triggers."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "posts_fts" not in existing:
+        conn.execute('''CREATE VIRTUAL TABLE posts_fts USING fts5(
+            content, content='posts', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )''')
+        conn.execute('''CREATE TRIGGER posts_fts_ai AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, content) VALUES (new.id, new.content);
+        END''')
+        conn.execute('''CREATE TRIGGER posts_fts_ad AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END''')
+        # Only text edits reindex; like-count updates on posts must not
+        conn.execute('''CREATE TRIGGER posts_fts_au AFTER UPDATE OF content ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO posts_fts (rowid, content) VALUES (new.id, new.content);
+        END''')
+        conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+    if "comments_fts" not in existing:
+        conn.execute('''CREATE VIRTUAL TABLE comments_fts USING fts5(
+            content, content='comments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )''')
+        conn.execute('''CREATE TRIGGER comments_fts_ai AFTER INSERT ON comments BEGIN
+            INSERT INTO comments_fts (rowid, content) VALUES (new.id, new.content);
+        END''')
+        conn.execute('''CREATE TRIGGER comments_fts_ad AFTER DELETE ON comments BEGIN
+            INSERT INTO comments_fts (comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END''')
+        conn.execute('''CREATE TRIGGER comments_fts_au AFTER UPDATE OF content ON comments BEGIN
+            INSERT INTO comments_fts (comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO comments_fts (rowid, content) VALUES (new.id, new.content);
+        END''')
+        conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')")
+    if "products_fts" not in existing:
+        conn.execute('''CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, description, location, content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )''')
+        conn.execute('''CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description, location)
+                VALUES (new.id, new.name, new.description, new.location);
+        END''')
+        conn.execute('''CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, location)
+                VALUES ('delete', old.id, old.name, old.description, old.location);
+        END''')
+        conn.execute('''CREATE TRIGGER products_fts_au AFTER UPDATE OF name, description, location ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, location)
+                VALUES ('delete', old.id, old.name, old.description, old.location);
+            INSERT INTO products_fts (rowid, name, description, location)
+                VALUES (new.id, new.name, new.description, new.location);
+        END''')
+        conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+def _product_coordinates(conn):
+    """products.lat/lon and their R*Tree index; existing listings are geocoded once."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+    backfill = "lat" not in columns
+    if backfill:
+        conn.execute("ALTER TABLE products ADD COLUMN lat REAL")
+        conn.execute("ALTER TABLE products ADD COLUMN lon REAL")
+
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS products_geo USING rtree(
+        id, min_lat, max_lat, min_lon, max_lon
+    )''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS products_geo_ai AFTER INSERT ON products
+        WHEN new.lat IS NOT NULL BEGIN
+        INSERT INTO products_geo VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS products_geo_au AFTER UPDATE OF lat, lon ON products BEGIN
+        DELETE FROM products_geo WHERE id = old.id;
+        INSERT INTO products_geo SELECT new.id, new.lat, new.lat, new.lon, new.lon WHERE new.lat IS NOT NULL;
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS products_geo_ad AFTER DELETE ON products BEGIN
+        DELETE FROM products_geo WHERE id = old.id;
+    END''')
+
+    if backfill:
+        rows = conn.execute("SELECT id, location FROM products WHERE location IS NOT NULL").fetchall()
+        for product_id, location in rows:
+            point = geo.geocode(location)
+            if point:
+                conn.execute("UPDATE products SET lat = ?, lon = ? WHERE id = ?", (*point, product_id))
+
+
+def _listing_indexes(conn):
+    # The marketplace lists newest first; without this every visit sorts the whole table
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at DESC, id DESC)")
+    # Schemes are read one type at a time
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schemes_type ON schemes (type)")
+    # Expiry sweeps of the answer cache
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_created ON answer_cache (created_at)")
+
+
+def _scheme_catalog(conn):
+    conn.execute("ALTER TABLE schemes ADD COLUMN code TEXT")
+    conn.execute("ALTER TABLE schemes ADD COLUMN min_land_ha REAL")
+    conn.execute("ALTER TABLE schemes ADD COLUMN max_land_ha REAL")
+    # Rows seeded before codes existed get one from their name, so the bundled
+    # catalog loaded by init_db updates them in place instead of adding duplicates
+    taken = set()
+    for scheme_id, name in conn.execute("SELECT id, name FROM schemes ORDER BY id").fetchall():
+        code = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+        if code in taken:
+            code = f"{code}-{scheme_id}"
+        taken.add(code)
+        conn.execute("UPDATE schemes SET code = ? WHERE id = ?", (code, scheme_id))
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_schemes_code ON schemes (code)")
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS scheme_eligibility (
+        attribute TEXT NOT NULL,
+        value TEXT NOT NULL,
+        scheme_id INTEGER NOT NULL,
+        PRIMARY KEY (attribute, value, scheme_id)
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheme_eligibility_scheme ON scheme_eligibility (scheme_id)")
+
+    # Bumped by triggers on any change, so cached catalogs know to reload
+    conn.execute('''CREATE TABLE IF NOT EXISTS catalog_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID''')
+    conn.execute("INSERT OR IGNORE INTO catalog_versions (name, version) VALUES ('schemes', 1)")
+    for table in ("schemes", "scheme_eligibility"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                             AFTER {event} ON {table} BEGIN
+                                 UPDATE catalog_versions SET version = version + 1 WHERE name = 'schemes';
+                             END''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS farmer_profiles (
+        user_id INTEGER PRIMARY KEY,
+        state TEXT,
+        land_ha REAL,
+        crop TEXT,
+        category TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+
+def _offline_sync(conn):
+    # Change log, sync cursors and global ids for kiosk replicas (sync.py)
+    conn.execute('''CREATE TABLE IF NOT EXISTS changelog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        key TEXT NOT NULL,
+        op TEXT NOT NULL,
+        origin TEXT NOT NULL
+    )''')
+    # node, origin (stamped on new changelog rows; none until enabled), pushed and pulled cursors
+    conn.execute('''CREATE TABLE IF NOT EXISTS sync_state (
+        name TEXT PRIMARY KEY,
+        value
+    ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS sync_ids (
+        tbl TEXT NOT NULL,
+        gid TEXT NOT NULL,
+        local_id INTEGER NOT NULL,
+        alias INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tbl, gid)
+    ) WITHOUT ROWID''')
+    # An alias is a second name for a merged row; every other row has one global id
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_sync_ids_local ON sync_ids (tbl, local_id) WHERE alias = 0")
+    _changelog_triggers(conn, {
+        "users": (("id",), ("name", "contact", "password", "created_at")),
+        "posts": (("id",), ("user_id", "content", "image_hash", "created_at")),
+        "products": (("id",), ("user_id", "name", "description", "price", "location", "contact",
+                               "image_hash", "lat", "lon", "created_at")),
+        "comments": (("id",), ("post_id", "user_id", "content", "created_at")),
+        "likes": (("post_id", "user_id"), ()),
+        "prices": (("market", "crop", "variety", "date"), ("min_price", "max_price", "modal_price")),
+    })
+
+    # Model requests waiting for the link to come back (outbox.py)
+    conn.execute('''CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        ref TEXT,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at REAL NOT NULL,
+        completed_at REAL
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, id)")
+    # "Is anything still queued for this conversation / photo?"
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_ref ON outbox (kind, ref, status)")
+
+
+def _changelog_triggers(conn, tables):
+    """(Re)create the triggers that log changes to tables while this replica has a sync origin.
+
+    tables maps a table to (key columns, synced columns) and is written out
+    in the calling migration rather than read from sync.TABLES, so that a
+    migration keeps creating the same triggers. Changing the synced columns
+    means a new migration calling this with the new columns.
+    """
+    origin = "(SELECT value FROM sync_state WHERE name = 'origin')"
+    for table, (key, columns) in tables.items():
+        new_key = f"json_array({', '.join('NEW.' + c for c in key)})"
+        old_key = f"json_array({', '.join('OLD.' + c for c in key)})"
+        # Updates that leave every synced column alone (posts.likes) are not logged
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in key + columns)
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_changelog_{event}")
+        conn.execute(f'''CREATE TRIGGER {table}_changelog_insert AFTER INSERT ON {table}
+                         WHEN {origin} IS NOT NULL BEGIN
+                             INSERT INTO changelog (tbl, key, op, origin) VALUES ('{table}', {new_key}, 'upsert', {origin});
+                         END''')
+        conn.execute(f'''CREATE TRIGGER {table}_changelog_update AFTER UPDATE ON {table}
+                         WHEN {origin} IS NOT NULL AND ({changed}) BEGIN
+                             INSERT INTO changelog (tbl, key, op, origin)
+                                 SELECT '{table}', {old_key}, 'delete', {origin} WHERE {old_key} IS NOT {new_key};
+                             INSERT INTO changelog (tbl, key, op, origin) VALUES ('{table}', {new_key}, 'upsert', {origin});
+                         END''')
+        conn.execute(f'''CREATE TRIGGER {table}_changelog_delete AFTER DELETE ON {table}
+                         WHEN {origin} IS NOT NULL BEGIN
+                             INSERT INTO changelog (tbl, key, op, origin) VALUES ('{table}', {old_key}, 'delete', {origin});
+                         END''')
+
+
+def _prices_by_date(conn):
+    # refresh_rollups re-aggregates the days since the last import; the
+    # (market, crop, date) index can only serve that range by walking all of it
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prices_date ON prices (date, market, crop)")
+
+
+
+def _reweigh_rollups(conn):
+    # Rollups are derived; rows without a modal price used to count towards
+    # samples and pulled weekly and monthly averages down
+    prices.refresh_rollups(conn)
+
+
+
+def _bundled_imports(conn):
+    # Content hash of each data/ file last loaded by init_db, so a file is
+    # only reapplied when a release changes it
+    conn.execute('''CREATE TABLE IF NOT EXISTS bundled_imports (
+        name TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        imported_at REAL NOT NULL
+    ) WITHOUT ROWID''')
+
+
+# (version, description, function); append only, never renumber or edit an applied migration
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "indexes for listings and answer cache expiry", _listing_indexes),
+    (3, "scheme catalog with eligibility attributes and farmer profiles", _scheme_catalog),
+    (4, "change log for kiosk replication and the queue of offline model requests", _offline_sync),
+    (5, "index prices by date for rollup refreshes", _prices_by_date),
+    (6, "recompute price rollups weighted by prices with a modal price", _reweigh_rollups),
+    (7, "record which bundled data files have been loaded", _bundled_imports),
+]
+
+# Functions whose full scans are expected
+ALLOWED_SCANS = {
+    # Schema setup and backfills, which only run inside migrations
+    "_prices_natural_key", "_search_indexes", "_product_coordinates", "migrate_image_blobs",
+    "_scheme_catalog",
+    # Loads every cached question into the in-memory term index, once per process
+    "_index",
+    # `i18n.py --fill` walks all schemes and crops on purpose
+    "content_sources",
+    # The scheme catalog is read whole once per catalog version
+    "load_catalog",
+    # Newest-first first pages walk an index and stop after LIMIT rows
+    "fetch_feed_page", "get_listings",
+    # Least recently used answers, LIMIT the overflow; counted once per eviction batch
+    "_evict", "_count_rows",
+    # Queued requests per status, for the debug page
+    "counts",
+    # Falls back to the raw prices only while no rollups exist yet
+    "list_markets",
+}
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending(conn, migrations=MIGRATIONS):
+    version = current_version(conn)
+    return [m for m in migrations if m[0] > version]
+
+
+def migrate(conn, migrations=MIGRATIONS, analyze=True):
+    """Apply pending migrations in order; returns the versions applied.
+
+    BEGIN IMMEDIATE takes the write lock before the version is re-read, so
+    two processes starting at once apply each migration exactly once.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    for version, _, apply in migrations:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            # PRAGMA does not take parameters; version is always an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    if applied and analyze:
+        # New indexes are only picked when the planner has statistics for them;
+        # analysis_limit keeps ANALYZE to a sample on large tables
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    return applied
+
+
+# Dry run ---------------------------------------------------------------------
+
+_SQL_START = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b", re.IGNORECASE)
+_BINDINGS = re.compile(r"uses (\d+), and there are")
+# Walking a whole index is still a full scan; only SEARCH narrows to a range.
+# Virtual tables (FTS5, R*Tree) filter inside their own index.
+_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)(?: AS \w+)?(?!.*\bVIRTUAL TABLE\b)")
+
+
+def _literal_sql(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str) and _SQL_START.match(node.value):
+        return node.value
+    return None
+
+
+def _functions(tree):
+    """Yield (function name, node) for every node, attributed to its innermost def."""
+    def walk(node, name):
+        for child in ast.iter_child_nodes(node):
+            inner = child.name if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) else name
+            yield inner, child
+            yield from walk(child, inner)
+    yield from walk(tree, "<module>")
+
+
+def static_queries(root=ROOT):
+    """(location, function, sql) for every string literal passed to execute() in the app.
+
+    Queries assembled at runtime (f-strings, concatenation) are covered by
+    traced_queries() instead.
+    """
+    paths = [os.path.join(root, name) for name in sorted(os.listdir(root)) if name.endswith(".py")]
+    views = os.path.join(root, "views")
+    paths += [os.path.join(views, name) for name in sorted(os.listdir(views)) if name.endswith(".py")]
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for function, node in _functions(tree):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany") and node.args):
+                sql = _literal_sql(node.args[0])
+                if sql:
+                    yield f"{os.path.relpath(path, root)}:{node.lineno}", function, sql
+
+
+def traced_queries(conn):
+    """(location, function, sql) for the queries the app builds at runtime, captured by running them."""
+    import feed
+    import likes
+
+    statements = []
+    workload = [
+        (feed.fetch_feed_page, (None,)),
+        (feed.fetch_feed_page, (("2024-01-01 00:00:00", 1),)),
+        (feed.latest_post_id, ()),
+        (feed.fetch_newer, (1,)),
+        (feed.load_like_counts, ([1, 2],)),
+        (feed.load_comment_counts, ([1, 2],)),
+        (feed.load_comments, ([1, 2],)),
+        (likes.liked_post_ids, (1, [1, 2])),
+        (search.search_posts, ("wheat rust",)),
+        (search.search_comments, ("wheat rust",)),
+        (search.search_products, ("tractor pune",)),
+        (prices.refresh_rollups, (prices.latest_price_date(conn),)),
+    ]
+    conn.set_trace_callback(statements.append)
+    try:
+        for function, args in workload:
+            start = len(statements)
+            function(conn, *args)
+            for sql in statements[start:]:
+                # Skip the statements FTS5 issues against its own shadow tables
+                if _SQL_START.match(sql) and "'main'." not in sql:
+                    yield f"{function.__module__}.{function.__name__}", function.__name__, sql
+    finally:
+        conn.set_trace_callback(None)
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN rows for sql, binding NULL to any parameters."""
+    try:
+        return conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    except sqlite3.ProgrammingError as e:
+        match = _BINDINGS.search(str(e))
+        if not match:
+            raise
+        return conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * int(match.group(1))).fetchall()
+
+
+def full_scans(plan):
+    """Tables in plan read without an index."""
+    return [m.group(1) for m in (_SCAN.match(row[3]) for row in plan) if m]
+
+
+def _render_plan(plan):
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in plan:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def dry_run(path, out=sys.stdout):
+    """Print pending migrations and every query's plan; returns the number of unexpected scans."""
+    scratch = sqlite3.connect(":memory:")
+    if os.path.exists(path):
+        with sqlite3.connect(path) as source:
+            source.backup(scratch)
+
+    todo = pending(scratch)
+    print(f"Database {path} is at version {current_version(scratch)}", file=out)
+    for version, description, _ in todo:
+        print(f"  would apply {version}: {description}", file=out)
+    if not todo:
+        print("  no pending migrations", file=out)
+    migrate(scratch)
+
+    seen = set()
+    problems = 0
+    queries = list(static_queries()) + list(traced_queries(scratch))
+    for location, function, sql in queries:
+        normalized = " ".join(sql.split())
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        try:
+            plan = explain(scratch, sql)
+        except sqlite3.Error as e:
+            print(f"\n{location}\n  {normalized}\n  ERROR {e}", file=out)
+            problems += 1
+            continue
+        scans = [] if function in ALLOWED_SCANS else full_scans(plan)
+        problems += bool(scans)
+        flag = f"  <-- full scan of {', '.join(scans)}" if scans else ""
+        print(f"\n{location}{flag}\n  {normalized}", file=out)
+        for line in _render_plan(plan):
+            print(f"  {line}", file=out)
+    print(f"\n{len(seen)} queries, {problems} with unexpected full scans or errors", file=out)
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply or preview schema migrations.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="show pending migrations and query plans without changing the database")
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        return 1 if dry_run(args.db) else 0
+    conn = connect(args.db)
+    try:
+        before = current_version(conn)
+        applied = migrate(conn)
+        print(f"Version {before} -> {current_version(conn)}; applied {applied or 'nothing'}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
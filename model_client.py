@@ -0,0 +1,378 @@
+"""Rate limiting, request coalescing and retries around the Gemini client.
+
+Every model call in the process goes through one ModelClient:
+
+* a token bucket paces calls to the API quota (KRISHI_MODEL_RPM requests a
+  minute in bursts of up to KRISHI_MODEL_BURST; 0 turns pacing off), and a
+  caller that cannot get a slot within max_wait gets ModelBusy instead of
+  joining an ever-longer queue;
+* identical text prompts in flight at the same time share one upstream
+  call, streamed or not;
+* quota and server errors (429, 500, 503, 504) and timeouts are retried
+  with full-jitter exponential backoff until the call's deadline. A stream
+  is only retried until its first chunk arrives;
+* a call that ends on a quota or overload error (429, 503), or times out
+  while every worker is still held by earlier attempts, raises ModelBusy;
+* a call that ends on a network error or gateway timeout (504) raises
+  ModelOffline, and for the next KRISHI_MODEL_OFFLINE_RETRY seconds calls
+  fail fast with ModelOffline instead of each waiting out its deadline, so
+  pages can queue the request (outbox.py) while a kiosk's link is down.
+
+Calls, retries, coalesced requests and rejections are counted per endpoint
+(text, text_stream, vision) in the metrics registry.
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+
+RPM = float(os.getenv("KRISHI_MODEL_RPM", "15"))
+BURST = int(os.getenv("KRISHI_MODEL_BURST", "5"))
+
+OFFLINE_RETRY = float(os.getenv("KRISHI_MODEL_OFFLINE_RETRY", "60"))
+
+RETRYABLE_CODES = {429, 500, 503, 504}
+# Gateway timeout: the endpoint cannot be reached from here
+UNREACHABLE_CODES = {504}
+# The model answered but is overloaded or over quota: try again later rather than queue
+BUSY_CODES = {429, 503}
+
+
+class ModelBusy(Exception):
+    """The model could not be called in time; the caller should try again later."""
+
+
+class ModelOffline(Exception):
+    """The model cannot be reached; the request can be queued until the link is back."""
+
+
+class TokenBucket:
+    """Hands out `rate` tokens a second, holding at most `burst` unused ones."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token now or return the seconds until one is due."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout):
+        """Wait for a token; returns the seconds waited, or None if none came within timeout."""
+        started = self._clock()
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return self._clock() - started
+            if self._clock() - started + wait > timeout:
+                return None
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    """Quota, transient server errors and timeouts; google.api_core errors carry an HTTP code."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_CODES
+
+
+def is_unreachable(error):
+    """Network failures, timeouts and gateway timeouts."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in UNREACHABLE_CODES
+
+
+def is_busy(error):
+    """Quota and overload errors from a model that did answer."""
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in BUSY_CODES
+
+
+class _Flight:
+    """One upstream call shared by identical concurrent requests."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class _SharedStream:
+    """A streamed response several readers iterate independently.
+
+    Whichever reader first needs a chunk nobody has fetched yet pulls it
+    from upstream, so the stream keeps going even if one reader stops early.
+    """
+
+    def __init__(self, client, name, contents, kwargs, on_done):
+        self._client = client
+        self._name = name
+        self._contents = contents
+        self._kwargs = kwargs
+        self._on_done = on_done
+        self._chunks = []
+        self._upstream = None
+        self._finished = False
+        self._error = None
+        self._pulling = False
+        self._cond = threading.Condition()
+
+    def _next(self):
+        if self._upstream is None:
+            first, self._upstream = self._client._open_stream(self._name, self._contents, self._kwargs)
+            return first
+        return self._client._with_timeout(next, self._upstream)
+
+    def _chunk(self, index):
+        with self._cond:
+            while True:
+                if index < len(self._chunks):
+                    return self._chunks[index]
+                if self._finished:
+                    if self._error is not None:
+                        raise self._error
+                    raise StopIteration
+                if not self._pulling:
+                    self._pulling = True
+                    break
+                self._cond.wait()
+        chunk, finished, error = None, False, None
+        try:
+            chunk = self._next()
+        except StopIteration:
+            finished = True
+        except Exception as e:
+            finished, error = True, e
+        with self._cond:
+            self._pulling = False
+            if finished:
+                self._finished, self._error = True, error
+            else:
+                self._chunks.append(chunk)
+            self._cond.notify_all()
+        if finished:
+            self._on_done()
+            if error is not None:
+                raise error
+            raise StopIteration
+        return chunk
+
+    def __iter__(self):
+        index = 0
+        while True:
+            try:
+                chunk = self._chunk(index)
+            except StopIteration:
+                return
+            yield chunk
+            index += 1
+
+
+class ModelClient:
+    """Drop-in for GenerativeModel.generate_content with pacing, coalescing and retries.
+
+    timeout bounds each upstream attempt (for streams, the wait for each
+    chunk) and deadline the whole call including backoff. An attempt that
+    times out keeps running on a worker thread until the client library
+    gives up on it, but nobody waits for it. While such attempts hold every
+    worker, a timeout says nothing about the link, so it raises ModelBusy.
+    """
+
+    def __init__(self, model, rpm=RPM, burst=BURST, max_wait=10.0, max_attempts=4,
+                 timeout=30.0, deadline=60.0, base_delay=1.0, max_delay=16.0, max_workers=8,
+                 offline_retry=OFFLINE_RETRY):
+        self.model = model
+        self.bucket = TokenBucket(rpm / 60.0, max(burst, 1)) if rpm > 0 else None
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.offline_retry = offline_retry
+        self._offline_until = 0.0
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-call")
+        # Attempts submitted and not finished, including abandoned ones
+        self._unfinished = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        name = metrics.endpoint_name(contents, stream)
+        metrics.REGISTRY.inc("model_requests", name)
+        # Images are not hashed here; jobs.AnalysisJobs already dedupes photos by content hash
+        if not isinstance(contents, str):
+            return self._call(name, contents, stream, kwargs)
+
+        key = (stream, hashlib.sha256(contents.encode()).hexdigest(), repr(sorted(kwargs.items())))
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                if stream:
+                    flight = _SharedStream(self, name, contents, kwargs, lambda: self._land(key))
+                else:
+                    flight = _Flight()
+                self._inflight[key] = flight
+        if not leader:
+            metrics.REGISTRY.inc("model_coalesced", name)
+        if stream:
+            return flight
+        if leader:
+            try:
+                flight.response = self._call(name, contents, False, kwargs)
+            except Exception as e:
+                flight.error = e
+            finally:
+                self._land(key)
+                flight.done.set()
+        elif not flight.done.wait(self.deadline):
+            raise ModelBusy("Timed out waiting for an identical request")
+        if flight.error is not None:
+            raise flight.error
+        return flight.response
+
+    @property
+    def offline(self):
+        """True while calls fail fast after the model was found unreachable."""
+        return time.monotonic() < self._offline_until
+
+    def _land(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _release_worker(self, future):
+        with self._lock:
+            self._unfinished -= 1
+
+    def _with_timeout(self, fn, *args, timeout=None, **kwargs):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            saturated = self._unfinished >= self.max_workers
+            self._unfinished += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release_worker)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # Still queued, or queued behind abandoned attempts: the pool is full, not the link down
+            if future.cancel() or saturated:
+                raise ModelBusy("Every model worker is busy") from None
+            raise TimeoutError(f"Model call took longer than {timeout:.1f}s") from None
+
+    def _attempts(self, name):
+        """Yield before each attempt, pacing to the quota and backing off after failures.
+
+        The caller reports a retryable failure by sending the error in; anything
+        else ends the loop.
+        """
+        if self.offline:
+            metrics.REGISTRY.inc("model_offline", name)
+            raise ModelOffline("The model was unreachable moments ago")
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            remaining = self.deadline - (time.monotonic() - started)
+            if self.bucket is not None:
+                waited = self.bucket.acquire(min(self.max_wait, remaining))
+                if waited is None:
+                    metrics.REGISTRY.inc("model_throttled", name)
+                    raise ModelBusy("Too many requests to the model right now")
+                if waited:
+                    metrics.REGISTRY.observe("model_wait", name, waited)
+            error = yield min(self.timeout, max(remaining, 0.001))
+            if error is None:
+                return
+            if attempt + 1 == self.max_attempts:
+                raise error
+            # Full jitter keeps sessions that failed together from retrying together
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            if time.monotonic() - started + delay >= self.deadline:
+                raise error
+            metrics.REGISTRY.inc("model_retries", name)
+            time.sleep(delay)
+
+    def _retrying(self, name, attempt):
+        """Run attempt(timeout) under _attempts' pacing and backoff; returns its result."""
+        attempts = self._attempts(name)
+        timeout = next(attempts)
+        while True:
+            try:
+                result = attempt(timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    metrics.REGISTRY.inc("model_failures", name)
+                    raise
+                try:
+                    timeout = attempts.send(e)
+                except Exception as final:
+                    metrics.REGISTRY.inc("model_failures", name)
+                    if final is e and is_unreachable(e):
+                        # Out of attempts on a network error: fail fast for a while
+                        self._offline_until = time.monotonic() + self.offline_retry
+                        metrics.REGISTRY.inc("model_offline", name)
+                        raise ModelOffline(str(e) or type(e).__name__) from e
+                    if final is e and is_busy(e):
+                        raise ModelBusy(str(e) or type(e).__name__) from e
+                    raise
+                continue
+            attempts.close()
+            return result
+
+    def _call(self, name, contents, stream, kwargs):
+        if stream:
+            return self._open_stream(name, contents, kwargs, chained=True)
+        return self._retrying(name, lambda timeout: self._with_timeout(
+            self.model.generate_content, contents, stream=False, timeout=timeout, **kwargs))
+
+    def _open_stream(self, name, contents, kwargs, chained=False):
+        """Start a stream and fetch its first chunk, retrying until one arrives.
+
+        Returns (first chunk, upstream iterator), or with chained an iterator
+        over the whole stream.
+        """
+        def attempt(timeout):
+            upstream = iter(self._with_timeout(self.model.generate_content, contents, stream=True,
+                                               timeout=timeout, **kwargs))
+            try:
+                return self._with_timeout(next, upstream, timeout=timeout), upstream
+            except StopIteration:
+                return None, upstream
+
+        first, upstream = self._retrying(name, attempt)
+        if not chained:
+            if first is None:
+                raise StopIteration
+            return first, upstream
+        return self._chain(first, upstream)
+
+    def _chain(self, first, upstream):
+        if first is None:
+            return
+        yield first
+        while True:
+            try:
+                yield self._with_timeout(next, upstream)
+            except StopIteration:
+                return
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
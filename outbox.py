@@ -0,0 +1,129 @@
+"""Model requests taken while the link was down, answered once it is back.
+
+A page that gets ModelOffline from the model client queues the request
+(a kind plus a JSON payload) instead of showing an error. A background
+thread tries the oldest queued requests every interval; the handler
+registered for a kind does the work, and raising ModelOffline or ModelBusy
+leaves the request queued for the next round.
+
+    KRISHI_OUTBOX_INTERVAL=30    # seconds between rounds while requests are queued
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from model_client import ModelBusy, ModelOffline
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = float(os.getenv("KRISHI_OUTBOX_INTERVAL", "30"))
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+# Any other error counts as an attempt; a request is dropped after this many
+MAX_ATTEMPTS = 3
+
+
+class Outbox:
+    """Queue of requests for the model, drained on a background thread once started."""
+
+    def __init__(self, pool, interval=INTERVAL, max_attempts=MAX_ATTEMPTS):
+        self.pool = pool
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._handlers = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, kind, handler):
+        """handler(payload) answers one request of kind."""
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind, payload, ref=None):
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''INSERT INTO outbox (kind, ref, payload, status, created_at)
+                                     VALUES (?, ?, ?, ?, ?)''',
+                                  (kind, ref, json.dumps(payload), QUEUED, time.time()))
+            return cursor.lastrowid
+
+    def waiting(self, kind=None, ref=None):
+        """Number of queued requests, optionally of one kind and ref."""
+        with self.pool.connection() as conn:
+            if kind is None:
+                row = conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (QUEUED,)).fetchone()
+            else:
+                row = conn.execute("SELECT COUNT(*) FROM outbox WHERE kind = ? AND ref = ? AND status = ?",
+                                   (kind, ref, QUEUED)).fetchone()
+        return row[0]
+
+    def counts(self):
+        """Requests per status, for the debug page."""
+        with self.pool.connection() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def drain(self):
+        """Try every queued request once, oldest first; returns the number answered.
+
+        Stops at the first request that finds the model still unreachable,
+        since the rest would too.
+        """
+        answered = 0
+        last_id = 0
+        while not self._stop.is_set():
+            with self.pool.connection() as conn:
+                row = conn.execute('''SELECT id, kind, payload, attempts FROM outbox
+                                      WHERE status = ? AND id > ? ORDER BY id LIMIT 1''',
+                                   (QUEUED, last_id)).fetchone()
+            if row is None:
+                break
+            last_id = row['id']
+            handler = self._handlers.get(row['kind'])
+            if handler is None:
+                continue
+            try:
+                handler(json.loads(row['payload']))
+            except (ModelOffline, ModelBusy):
+                break
+            except Exception as e:
+                logger.exception("Queued %s request %s failed", row['kind'], row['id'])
+                status = FAILED if row['attempts'] + 1 >= self.max_attempts else QUEUED
+                self._finish(row['id'], status, error=str(e))
+                continue
+            self._finish(row['id'], DONE)
+            answered += 1
+        return answered
+
+    def _finish(self, request_id, status, error=None):
+        completed_at = time.time() if status != QUEUED else None
+        with self.pool.connection() as conn:
+            conn.execute('''UPDATE outbox SET status = ?, attempts = attempts + ?, error = ?, completed_at = ?
+                            WHERE id = ?''', (status, 1 if error else 0, error, completed_at, request_id))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def nudge(self):
+        """Start a round now rather than at the end of the interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Failed to drain the outbox; retrying next interval")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,94 @@
+"""Market price queries and precomputed daily/weekly/monthly rollups.
+
+Trend and market-list queries read price_rollups, which refresh_rollups()
+keeps up to date, so they never scan the raw prices table.
+"""
+from datetime import date, timedelta
+
+# Period bucket for a day column; weeks start on Monday
+PERIODS = {
+    "day": "date({day})",
+    "week": "date({day}, '-6 days', 'weekday 1')",
+    "month": "date({day}, 'start of month')",
+}
+
+
+def _period_start(period, day):
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def refresh_rollups(conn, since=None):
+    """Recompute rollups for every period touching dates >= since (all dates if None).
+
+    Daily rollups are aggregated from prices in index order; weekly and
+    monthly ones are folded from the daily rollups instead of the raw rows,
+    weighting each day's average by the rows it averaged (samples, which
+    leaves out rows without a modal price).
+    """
+    query = '''INSERT OR REPLACE INTO price_rollups
+                 (period, period_start, market, crop, min_price, max_price, avg_modal_price, samples)
+                 SELECT 'day', date, market, crop,
+                        MIN(min_price), MAX(max_price), AVG(modal_price), COUNT(modal_price)
+                 FROM prices '''
+    params = []
+    if since is not None:
+        query += "WHERE date >= ?"
+        params.append(since.isoformat())
+    conn.execute(query + " GROUP BY market, crop, date", params)
+
+    for period in ("week", "month"):
+        bucket = PERIODS[period].format(day="period_start")
+        query = f'''INSERT OR REPLACE INTO price_rollups
+                     (period, period_start, market, crop, min_price, max_price, avg_modal_price, samples)
+                     SELECT ?, {bucket} AS bucket, market, crop, MIN(min_price), MAX(max_price),
+                            SUM(avg_modal_price * samples) / SUM(samples), SUM(samples)
+                     FROM price_rollups WHERE period = 'day' '''
+        params = [period]
+        if since is not None:
+            query += "AND period_start >= ?"
+            params.append(_period_start(period, since).isoformat())
+        conn.execute(query + " GROUP BY market, crop, bucket", params)
+
+
+def list_markets(conn):
+    markets = [row[0] for row in conn.execute(
+        "SELECT DISTINCT market FROM price_rollups WHERE period = 'month' ORDER BY market")]
+    if not markets:
+        markets = [row[0] for row in conn.execute("SELECT DISTINCT market FROM prices ORDER BY market")]
+    return markets
+
+
+def latest_price_date(conn):
+    row = conn.execute("SELECT MAX(period_start) FROM price_rollups WHERE period = 'day'").fetchone()
+    return date.fromisoformat(row[0]) if row[0] else date.today()
+
+
+def latest_prices(conn, market, start, end):
+    """Most recent price row per crop and variety in market between start and end."""
+    rows = conn.execute('''SELECT crop, variety, min_price, max_price, modal_price, date FROM prices p
+                           WHERE market = ? AND date BETWEEN ? AND ?
+                             AND date = (SELECT MAX(date) FROM prices
+                                         WHERE market = p.market AND crop = p.crop
+                                           AND variety IS p.variety
+                                           AND date BETWEEN ? AND ?)
+                           ORDER BY crop, variety''',
+                        (market, start.isoformat(), end.isoformat(), start.isoformat(), end.isoformat()))
+    return [dict(row) for row in rows]
+
+
+def price_trend(conn, market, crop, period, start, end):
+    """Rolled-up min/max/average modal prices for one crop, oldest first."""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+    rows = conn.execute('''SELECT period_start, min_price, max_price, avg_modal_price, samples
+                           FROM price_rollups
+                           WHERE period = ? AND market = ? AND crop = ?
+                             AND period_start BETWEEN ? AND ?
+                           ORDER BY period_start''',
+                        (period, market, crop,
+                         _period_start(period, start).isoformat(), end.isoformat()))
+    return [dict(row) for row in rows]
@@ -0,0 +1,247 @@
+"""Scheme catalog: eligibility attributes, a version stamp and profile matching.
+
+Each scheme may be restricted by state, crop and social category (rows in
+scheme_eligibility) and by land holding (min_land_ha/max_land_ha). A scheme
+with no rows for an attribute is open to everyone on that attribute.
+
+The catalog is read once per version into a SchemeCatalog, which keeps an
+inverted index value -> scheme ids per attribute, so matching a farmer
+profile is a few set intersections. Triggers bump catalog_versions on any
+change to the schemes or their attributes, so cached catalogs in every
+process know when to reload.
+
+    python schemes.py --import myscheme_export.csv    # upsert schemes on their code
+
+Import files use the columns of data/schemes.csv; multi-valued columns
+(states, crops, categories) are separated by ";".
+"""
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sys
+import time
+
+from db import DB_PATH, connect
+
+SCHEMES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "schemes.csv")
+
+# Eligibility attributes held in scheme_eligibility; land holding has its own columns
+ATTRIBUTES = ("state", "crop", "category")
+# Import column -> attribute
+ATTRIBUTE_COLUMNS = {"states": "state", "crops": "crop", "categories": "category"}
+
+CATEGORIES = ("General", "OBC", "SC", "ST")
+STATES = (
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan",
+    "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    # Union territories
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry",
+)
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def scheme_code(name):
+    return _NON_WORD.sub("-", name.lower()).strip("-")
+
+
+def _key(value):
+    return " ".join(value.split()).casefold()
+
+
+def catalog_version(conn):
+    row = conn.execute("SELECT version FROM catalog_versions WHERE name = 'schemes'").fetchone()
+    return row[0] if row else 0
+
+
+# Import ----------------------------------------------------------------------
+
+def _split(value):
+    return [part.strip() for part in (value or "").split(";") if part.strip()]
+
+
+def _land(value):
+    value = (value or "").strip()
+    return float(value) if value else None
+
+
+def import_schemes(conn, records):
+    """Upsert scheme records (dicts with the data/schemes.csv columns) on their code.
+
+    A record's eligibility attributes replace the stored ones. Returns the
+    number of records written.
+    """
+    count = 0
+    for record in records:
+        name = record["name"].strip()
+        code = (record.get("code") or "").strip() or scheme_code(name)
+        scheme_id = conn.execute('''INSERT INTO schemes
+                                        (code, name, description, eligibility, type, link, min_land_ha, max_land_ha)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                    ON CONFLICT (code) DO UPDATE SET
+                                        name = excluded.name, description = excluded.description,
+                                        eligibility = excluded.eligibility, type = excluded.type,
+                                        link = excluded.link, min_land_ha = excluded.min_land_ha,
+                                        max_land_ha = excluded.max_land_ha
+                                    RETURNING id''',
+                                 (code, name, record.get("description") or "", record.get("eligibility") or "",
+                                  record.get("type") or "government", record.get("link") or "#",
+                                  _land(record.get("min_land_ha")), _land(record.get("max_land_ha")))).fetchone()[0]
+        conn.execute("DELETE FROM scheme_eligibility WHERE scheme_id = ?", (scheme_id,))
+        conn.executemany("INSERT OR IGNORE INTO scheme_eligibility (attribute, value, scheme_id) VALUES (?, ?, ?)",
+                         [(attribute, value, scheme_id)
+                          for column, attribute in ATTRIBUTE_COLUMNS.items()
+                          for value in _split(record.get(column))])
+        count += 1
+    return count
+
+
+def import_csv(conn, path=SCHEMES_CSV):
+    with open(path, newline="", encoding="utf-8") as f:
+        return import_schemes(conn, csv.DictReader(f))
+
+
+def import_bundled(conn, path=SCHEMES_CSV):
+    """Load the bundled catalog if it changed since it was last loaded; returns schemes written.
+
+    Runs on every start. Schemes updated with --import keep their edits
+    until a release ships a different data/schemes.csv.
+    """
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    row = conn.execute("SELECT sha256 FROM bundled_imports WHERE name = 'schemes'").fetchone()
+    if row and row[0] == digest:
+        return 0
+    count = import_csv(conn, path)
+    conn.execute('''INSERT INTO bundled_imports (name, sha256, imported_at) VALUES ('schemes', ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET sha256 = excluded.sha256, imported_at = excluded.imported_at''',
+                 (digest, time.time()))
+    return count
+
+
+# Catalog ---------------------------------------------------------------------
+
+class SchemeCatalog:
+    """All schemes in memory with an inverted index over their eligibility attributes.
+
+    Read-only once built, so one instance can be shared by every session;
+    callers must not modify the scheme dicts it returns.
+    """
+
+    def __init__(self, schemes, eligibility, version=None):
+        self.version = version
+        self.schemes = {scheme["id"]: scheme for scheme in schemes}
+        self.index = {attribute: {} for attribute in ATTRIBUTES}
+        self.values = {attribute: {} for attribute in ATTRIBUTES}
+        restricted = {attribute: set() for attribute in ATTRIBUTES}
+        states = {}
+        for attribute, value, scheme_id in eligibility:
+            if scheme_id not in self.schemes or attribute not in self.index:
+                continue
+            self.index[attribute].setdefault(_key(value), set()).add(scheme_id)
+            self.values[attribute].setdefault(_key(value), value)
+            restricted[attribute].add(scheme_id)
+            if attribute == "state":
+                states.setdefault(scheme_id, []).append(value)
+
+        everyone = set(self.schemes)
+        # Schemes that do not restrict an attribute match any value of it
+        self.open = {attribute: everyone - restricted[attribute] for attribute in ATTRIBUTES}
+        for scheme in self.schemes.values():
+            scheme["restrictions"] = (sum(scheme["id"] in restricted[a] for a in ATTRIBUTES)
+                                      + (scheme["min_land_ha"] is not None)
+                                      + (scheme["max_land_ha"] is not None))
+            scheme["states"] = sorted(states.get(scheme["id"], []))
+        self.by_type = {}
+        for scheme in sorted(self.schemes.values(), key=lambda s: s["name"].casefold()):
+            self.by_type.setdefault(scheme["type"], []).append(scheme)
+
+    def __len__(self):
+        return len(self.schemes)
+
+    def choices(self, attribute):
+        """Values some scheme is restricted to, e.g. the crops worth asking about."""
+        return sorted(self.values[attribute].values(), key=str.casefold)
+
+    def eligible(self, profile):
+        """Schemes profile qualifies for, most specifically targeted first.
+
+        profile has optional state, crop, category and land_ha; an attribute
+        left empty does not rule anything out.
+        """
+        candidates = None
+        for attribute in ATTRIBUTES:
+            value = profile.get(attribute)
+            if not value:
+                continue
+            ids = self.open[attribute] | self.index[attribute].get(_key(value), set())
+            candidates = ids if candidates is None else candidates & ids
+        if candidates is None:
+            candidates = self.schemes.keys()
+
+        land = profile.get("land_ha")
+        matches = []
+        for scheme_id in candidates:
+            scheme = self.schemes[scheme_id]
+            if land is not None and ((scheme["min_land_ha"] is not None and land < scheme["min_land_ha"])
+                                     or (scheme["max_land_ha"] is not None and land > scheme["max_land_ha"])):
+                continue
+            matches.append(scheme)
+        matches.sort(key=lambda s: (-s["restrictions"], s["name"].casefold()))
+        return matches
+
+
+def load_catalog(conn):
+    """Read every scheme and attribute row into a SchemeCatalog."""
+    version = catalog_version(conn)
+    schemes = [dict(row) for row in conn.execute(
+        '''SELECT id, code, name, description, eligibility, type, link, min_land_ha, max_land_ha
+           FROM schemes''')]
+    eligibility = conn.execute("SELECT attribute, value, scheme_id FROM scheme_eligibility").fetchall()
+    return SchemeCatalog(schemes, [tuple(row) for row in eligibility], version)
+
+
+# Profiles --------------------------------------------------------------------
+
+def load_profile(conn, user_id):
+    row = conn.execute("SELECT state, land_ha, crop, category FROM farmer_profiles WHERE user_id = ?",
+                       (user_id,)).fetchone()
+    return dict(row) if row else {}
+
+
+def save_profile(conn, user_id, profile):
+    conn.execute('''INSERT INTO farmer_profiles (user_id, state, land_ha, crop, category)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        state = excluded.state, land_ha = excluded.land_ha, crop = excluded.crop,
+                        category = excluded.category, updated_at = CURRENT_TIMESTAMP''',
+                 (user_id, profile.get("state"), profile.get("land_ha"), profile.get("crop"),
+                  profile.get("category")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import schemes into the catalog.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--import", dest="path", required=True, help="CSV file with the data/schemes.csv columns")
+    args = parser.parse_args(argv)
+
+    from migrations import migrate
+
+    conn = connect(args.db)
+    try:
+        migrate(conn)
+        with conn:
+            count = import_csv(conn, args.path)
+        print(f"Imported {count} schemes; catalog version {catalog_version(conn)}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Full-text search over posts, comments and products with SQLite FTS5.
+
+The *_fts tables are external-content indexes over the base tables, kept
+in sync by triggers. Results are ranked with BM25 and come back a page at a
+time with matches wrapped in markdown bold.
+"""
+import re
+
+PAGE_SIZE = 10
+
+# table -> (indexed columns, BM25 weight per column); the *_fts tables are created by migrations
+INDEXES = {
+    "posts": (("content",), (1.0,)),
+    "comments": (("content",), (1.0,)),
+    # A hit in the product name counts most, then the location
+    "products": (("name", "description", "location"), (10.0, 2.0, 5.0)),
+}
+
+_TOKENS = re.compile(r"\w+", re.UNICODE)
+
+# Connecting words people type into a search box that no listing is about
+STOPWORDS = frozenset("a an and at by for from in near of on or the to with".split())
+
+
+def match_query(text, require_all=True):
+    """Turn free text into an FTS5 query of quoted prefix terms.
+
+    With require_all every word must match (AND); otherwise any word may
+    (OR) and BM25 ranks rows matching more, rarer words first.
+    """
+    tokens = [t for t in _TOKENS.findall(text) if t.casefold() not in STOPWORDS] or _TOKENS.findall(text)
+    return (" " if require_all else " OR ").join(f'"{token}"*' for token in tokens)
+
+
+def _match(conn, fts, text):
+    """Prefer the strict AND query; fall back to OR when nothing matches every word."""
+    strict = match_query(text)
+    if not strict:
+        return None
+    if conn.execute(f"SELECT 1 FROM {fts} WHERE {fts} MATCH ? LIMIT 1", (strict,)).fetchone():
+        return strict
+    return match_query(text, require_all=False)
+
+
+def _page(conn, query, params, page, page_size):
+    rows = conn.execute(query + " LIMIT ? OFFSET ?", (*params, page_size + 1, page * page_size)).fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+def _rank(table):
+    weights = ", ".join(str(w) for w in INDEXES[table][1])
+    return f"bm25({weights})"
+
+
+def search_posts(conn, text, page=0, page_size=PAGE_SIZE):
+    """Return (posts, has_more) for posts matching text, best match first."""
+    match = _match(conn, "posts_fts", text)
+    if not match:
+        return [], False
+    return _page(conn, f'''SELECT p.id, p.created_at, p.likes, u.name AS author,
+                                  highlight(posts_fts, 0, '**', '**') AS content
+                           FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+                           JOIN users u ON p.user_id = u.id
+                           WHERE posts_fts MATCH ? AND rank MATCH '{_rank("posts")}'
+                           ORDER BY rank''', (match,), page, page_size)
+
+
+def search_comments(conn, text, page=0, page_size=PAGE_SIZE):
+    """Return (comments, has_more) for comments matching text, with their post id."""
+    match = _match(conn, "comments_fts", text)
+    if not match:
+        return [], False
+    return _page(conn, f'''SELECT c.id, c.post_id, c.created_at, u.name AS author,
+                                  highlight(comments_fts, 0, '**', '**') AS content
+                           FROM comments_fts JOIN comments c ON c.id = comments_fts.rowid
+                           JOIN users u ON c.user_id = u.id
+                           WHERE comments_fts MATCH ? AND rank MATCH '{_rank("comments")}'
+                           ORDER BY rank''', (match,), page, page_size)
+
+
+def search_products(conn, text, page=0, page_size=PAGE_SIZE):
+    """Return (products, has_more) for listings matching text, best match first."""
+    match = _match(conn, "products_fts", text)
+    if not match:
+        return [], False
+    return _page(conn, f'''SELECT p.id, p.price, p.contact, p.image_hash, p.created_at, u.name AS seller,
+                                  highlight(products_fts, 0, '**', '**') AS name,
+                                  snippet(products_fts, 1, '**', '**', '…', 24) AS description,
+                                  highlight(products_fts, 2, '**', '**') AS location
+                           FROM products_fts JOIN products p ON p.id = products_fts.rowid
+                           JOIN users u ON p.user_id = u.id
+                           WHERE products_fts MATCH ? AND rank MATCH '{_rank("products")}'
+                           ORDER BY rank''', (match,), page, page_size)
@@ -0,0 +1,170 @@
+"""Process-wide resources shared by the pages.
+
+Everything here is created once per server process behind
+st.cache_resource, on first use, so a rerun never repeats setup work and
+the login page never pays for the model client it does not use.
+"""
+import os
+from functools import partial
+
+import streamlit as st
+
+import i18n
+import metrics
+import migrations
+import prices as price_data
+import schemes
+import sync
+from answer_cache import AnswerCache
+from conversations import Conversations
+from credentials import PasswordVerifier
+from db import ConnectionPool, connect
+from fake_model import FakeGenerativeModel
+from jobs import AnalysisJobs
+from likes import LikeBuffer
+from model_client import ModelClient
+from outbox import Outbox
+from tts import SpeechCache
+
+DB_FILE = 'farm.db'
+
+
+# Initialize Gemini AI
+@st.cache_resource
+def get_model():
+    # KRISHI_FAKE_MODEL=1 swaps in a local stand-in for offline runs
+    if os.getenv("KRISHI_FAKE_MODEL"):
+        model = FakeGenerativeModel()
+    else:
+        # Importing the client takes most of a second; only pages that call the model pay for it
+        import google.generativeai as genai
+        genai.configure(api_key=st.secrets.get("GEMINI_API_KEY", os.getenv("GEMINI_API_KEY")))
+        model = genai.GenerativeModel('gemini-1.5-flash')
+    if metrics.ENABLED:
+        model = metrics.InstrumentedModel(model)
+    # One client per process, so the rate limit covers every session
+    return ModelClient(model)
+
+
+# Database setup
+@st.cache_resource
+def get_pool():
+    if metrics.ENABLED:
+        # Every statement's time and row count goes to the metrics registry
+        return ConnectionPool(DB_FILE, connect=partial(connect, factory=metrics.TracedConnection))
+    return ConnectionPool(DB_FILE)
+
+
+def get_db():
+    """Borrow a pooled connection: `with get_db() as conn:` commits on exit"""
+    return get_pool().connection()
+
+
+@st.cache_resource
+def init_db():
+    with get_db() as conn:
+        migrations.migrate(conn)
+        c = conn.cursor()
+
+        # Bundled translations of the UI strings and seeded content
+        i18n.load_catalog(conn)
+        # The bundled scheme catalog, whenever data/schemes.csv has changed
+        schemes.import_bundled(conn)
+
+        # Seed data; kiosk replicas get their prices from the central instance instead
+        # MAX(id) is one descent of the rowid tree; COUNT(*) would read the whole table
+        c.execute("SELECT MAX(id) FROM prices")
+        if c.fetchone()[0] is None and not sync.ENABLED:
+            prices = [
+                ("Pune", "Wheat", "Lokwan", 2200, 2450, 2325),
+                ("Pune", "Rice", "Basmati", 3500, 4200, 3850),
+                ("Pune", "Onion", "Red", 1200, 1800, 1500),
+                ("Pune", "Tomato", "Hybrid", 800, 1400, 1100),
+                ("Pune", "Soybean", "Yellow", 3800, 4200, 4000),
+                ("Mumbai", "Wheat", "Lokwan", 2250, 2500, 2375),
+                ("Mumbai", "Rice", "Basmati", 3600, 4300, 3950),
+                ("Mumbai", "Onion", "Red", 1300, 1900, 1600),
+                ("Mumbai", "Tomato", "Hybrid", 900, 1500, 1200),
+                ("Mumbai", "Soybean", "Yellow", 3900, 4300, 4100)
+            ]
+            c.executemany("INSERT INTO prices (market, crop, variety, min_price, max_price, modal_price) VALUES (?, ?, ?, ?, ?, ?)", prices)
+            price_data.refresh_rollups(conn)
+
+
+@st.cache_resource
+def get_answer_cache():
+    # KRISHI_SEMANTIC_CACHE=1 also answers reworded questions from the cache
+    return AnswerCache(get_pool(), semantic=os.getenv("KRISHI_SEMANTIC_CACHE") == "1")
+
+
+@st.cache_resource
+def get_conversations():
+    return Conversations(get_pool(), get_model())
+
+
+@st.cache_resource
+def get_translator():
+    return i18n.Translator(get_pool(), get_model)
+
+
+@st.cache_resource
+def get_like_buffer():
+    return LikeBuffer(get_pool())
+
+
+@st.cache_resource
+def get_analysis_jobs():
+    return AnalysisJobs(get_pool(), get_model(), outbox=get_outbox())
+
+
+@st.cache_resource
+def get_outbox():
+    return Outbox(get_pool())
+
+
+@st.cache_resource
+def start_outbox():
+    """Register the handlers for queued model requests and answer them in the background."""
+    # views.assistant imports this module, so its handler is imported here
+    from views.assistant import answer_queued
+    outbox = get_outbox()
+    outbox.register("assistant", partial(answer_queued, get_model(), get_conversations(),
+                                         get_answer_cache(), get_translator()))
+    outbox.register("analysis", get_analysis_jobs().retry)
+    outbox.start()
+    return outbox
+
+
+@st.cache_resource
+def resume_outbox():
+    """Answer requests a previous process left queued; the model is only loaded if there are any."""
+    if get_outbox().waiting():
+        start_outbox()
+
+
+@st.cache_resource
+def get_password_verifier():
+    return PasswordVerifier()
+
+
+@st.cache_resource
+def get_speech_cache():
+    return SpeechCache()
+
+
+@st.cache_resource
+def start_metrics_server():
+    """Serve Prometheus text on KRISHI_METRICS_PORT, once per process."""
+    port = os.getenv("KRISHI_METRICS_PORT")
+    return metrics.serve(int(port)) if port and metrics.ENABLED else None
+
+
+@st.cache_resource
+def start_sync():
+    """Sync with the central instance at KRISHI_SYNC_URL, once per process; None when sync is off."""
+    if not sync.ENABLED:
+        return None
+    # A link that is back is a good moment to retry the queued model requests too
+    syncer = sync.Syncer(get_pool(), on_online=get_outbox().nudge)
+    syncer.start()
+    return syncer
@@ -0,0 +1,716 @@
+"""Replication between kiosk replicas and a central instance, for sites offline for hours.
+
+Each kiosk runs the app against its own farm.db. Triggers append every
+change to the synced tables (users, posts, comments, likes, products and
+prices) to changelog. A Syncer thread pushes this replica's changes to the
+central instance and pulls everyone else's back whenever the link is up,
+in batches of zlib-compressed JSON; several changes to a row in one batch
+are sent once, as the row's current state.
+
+Rows keep their own AUTOINCREMENT ids on every replica. On the wire a row
+is named by a global id, "<node>:<id on the node that created it>", and
+sync_ids maps the global ids of rows that came from elsewhere to local
+ids, so posts.user_id, comments.post_id and likes point at the right rows
+everywhere. Prices are named by their (market, crop, variety, date) key.
+
+Conflict rules:
+
+* the last change of a row to reach a replica wins;
+* posts.likes is never sent. Likes travel as (post, user) rows and each
+  replica adds the ones it has not seen yet to the count, so likes given
+  on different kiosks while they were offline all add up;
+* accounts registered on two kiosks with the same contact are merged into
+  the one that reached the replica first.
+
+Photos referenced by posts and products are copied before the rows that
+use them. Start a kiosk from an empty database rather than a copy of the
+central one: everything already there is sent on the first push.
+
+The users table travels with its password hashes and contacts, and a push
+can overwrite any account. The server therefore only listens beyond
+loopback with a token, and the link must be TLS: put the central instance
+behind an HTTPS reverse proxy and point KRISHI_SYNC_URL at https://, or the
+token and every account cross the network in the clear.
+
+    KRISHI_SYNC_URL=https://central:8765  # central instance; unset turns sync off
+    KRISHI_SYNC_NODE=kiosk-12             # this replica's name, unique per kiosk
+    KRISHI_SYNC_TOKEN=...                 # shared secret; the server requires one unless on loopback
+    KRISHI_SYNC_INTERVAL=60               # seconds between sync rounds
+    KRISHI_SYNC_BATCH=500                 # changes per request
+
+    python sync.py serve --db central.db --port 8765   # central instance
+    python sync.py once                                 # one round from this kiosk, then exit
+"""
+import argparse
+import atexit
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from collections import namedtuple
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import images
+import metrics
+from db import DB_PATH, ConnectionPool, connect
+from likes import apply_likes
+from prices import refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+SYNC_URL = os.getenv("KRISHI_SYNC_URL", "").rstrip("/")
+NODE = os.getenv("KRISHI_SYNC_NODE", "")
+TOKEN = os.getenv("KRISHI_SYNC_TOKEN", "")
+INTERVAL = float(os.getenv("KRISHI_SYNC_INTERVAL", "60"))
+BATCH_SIZE = int(os.getenv("KRISHI_SYNC_BATCH", "500"))
+ENABLED = bool(SYNC_URL)
+
+CENTRAL = "central"
+# The server caps what one pull may ask for
+MAX_BATCH_SIZE = 5000
+TIMEOUT = 30.0
+COMPRESSION_LEVEL = 6
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# key: columns naming a row; columns: the rest of what is sent; refs: column -> table it points at
+Table = namedtuple("Table", "key columns refs")
+
+# In dependency order: a batch is applied parents first. The changelog
+# triggers are created by migrations from a frozen copy of these columns, so
+# a change here needs a migration that recreates them (migrations._changelog_triggers)
+TABLES = {
+    "users": Table(("id",), ("name", "contact", "password", "created_at"), {}),
+    "posts": Table(("id",), ("user_id", "content", "image_hash", "created_at"), {"user_id": "users"}),
+    "products": Table(("id",), ("user_id", "name", "description", "price", "location", "contact",
+                                "image_hash", "lat", "lon", "created_at"), {"user_id": "users"}),
+    "comments": Table(("id",), ("post_id", "user_id", "content", "created_at"),
+                      {"post_id": "posts", "user_id": "users"}),
+    "likes": Table(("post_id", "user_id"), (), {"post_id": "posts", "user_id": "users"}),
+    "prices": Table(("market", "crop", "variety", "date"), ("min_price", "max_price", "modal_price"), {}),
+}
+
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+
+class SyncError(Exception):
+    """The central instance refused a request or answered with something unreadable."""
+
+
+def get_state(conn, name, default=None):
+    row = conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+    return default if row is None or row[0] is None else row[0]
+
+
+def set_state(conn, name, value):
+    conn.execute('''INSERT INTO sync_state (name, value) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET value = excluded.value''', (name, value))
+
+
+def enable(conn, node):
+    """Start logging changes as node; the first time, every existing row is logged once.
+
+    Call inside a write transaction. A replica keeps the name it was first
+    enabled with.
+    """
+    current = get_state(conn, "node")
+    if current == node:
+        return
+    if current is not None:
+        raise ValueError(f"This database is already replicated as {current!r}, not {node!r}")
+    set_state(conn, "node", node)
+    set_state(conn, "origin", node)
+    for table, spec in TABLES.items():
+        conn.execute(f'''INSERT INTO changelog (tbl, key, op, origin)
+                         SELECT ?, json_array({", ".join(spec.key)}), ?, ? FROM {table}''',
+                     (table, UPSERT, node))
+
+
+def encode(payload):
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), COMPRESSION_LEVEL)
+
+
+def decode(body):
+    return json.loads(zlib.decompress(body))
+
+
+# Global ids --------------------------------------------------------------------
+
+def _gid(conn, node, table, local_id):
+    if local_id is None:
+        return None
+    row = conn.execute("SELECT gid FROM sync_ids WHERE tbl = ? AND local_id = ? AND alias = 0",
+                       (table, local_id)).fetchone()
+    return row[0] if row else f"{node}:{local_id}"
+
+
+def _local_id(conn, node, table, gid):
+    """Local id for gid, or None if the row has not reached this replica."""
+    if gid is None:
+        return None
+    prefix, _, number = gid.rpartition(":")
+    if prefix == node:
+        return int(number)
+    row = conn.execute("SELECT local_id FROM sync_ids WHERE tbl = ? AND gid = ?", (table, gid)).fetchone()
+    return row[0] if row else None
+
+
+def _is_alias(conn, table, gid):
+    row = conn.execute("SELECT alias FROM sync_ids WHERE tbl = ? AND gid = ?", (table, gid)).fetchone()
+    return bool(row and row[0])
+
+
+def _map(conn, table, gid, local_id, alias=False):
+    conn.execute("INSERT OR REPLACE INTO sync_ids (tbl, gid, local_id, alias) VALUES (?, ?, ?, ?)",
+                 (table, gid, local_id, int(alias)))
+
+
+# Sending -----------------------------------------------------------------------
+
+def _encode_change(conn, node, table, key):
+    """The change for a row as sent: its global key and, unless it is gone, its columns."""
+    spec = TABLES[table]
+    where = " AND ".join(f"{c} = ?" for c in spec.key)
+    row = conn.execute(f"SELECT {', '.join(spec.columns or spec.key)} FROM {table} WHERE {where}", key).fetchone()
+    if spec.key == ("id",):
+        wire_key = [_gid(conn, node, table, key[0])]
+    else:
+        wire_key = [_gid(conn, node, spec.refs[c], v) if c in spec.refs else v for c, v in zip(spec.key, key)]
+    if row is None:
+        return {"table": table, "key": wire_key, "op": DELETE}
+    change = {"table": table, "key": wire_key, "op": UPSERT}
+    if spec.columns:
+        change["row"] = {column: (_gid(conn, node, spec.refs[column], row[column]) if column in spec.refs
+                                  else row[column])
+                         for column in spec.columns}
+    return change
+
+
+def collect(conn, node, after, limit=BATCH_SIZE, origin=None, exclude=None):
+    """Changes logged after seq `after`, one per row, in dependency order.
+
+    origin keeps only changes made on that replica (what a kiosk pushes);
+    exclude drops those made on it (what the central instance sends back to
+    a kiosk). Returns (changes, last seq read, whether more are logged).
+    """
+    if origin is not None:
+        rows = conn.execute('''SELECT seq, tbl, key, origin FROM changelog
+                               WHERE seq > ? AND origin = ? ORDER BY seq LIMIT ?''',
+                            (after, origin, limit)).fetchall()
+    else:
+        rows = conn.execute('''SELECT seq, tbl, key, origin FROM changelog
+                               WHERE seq > ? ORDER BY seq LIMIT ?''', (after, limit)).fetchall()
+    latest = {}
+    for row in rows:
+        if row['origin'] != exclude and row['tbl'] in TABLES:
+            latest[(row['tbl'], row['key'])] = row['seq']
+    order = list(TABLES)
+    rows_to_send = sorted(latest.items(), key=lambda item: (order.index(item[0][0]), item[1]))
+    changes = [_encode_change(conn, node, table, json.loads(key)) for (table, key), _ in rows_to_send]
+    cursor = rows[-1]['seq'] if rows else after
+    return changes, cursor, len(rows) == limit
+
+
+def media_hashes(changes):
+    return sorted({change["row"]["image_hash"] for change in changes
+                   if change["op"] == UPSERT and change.get("row", {}).get("image_hash")})
+
+
+def missing_media(hashes):
+    return [h for h in hashes if _HASH.match(h) and not os.path.exists(images.image_path(h))]
+
+
+def drop_media(changes, lost):
+    """Clear image_hash on rows whose photo is lost, so no page points at a file that is not there."""
+    for change in changes:
+        row = change.get("row")
+        if row and row.get("image_hash") in lost:
+            row["image_hash"] = None
+
+
+# Receiving ---------------------------------------------------------------------
+
+def _apply_row(conn, node, table, change, stats):
+    spec = TABLES[table]
+    gid = change["key"][0]
+    local_id = _local_id(conn, node, table, gid)
+    if change["op"] == DELETE:
+        if local_id is not None:
+            conn.execute(f"DELETE FROM {table} WHERE id = ?", (local_id,))
+        return True
+
+    values = {}
+    for column in spec.columns:
+        value = change["row"].get(column)
+        if column in spec.refs and value is not None:
+            value = _local_id(conn, node, spec.refs[column], value)
+            if value is None:
+                return False
+        values[column] = value
+
+    if table == "users":
+        if local_id is not None and _is_alias(conn, table, gid):
+            # A merged account keeps the details of the one it was merged into
+            return True
+        if local_id is None:
+            # Same contact registered on two replicas: one account, the first to arrive
+            row = conn.execute("SELECT id FROM users WHERE contact = ?", (values["contact"],)).fetchone()
+            if row is not None:
+                _map(conn, table, gid, row[0], alias=True)
+                stats["merged"] += 1
+                return True
+
+    columns = ", ".join(spec.columns)
+    placeholders = ", ".join("?" * len(spec.columns))
+    if local_id is not None:
+        assignments = ", ".join(f"{c} = ?" for c in spec.columns)
+        try:
+            cursor = conn.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", (*values.values(), local_id))
+        except sqlite3.IntegrityError:
+            # e.g. a contact changed to one another account already uses
+            return False
+        if cursor.rowcount == 0:
+            conn.execute(f"INSERT INTO {table} (id, {columns}) VALUES (?, {placeholders})",
+                         (local_id, *values.values()))
+        return True
+    cursor = conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", tuple(values.values()))
+    _map(conn, table, gid, cursor.lastrowid)
+    return True
+
+
+def _apply_like(conn, node, change):
+    post_id = _local_id(conn, node, "posts", change["key"][0])
+    user_id = _local_id(conn, node, "users", change["key"][1])
+    if post_id is None or user_id is None:
+        return False
+    if change["op"] == UPSERT:
+        # Counted only if this replica had not seen the like, so concurrent likes add up
+        apply_likes(conn, [(post_id, user_id)])
+    elif conn.execute("DELETE FROM likes WHERE post_id = ? AND user_id = ?", (post_id, user_id)).rowcount:
+        conn.execute("UPDATE posts SET likes = MAX(likes - 1, 0) WHERE id = ?", (post_id,))
+    return True
+
+
+def _apply_price(conn, change):
+    market, crop, variety, day = change["key"]
+    if change["op"] == DELETE:
+        conn.execute("DELETE FROM prices WHERE market = ? AND crop = ? AND variety = ? AND date = ?",
+                     (market, crop, variety, day))
+    else:
+        row = change["row"]
+        conn.execute('''INSERT INTO prices (market, crop, variety, min_price, max_price, modal_price, date)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (market, crop, variety, date) DO UPDATE SET
+                            min_price = excluded.min_price, max_price = excluded.max_price,
+                            modal_price = excluded.modal_price''',
+                     (market, crop, variety, row["min_price"], row["max_price"], row["modal_price"], day))
+    return day
+
+
+def refresh_deferred_rollups(conn):
+    """Bring price rollups up to date after apply_changes(defer_rollups=True)."""
+    since = get_state(conn, "rollups_since")
+    if since is not None:
+        refresh_rollups(conn, date.fromisoformat(since))
+        set_state(conn, "rollups_since", None)
+
+
+def apply_changes(conn, node, changes, relay_as=None, defer_rollups=False):
+    """Apply changes from another replica inside the caller's write transaction.
+
+    relay_as is the origin they are logged under here, so the central
+    instance passes them on to every kiosk but the one they came from;
+    None applies them without logging. With defer_rollups the price
+    rollups are left for refresh_deferred_rollups(), so a long pull
+    recomputes them once rather than once per batch. Returns counts of
+    applied, merged and skipped changes (skipped: their parent row never
+    arrived, or they clash with a unique column).
+    """
+    previous = get_state(conn, "origin")
+    set_state(conn, "origin", relay_as)
+    stats = {"applied": 0, "merged": 0, "skipped": 0}
+    price_days = []
+    try:
+        for change in changes:
+            table = change["table"]
+            if table == "likes":
+                applied = _apply_like(conn, node, change)
+            elif table == "prices":
+                price_days.append(_apply_price(conn, change))
+                applied = True
+            elif table in TABLES:
+                applied = _apply_row(conn, node, table, change, stats)
+            else:
+                applied = False
+            if applied:
+                stats["applied"] += 1
+            else:
+                stats["skipped"] += 1
+                logger.warning("Skipped %s %s %s from another replica", change["op"], table, change["key"])
+        if price_days:
+            since = min(price_days)
+            if defer_rollups:
+                pending = get_state(conn, "rollups_since")
+                set_state(conn, "rollups_since", min(since, pending) if pending else since)
+            else:
+                refresh_rollups(conn, date.fromisoformat(since))
+    finally:
+        set_state(conn, "origin", previous)
+    return stats
+
+
+# Central instance --------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    """POST /sync/push, GET /sync/pull, and photos under /sync/media."""
+
+    def _authorized(self):
+        token = self.server.token
+        if not token:
+            return True
+        sent = self.headers.get("Authorization", "")
+        return hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send(self, status, body=b"", content_type="application/json", encoding="deflate"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if encoding and body:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        if not self._authorized():
+            return self._send(401)
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        try:
+            if method == "POST" and url.path == "/sync/push":
+                return self._send(200, encode(self._push(decode(self._body()))))
+            if method == "GET" and url.path == "/sync/pull":
+                return self._send(200, encode(self._pull(parse_qs(url.query))))
+            if method == "POST" and url.path == "/sync/media/missing":
+                return self._send(200, encode({"missing": missing_media(decode(self._body())["hashes"])}))
+            if len(parts) == 3 and parts[:2] == ["sync", "media"] and _HASH.match(parts[2]):
+                return self._media(method, parts[2])
+        except (ValueError, KeyError, TypeError, zlib.error):
+            return self._send(400)
+        except sqlite3.Error:
+            logger.exception("Sync request %s %s failed", method, url.path)
+            return self._send(503)
+        self._send(404)
+
+    def _push(self, request):
+        node = request["node"]
+        if not node or node == CENTRAL:
+            raise ValueError("bad node name")
+        with self.server.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return apply_changes(conn, CENTRAL, request["changes"], relay_as=node)
+
+    def _pull(self, query):
+        node = query["node"][0]
+        after = int(query.get("after", ["0"])[0])
+        limit = min(int(query.get("limit", [BATCH_SIZE])[0]), MAX_BATCH_SIZE)
+        with self.server.pool.connection() as conn:
+            changes, cursor, more = collect(conn, CENTRAL, after, limit, exclude=node)
+        return {"changes": changes, "cursor": cursor, "more": more}
+
+    def _media(self, method, image_hash):
+        if method == "GET":
+            try:
+                with open(images.image_path(image_hash), "rb") as f:
+                    return self._send(200, f.read(), "application/octet-stream", encoding=None)
+            except FileNotFoundError:
+                return self._send(404)
+        if method == "PUT":
+            data = self._body()
+            if hashlib.sha256(data).hexdigest() != image_hash:
+                return self._send(400)
+            images.store_image(data)
+            return self._send(204)
+        self._send(405)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(path, port, host="127.0.0.1", token=TOKEN):
+    """Serve the central instance for path on a daemon thread; returns the server.
+
+    Raises ValueError without a token unless host is a loopback address.
+    """
+    if not token and not _loopback(host):
+        raise ValueError(f"Set KRISHI_SYNC_TOKEN before serving on {host}: "
+                         "every account's password hash is readable and writable through sync")
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.pool = ConnectionPool(path, size=4)
+    server.token = token
+    with server.pool.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        enable(conn, CENTRAL)
+    threading.Thread(target=server.serve_forever, name="sync-http", daemon=True).start()
+    return server
+
+
+# Kiosk -------------------------------------------------------------------------
+
+class Syncer:
+    """Pushes this replica's changes and pulls everyone else's, every interval.
+
+    sync() runs one round on the calling thread; start() runs rounds on a
+    daemon thread. online is None until the first round, then whether the
+    last round reached the central instance.
+    """
+
+    def __init__(self, pool, url=SYNC_URL, node=NODE, token=TOKEN, interval=INTERVAL,
+                 batch_size=BATCH_SIZE, timeout=TIMEOUT, on_online=None):
+        if not node or node == CENTRAL:
+            raise ValueError("Set KRISHI_SYNC_NODE to a name unique to this kiosk")
+        self.pool = pool
+        self.url = url.rstrip("/")
+        self.node = node
+        self.token = token
+        self.interval = interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.on_online = on_online
+        self.online = None
+        self.last_sync = None
+        self.last_error = None
+        self._round = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        with pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            enable(conn, node)
+
+    def _request(self, method, path, payload=None, data=None):
+        headers = {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if payload is not None:
+            data = encode(payload)
+            headers["Content-Encoding"] = "deflate"
+            metrics.REGISTRY.inc("sync_bytes", "sent", len(data))
+            metrics.REGISTRY.inc("sync_bytes", "sent_uncompressed", len(json.dumps(payload, separators=(",", ":"))))
+        elif data is not None:
+            metrics.REGISTRY.inc("sync_bytes", "photos_sent", len(data))
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = response.read()
+            encoding = response.headers.get("Content-Encoding")
+        if encoding != "deflate":
+            metrics.REGISTRY.inc("sync_bytes", "photos_received", len(body))
+            return body
+        metrics.REGISTRY.inc("sync_bytes", "received", len(body))
+        try:
+            result = decode(body)
+        except (ValueError, zlib.error) as e:
+            raise SyncError(f"Unreadable response to {path}: {e}") from None
+        metrics.REGISTRY.inc("sync_bytes", "received_uncompressed", len(json.dumps(result, separators=(",", ":"))))
+        return result
+
+    def pending(self):
+        """Local changes not pushed yet."""
+        with self.pool.connection() as conn:
+            after = get_state(conn, "pushed", 0)
+            row = conn.execute("SELECT COUNT(*) FROM changelog WHERE seq > ? AND origin = ?",
+                               (after, self.node)).fetchone()
+        return row[0]
+
+    def push(self):
+        """Send local changes batch by batch; returns how many were sent."""
+        sent = 0
+        while True:
+            with self.pool.connection() as conn:
+                after = get_state(conn, "pushed", 0)
+                changes, cursor, more = collect(conn, self.node, after, self.batch_size, origin=self.node)
+            if cursor == after:
+                return sent
+            with metrics.timer("sync", "push"):
+                hashes = media_hashes(changes)
+                lost = set()
+                if hashes:
+                    for image_hash in self._request("POST", "/sync/media/missing", {"hashes": hashes})["missing"]:
+                        try:
+                            with open(images.image_path(image_hash), "rb") as f:
+                                self._request("PUT", f"/sync/media/{image_hash}", data=f.read())
+                        except FileNotFoundError:
+                            logger.warning("Photo %s is referenced but not in the image store", image_hash)
+                            lost.add(image_hash)
+                drop_media(changes, lost)
+                if changes:
+                    self._request("POST", "/sync/push", {"node": self.node, "changes": changes})
+            with self.pool.connection() as conn:
+                set_state(conn, "pushed", cursor)
+                # The central instance keeps the log other kiosks pull from; this copy is done
+                conn.execute("DELETE FROM changelog WHERE seq <= ? AND origin = ?", (cursor, self.node))
+            sent += len(changes)
+            if not more:
+                return sent
+
+    def pull(self):
+        """Fetch and apply everyone else's changes batch by batch; returns how many were applied."""
+        applied = 0
+        while True:
+            with self.pool.connection() as conn:
+                after = get_state(conn, "pulled", 0)
+            with metrics.timer("sync", "pull"):
+                batch = self._request("GET", f"/sync/pull?node={quote(self.node)}"
+                                             f"&after={after}&limit={self.batch_size}")
+                # Photos first, so no row is stored before its photo
+                lost = set()
+                for image_hash in missing_media(media_hashes(batch["changes"])):
+                    try:
+                        data = self._request("GET", f"/sync/media/{image_hash}")
+                    except urllib.error.HTTPError as e:
+                        if e.code != 404:
+                            raise
+                        # Lost on the replica it came from; waiting would not bring it back
+                        logger.warning("Photo %s is missing on the central instance", image_hash)
+                        lost.add(image_hash)
+                        continue
+                    if hashlib.sha256(data).hexdigest() != image_hash:
+                        raise SyncError(f"Photo {image_hash} arrived corrupted")
+                    images.store_image(data)
+                drop_media(batch["changes"], lost)
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                stats = apply_changes(conn, self.node, batch["changes"], defer_rollups=True)
+                set_state(conn, "pulled", batch["cursor"])
+            applied += stats["applied"]
+            if not batch["more"]:
+                break
+        with self.pool.connection() as conn:
+            refresh_deferred_rollups(conn)
+        return applied
+
+    def sync(self):
+        """One round: push, then pull. Returns (pushed, pulled), or None if the link is down."""
+        with self._round:
+            was_online = self.online
+            try:
+                result = self.push(), self.pull()
+            except (OSError, http.client.HTTPException, SyncError) as e:
+                # URLError and socket timeouts are OSErrors; HTTPError means the server answered
+                self.online = isinstance(e, urllib.error.HTTPError)
+                self.last_error = str(e)
+                logger.warning("Sync with %s failed: %s", self.url, e)
+                return None
+            self.online = True
+            self.last_error = None
+            self.last_sync = time.time()
+            if not was_online and self.on_online is not None:
+                self.on_online()
+            return result
+
+    def status(self):
+        return {"node": self.node, "url": self.url, "online": self.online, "last_sync": self.last_sync,
+                "last_error": self.last_error, "pending": self.pending()}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sync", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def nudge(self):
+        """Sync now rather than at the end of the interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Sync round failed; retrying next interval")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replicate farm.db between kiosks and a central instance.")
+    parser.add_argument("--db", default=DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the central instance")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    once_parser = commands.add_parser("once", help="push and pull once, then exit")
+    once_parser.add_argument("--url", default=SYNC_URL)
+    once_parser.add_argument("--node", default=NODE)
+    args = parser.parse_args(argv)
+    if args.command == "serve" and not TOKEN and not _loopback(args.host):
+        parser.error(f"set KRISHI_SYNC_TOKEN before serving on {args.host}")
+
+    from migrations import migrate
+
+    conn = connect(args.db)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+    if args.command == "serve":
+        server = serve(args.db, args.port, args.host)
+        print(f"Serving {args.db} on http://{args.host}:{server.server_address[1]}/sync", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    if not args.url:
+        parser.error("set --url or KRISHI_SYNC_URL")
+    pool = ConnectionPool(args.db, size=2)
+    result = Syncer(pool, args.url, args.node).sync()
+    if result is None:
+        print("Could not reach the central instance", file=sys.stderr)
+        return 1
+    print(f"Pushed {result[0]} changes, pulled {result[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Server-side text to speech with a disk cache of synthesized clips.
+
+Speech is synthesized locally with espeak-ng (or pyttsx3 when espeak-ng is
+not on PATH), so voice quality and language support no longer depend on
+the farmer's phone. Clips are WAV files named by a hash of
+(language, rate, text) under KRISHI_TTS_DIR, and the directory is kept
+under max_bytes by evicting the least recently played clips.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None
+
+from images import MEDIA_DIR
+
+TTS_DIR = os.getenv("KRISHI_TTS_DIR", os.path.join(MEDIA_DIR, "tts"))
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# Words per minute; a little slower than the engine default for clarity
+DEFAULT_RATE = int(os.getenv("KRISHI_TTS_RATE", 140))
+
+# language -> espeak-ng voice
+VOICES = {
+    "en": "en-us",
+    "hi": "hi",
+    "mr": "mr",
+}
+
+_DEVANAGARI = re.compile(r"[ऀ-ॿ]")
+# Markdown emphasis and headings would otherwise be read out
+_MARKUP = re.compile(r"[*_#`>|]+")
+
+
+class TTSUnavailable(RuntimeError):
+    pass
+
+
+def detect_language(text):
+    """Hindi for Devanagari text, English otherwise; Marathi must be chosen explicitly."""
+    return "hi" if _DEVANAGARI.search(text) else "en"
+
+
+def clean_text(text):
+    return " ".join(_MARKUP.sub(" ", text).split())
+
+
+def clip_key(text, language, rate):
+    return hashlib.sha256(f"{language}\x00{rate}\x00{text}".encode()).hexdigest()
+
+
+def _espeak(text, language, rate, path):
+    engine = shutil.which("espeak-ng") or shutil.which("espeak")
+    if not engine:
+        return False
+    subprocess.run([engine, "-v", VOICES[language], "-s", str(rate), "-w", path, "--stdin"],
+                   input=text.encode(), check=True, capture_output=True, timeout=60)
+    return True
+
+
+# pyttsx3 drives one process-wide engine loop
+_pyttsx3_lock = threading.Lock()
+
+
+def _pyttsx3(text, language, rate, path):
+    if pyttsx3 is None:
+        return False
+    with _pyttsx3_lock:
+        engine = pyttsx3.init()
+        voices = [v for v in engine.getProperty("voices")
+                  if any(language in str(code).lower() for code in [v.id, *(v.languages or [])])]
+        if voices:
+            engine.setProperty("voice", voices[0].id)
+        engine.setProperty("rate", rate)
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+    return True
+
+
+ENGINES = (_espeak, _pyttsx3)
+
+
+class SpeechCache:
+    """Synthesize speech once per (text, language, rate) and keep the clips on disk."""
+
+    def __init__(self, directory=TTS_DIR, max_bytes=DEFAULT_MAX_BYTES, rate=DEFAULT_RATE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory)
+                         if entry.name.endswith(".wav"))
+
+    def path(self, text, language, rate):
+        return os.path.join(self.directory, f"{clip_key(text, language, rate)}.wav")
+
+    def synthesize(self, text, language=None, rate=None):
+        """Return the path of a WAV clip speaking text, synthesizing it on a cache miss."""
+        text = clean_text(text)
+        language = language if language in VOICES else detect_language(text)
+        rate = rate or self.rate
+        path = self.path(text, language, rate)
+
+        # One synthesis per clip even when several sessions press Listen at once
+        with self._lock:
+            clip_lock = self._inflight.setdefault(path, threading.Lock())
+        try:
+            with clip_lock:
+                try:
+                    # The modification time doubles as the last-played time for eviction
+                    os.utime(path)
+                    return path
+                except FileNotFoundError:
+                    pass
+                self._render(text, language, rate, path)
+        finally:
+            with self._lock:
+                self._inflight.pop(path, None)
+        with self._lock:
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _render(self, text, language, rate, path):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            for engine in ENGINES:
+                if engine(text, language, rate, tmp):
+                    break
+            else:
+                raise TTSUnavailable("no speech engine installed (install espeak-ng or pyttsx3)")
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _evict(self, keep):
+        """Delete least recently played clips until the cache is back under max_bytes."""
+        clips = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(self.directory) if entry.name.endswith(".wav"))
+        self._size = sum(size for _, size, _ in clips)
+        for _, size, path in clips:
+            if self._size <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
@@ -0,0 +1,36 @@
+"""Page registry for the signed-in app.
+
+Each page lives in its own module with a show() function and is imported
+the first time it is routed to, so a rerun only loads the page on screen.
+(Not named `pages/`, which Streamlit would treat as a multipage app.)
+"""
+import importlib
+
+import metrics
+
+# page key -> (sidebar label, module)
+PAGES = {
+    "dashboard": ("🏠 Dashboard", "views.dashboard"),
+    "assistant": ("🤖 AI Assistant", "views.assistant"),
+    "analysis": ("📷 Crop Analysis", "views.analysis"),
+    "community": ("👥 Community", "views.community"),
+    "products": ("🛒 Marketplace", "views.products"),
+    "schemes": ("📜 Schemes", "views.schemes"),
+    "prices": ("💰 Market Prices", "views.market_prices"),
+    "debug": ("🛠 Debug", "views.debug"),
+}
+DEFAULT_PAGE = "dashboard"
+# Only listed and routed for users in KRISHI_ADMINS
+ADMIN_PAGES = {"debug"}
+
+
+def render(page, admin=False):
+    """Import the page's module on first use and draw it, timing the render.
+
+    Unknown pages, and admin pages for other users, show the dashboard.
+    """
+    if page not in PAGES or (page in ADMIN_PAGES and not admin):
+        page = DEFAULT_PAGE
+    _, module_name = PAGES[page]
+    with metrics.timer("page", page):
+        importlib.import_module(module_name).show()
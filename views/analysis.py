@@ -0,0 +1,67 @@
+"""Crop photo diagnosis."""
+import time
+
+import streamlit as st
+
+from images import prepare_image
+from jobs import image_hash, PENDING, RUNNING, DONE, QUEUED
+from services import get_analysis_jobs, start_outbox
+from views.widgets import speak_text, t
+
+
+ANALYSIS_PROMPT = """Analyze this crop image. Identify:
+                1. The crop type
+                2. Any visible diseases or problems
+                3. Specific treatment recommendations (prefer organic methods)
+                4. Prevention tips
+                Be specific and practical for farmers."""
+
+QUEUED_NOTICE = ("📴 No connection right now. Your photo is saved and will be analyzed when the "
+                 "connection returns; the result will appear on this page.")
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("📷 Crop Analysis")}</h1>', unsafe_allow_html=True)
+    
+    uploaded_file = st.file_uploader(t("Upload a photo of your crop"), type=['jpg', 'jpeg', 'png'])
+    
+    # Jobs are keyed by image hash, so a photo analyzed before shows its stored result
+    jobs = get_analysis_jobs()
+    if uploaded_file is not None:
+        # Downscaled, upright JPEG used for both the preview and the model. Preparing a
+        # 12 MP photo takes ~0.3 s, so it is done once per upload, not on every polling rerun
+        prepared = st.session_state.get('analysis_upload')
+        if prepared is None or prepared[0] != uploaded_file.file_id:
+            _, image_bytes = prepare_image(uploaded_file.getvalue())
+            prepared = st.session_state.analysis_upload = (uploaded_file.file_id, image_bytes)
+        image_bytes = prepared[1]
+        st.image(image_bytes, caption=t("Uploaded Image"), use_column_width=True)
+        job_id = image_hash(image_bytes)
+    else:
+        # The upload is gone once the farmer leaves the page; the last photo sent is followed up here
+        job_id = st.session_state.get('analysis_job')
+        if job_id is None:
+            return
+    job = jobs.status(job_id)
+    
+    if job is None or job['status'] not in (PENDING, RUNNING, DONE, QUEUED):
+        if uploaded_file is not None and st.button(t("Analyze Crop"), use_container_width=True):
+            st.session_state.analysis_job = jobs.submit(image_bytes, ANALYSIS_PROMPT)
+            st.rerun()
+        if job is not None:
+            st.error(t("Analysis failed: {error}").format(error=job['error']))
+    elif job['status'] == QUEUED:
+        # Analyzed in the background once the model is reachable again
+        start_outbox()
+        st.info(t(QUEUED_NOTICE))
+    elif job['status'] == DONE:
+        st.success(t("Analysis Complete!"))
+        st.markdown(f"### {t('Results')}:\n{job['result']}")
+        
+        if st.button(t("🔊 Listen to Results")):
+            speak_text(job['result'])
+    else:
+        # Poll until the background job finishes
+        with st.spinner(t("Analyzing your crop...")):
+            time.sleep(1)
+        st.rerun()
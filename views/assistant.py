@@ -0,0 +1,174 @@
+"""AI farming assistant chat."""
+import logging
+import os
+
+import streamlit as st
+
+from i18n import DEFAULT_LANGUAGE
+from model_client import ModelBusy, ModelOffline
+from services import get_answer_cache, get_conversations, get_model, get_outbox, get_translator, start_outbox
+from views.widgets import fragment, language, speak_text, stream_answer, t
+
+logger = logging.getLogger(__name__)
+
+# Bump when the assistant prompt changes so stale cached answers are not reused
+ASSISTANT_PROMPT_VERSION = "3"
+ASSISTANT_PROMPT = """You are Krishi Mitra, an expert farming assistant for Indian farmers. 
+                {context}
+                Answer this question in simple, practical language: {question}
+                Provide specific, actionable advice.
+                Answer in English; the answer is translated for the farmer separately."""
+
+# Shown when the model is at its request quota, instead of the generic apology
+BUSY_ANSWER = "Many farmers are asking questions right now. Please ask again in a minute."
+# Shown while a question waits in the outbox for the model to be reachable
+QUEUED_NOTICE = "📴 No connection right now. Your question is saved and will be answered here when the connection returns."
+
+# Show answers token by token as they arrive; set KRISHI_STREAM_ANSWERS=0 to wait for the full text
+STREAM_ANSWERS = os.getenv("KRISHI_STREAM_ANSWERS", "1") != "0"
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("🤖 AI Farming Assistant")}</h1>', unsafe_allow_html=True)
+    chat_panel()
+
+
+def _new_chat():
+    st.session_state.conversation_id = None
+    st.session_state.history_pages = 1
+
+
+def _show_earlier():
+    st.session_state.history_pages += 1
+
+
+def _translate(content, lang):
+    get_translator().translate(content, lang)
+
+
+def _send():
+    # Taken out of the input box here, so the box is empty when the answer is drawn
+    st.session_state.pending_question = st.session_state.chat_input
+    st.session_state.chat_input = ""
+
+
+def _message(msg, lang, translator):
+    if msg['role'] == 'user':
+        st.markdown(f'<div class="chat-message user-message"><b>{t("You")}:</b> {msg["content"]}</div>', unsafe_allow_html=True)
+        return
+    content = translator.lookup(msg['content'], lang) or msg['content']
+    st.markdown(f'<div class="chat-message ai-message"><b>{t("Assistant")}:</b> {content}</div>', unsafe_allow_html=True)
+    if st.button(t("🔊 Listen"), key=f"tts_{msg['id']}"):
+        speak_text(content)
+    if lang != DEFAULT_LANGUAGE and content == msg['content']:
+        st.button(t("🌐 Translate"), key=f"translate_{msg['id']}", on_click=_translate, args=(msg['content'], lang))
+
+
+def _answer(conversation_id, question, lang, translator):
+    """Store question, show the answer as it arrives and return the stored answer message."""
+    conversations = get_conversations()
+    user_id = st.session_state.user_id
+    if conversation_id is None:
+        conversation_id = conversations.start(user_id, title=question[:80])
+        st.session_state.conversation_id = conversation_id
+    # Summary plus the latest turns, built before this question is stored
+    context = conversations.context(conversation_id, user_id, question)
+    message_id = conversations.add_message(conversation_id, user_id, "user", question)
+    _message({'id': message_id, 'role': 'user', 'content': question}, lang, translator)
+    
+    # Only opening questions are answered from the cache; follow-ups depend on the context
+    answer_cache = get_answer_cache()
+    answer = answer_cache.get(question, ASSISTANT_PROMPT_VERSION) if not context else None
+    placeholder = st.empty()
+    if answer is None:
+        prompt = ASSISTANT_PROMPT.format(context=context, question=question)
+        try:
+            if STREAM_ANSWERS:
+                answer = stream_answer(prompt, placeholder)
+            else:
+                response = get_model().generate_content(prompt)
+                answer = response.text
+            if not context:
+                answer_cache.put(question, ASSISTANT_PROMPT_VERSION, answer)
+        except ModelBusy:
+            answer = BUSY_ANSWER
+        except ModelOffline:
+            # Answered in the background by answer_queued once the model is reachable
+            get_outbox().enqueue("assistant", {"conversation_id": conversation_id, "user_id": user_id,
+                                               "question": question, "context": context, "lang": lang},
+                                 ref=str(conversation_id))
+            start_outbox()
+            placeholder.info(t(QUEUED_NOTICE))
+            return
+        except Exception:
+            logger.exception("Assistant model call failed")
+            answer = "I apologize, but I'm having trouble connecting right now. Please try again in a moment."
+    
+    # Saved only once the stream has finished
+    message_id = conversations.add_message(conversation_id, user_id, "assistant", answer)
+    conversations.schedule_summary(conversation_id)
+    # One translation per answer, shared by every user who gets the same answer
+    if lang != DEFAULT_LANGUAGE:
+        with st.spinner(t("Translating...")):
+            try:
+                translator.translate(answer, lang)
+            except Exception:
+                pass  # Shown in English with a Translate button instead
+    # The streamed text is replaced by the finished message with its buttons
+    with placeholder.container():
+        _message({'id': message_id, 'role': 'assistant', 'content': answer}, lang, translator)
+
+
+def answer_queued(model, conversations, answer_cache, translator, payload):
+    """Outbox handler: answer a question asked while offline and add the answer to its conversation."""
+    question, context = payload["question"], payload["context"]
+    answer = answer_cache.get(question, ASSISTANT_PROMPT_VERSION) if not context else None
+    if answer is None:
+        answer = model.generate_content(ASSISTANT_PROMPT.format(context=context, question=question)).text
+        if not context:
+            answer_cache.put(question, ASSISTANT_PROMPT_VERSION, answer)
+    conversations.add_message(payload["conversation_id"], payload["user_id"], "assistant", answer)
+    conversations.schedule_summary(payload["conversation_id"])
+    if payload["lang"] != DEFAULT_LANGUAGE:
+        try:
+            translator.translate(answer, payload["lang"])
+        except Exception:
+            pass  # Shown in English with a Translate button instead
+
+
+@fragment
+def chat_panel():
+    """History, answer and input; sending a question reruns only this panel."""
+    conversations = get_conversations()
+    if 'conversation_id' not in st.session_state:
+        st.session_state.conversation_id = conversations.latest(st.session_state.user_id)
+        st.session_state.history_pages = 1
+    conversation_id = st.session_state.conversation_id
+    
+    if conversation_id:
+        st.button(t("➕ New chat"), key="new_chat", on_click=_new_chat)
+    
+    # Display the newest page of the conversation
+    messages, has_older = [], False
+    if conversation_id:
+        messages, has_older = conversations.history(conversation_id, st.session_state.user_id,
+                                                    st.session_state.history_pages)
+    if has_older:
+        st.button(t("Show earlier messages"), key="earlier_messages", on_click=_show_earlier)
+    # Answers are stored in English and shown in the session's language when a translation exists
+    lang = language()
+    translator = get_translator()
+    for msg in messages:
+        _message(msg, lang, translator)
+    if conversation_id and get_outbox().waiting("assistant", str(conversation_id)):
+        st.info(t(QUEUED_NOTICE))
+    
+    question = st.session_state.pop('pending_question', "")
+    if question:
+        _answer(conversation_id, question, lang, translator)
+    
+    # Input
+    st.text_input(t("Ask your farming question..."), key="chat_input")
+    col1, col2 = st.columns([6, 1])
+    with col2:
+        st.button(t("Send"), key="send", use_container_width=True, on_click=_send)
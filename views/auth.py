@@ -0,0 +1,101 @@
+"""Login and registration pages."""
+import os
+import sqlite3
+from concurrent.futures import TimeoutError as HashTimeout
+
+import streamlit as st
+
+from credentials import needs_rehash
+from services import get_db, get_password_verifier
+from views.widgets import t
+
+# Contacts (email or mobile) that may open the debug page, comma-separated
+ADMINS = frozenset(filter(None, (c.strip() for c in os.getenv("KRISHI_ADMINS", "").split(","))))
+
+# Shown when the password workers are all busy; this is not a failed login
+BUSY_MESSAGE = "Many farmers are signing in right now. Please try again in a moment."
+
+
+def login_page():
+    st.markdown('<h1 class="main-header">🌾 Krishi Mitra</h1>', unsafe_allow_html=True)
+    st.markdown(f'<p class="sub-header">{t("AI-Powered Farming Assistant")}</p>', unsafe_allow_html=True)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.markdown(f"### {t('Login')}")
+        contact = st.text_input(t("Email or Mobile Number"), key="login_contact")
+        password = st.text_input(t("Password"), type="password", key="login_password")
+
+        if st.button(t("Login"), use_container_width=True):
+            verifier = get_password_verifier()
+            with get_db() as conn:
+                user = conn.execute("SELECT id, name, password FROM users WHERE contact = ?",
+                                   (contact,)).fetchone()
+            try:
+                ok = verifier.verify(password, user['password'] if user else None)
+            except HashTimeout:
+                st.warning(t(BUSY_MESSAGE))
+            else:
+                if ok and needs_rehash(user['password']):
+                    # Upgrade legacy SHA-256 and outdated scrypt parameters on a successful login
+                    try:
+                        upgraded = verifier.hash(password)
+                    except HashTimeout:
+                        pass  # Upgraded on a later login
+                    else:
+                        with get_db() as conn:
+                            conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                                        (upgraded, user['id'], user['password']))
+
+                if ok:
+                    st.session_state.user_id = user['id']
+                    st.session_state.user_name = user['name']
+                    st.session_state.is_admin = contact in ADMINS
+                    st.rerun()
+                else:
+                    st.error(t("Invalid credentials"))
+
+        if st.button(t("Create Account"), use_container_width=True):
+            st.session_state.page = 'register'
+            st.rerun()
+
+
+def register_page():
+    st.markdown('<h1 class="main-header">🌾 Krishi Mitra</h1>', unsafe_allow_html=True)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.markdown(f"### {t('Create Account')}")
+        name = st.text_input(t("Full Name"))
+        contact = st.text_input(t("Email or Mobile Number"))
+        password = st.text_input(t("Password"), type="password")
+        confirm_password = st.text_input(t("Confirm Password"), type="password")
+
+        if st.button(t("Register"), use_container_width=True):
+            if password != confirm_password:
+                st.error(t("Passwords don't match"))
+                return
+
+            try:
+                password_hash = get_password_verifier().hash(password)
+            except HashTimeout:
+                st.warning(t(BUSY_MESSAGE))
+                return
+            try:
+                with get_db() as conn:
+                    c = conn.cursor()
+                    c.execute("INSERT INTO users (name, contact, password) VALUES (?, ?, ?)",
+                             (name, contact, password_hash))
+                    user_id = c.lastrowid
+            except sqlite3.IntegrityError:
+                st.error(t("Contact already registered"))
+            else:
+                st.session_state.user_id = user_id
+                st.session_state.user_name = name
+                st.session_state.is_admin = contact in ADMINS
+                st.success(t("Account created successfully!"))
+                st.rerun()
+
+        if st.button(t("Back to Login"), use_container_width=True):
+            st.session_state.page = 'home'
+            st.rerun()
@@ -0,0 +1,193 @@
+"""Farmer community feed, posts, likes and comments."""
+import os
+
+import streamlit as st
+
+import search
+from feed import (fetch_feed_page, fetch_newer, latest_post_id, load_comment_counts, load_comments,
+                  load_like_counts)
+from images import store_image, thumbnail_path
+from likes import like_post, liked_post_ids
+from services import get_db, get_like_buffer
+from views.widgets import fragment, search_pages, more_results_button, t
+
+
+# Under heavy like traffic set KRISHI_LIKE_WRITE_BEHIND=1 to batch like writes
+LIKE_WRITE_BEHIND = os.getenv("KRISHI_LIKE_WRITE_BEHIND") == "1"
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("👥 Farmer Community")}</h1>', unsafe_allow_html=True)
+    
+    # Create post
+    with st.expander(t("Create New Post")):
+        content = st.text_area(t("Share your experience..."))
+        post_image = st.file_uploader(t("Add Image (optional)"), type=['jpg', 'jpeg', 'png'], key="post_img")
+        
+        if st.button(t("Post"), use_container_width=True):
+            image_hash = None
+            if post_image:
+                image_hash = store_image(post_image.getvalue())
+            
+            with get_db() as conn:
+                conn.execute("INSERT INTO posts (user_id, content, image_hash) VALUES (?, ?, ?)",
+                            (st.session_state.user_id, content, image_hash))
+            st.success(t("Posted successfully!"))
+            st.rerun()
+    
+    # Search
+    query = st.text_input(t("🔍 Search posts and comments"), key="community_search").strip()
+    if query:
+        pages = search_pages("community_search", query)
+        with get_db() as conn:
+            posts, more_posts = search.search_posts(conn, query, page_size=pages * search.PAGE_SIZE)
+            comments, more_comments = search.search_comments(conn, query, page_size=pages * search.PAGE_SIZE)
+        
+        if not posts and not comments:
+            st.info(t("No posts or comments match your search."))
+        for post in posts:
+            st.markdown(f"### {post['author']}")
+            st.markdown(f"*{post['created_at']}* · ❤️ {post['likes']}")
+            st.markdown(post['content'])
+            st.markdown("---")
+        if comments:
+            st.markdown(f"#### {t('In comments')}")
+            for comment in comments:
+                st.markdown(f"**{comment['author']}:** {comment['content']}")
+        more_results_button("community_search", more_posts or more_comments)
+        return
+    
+    # Display posts
+    if 'open_comments' not in st.session_state:
+        st.session_state.open_comments = set()
+    
+    with get_db() as conn:
+        posts = _refresh_feed(conn)
+        post_ids = [post['id'] for post in posts]
+        like_counts = load_like_counts(conn, post_ids)
+        comment_counts = load_comment_counts(conn, post_ids)
+        # Comment bodies are only loaded for posts whose comments were opened
+        comments_by_post = load_comments(conn, [pid for pid in post_ids if pid in st.session_state.open_comments])
+        liked = liked_post_ids(conn, st.session_state.user_id, post_ids)
+    
+    pending_likes = {}
+    if LIKE_WRITE_BEHIND:
+        like_buffer = get_like_buffer()
+        liked |= like_buffer.pending_for(st.session_state.user_id)
+        pending_likes = like_buffer.pending_counts()
+    
+    # Loaded for the whole page at once; each card then keeps its own entry up to date
+    st.session_state.feed_cards = {
+        post['id']: {**dict(post),
+                     'likes': like_counts.get(post['id'], post['likes']) + pending_likes.get(post['id'], 0),
+                     'liked': post['id'] in liked,
+                     'comment_count': comment_counts.get(post['id'], 0),
+                     'comments': comments_by_post.get(post['id'])}
+        for post in posts
+    }
+    for post_id in post_ids:
+        post_card(post_id)
+    
+    if st.session_state.feed_cursor is not None:
+        st.button(t("Load more"), use_container_width=True, on_click=_load_more)
+
+
+def _refresh_feed(conn):
+    """Posts loaded so far, with any stored since merged in.
+
+    Loaded posts, the cursor after the last one and the last post id seen
+    are kept in the session, so a rerun costs one query for new posts
+    whatever the number of pages.
+    """
+    posts = st.session_state.get('feed_posts')
+    if posts:
+        newer, complete = fetch_newer(conn, st.session_state.feed_head)
+        if complete:
+            if newer:
+                st.session_state.feed_head = newer[-1]['id']
+                cursor = st.session_state.feed_cursor
+                shown = {post['id'] for post in posts}
+                # Synced posts can be older than the top of the feed; ones past the
+                # last loaded post come with Load more instead
+                posts.extend(dict(post) for post in newer if post['id'] not in shown and
+                             (cursor is None or (post['created_at'], post['id']) > tuple(cursor)))
+                posts.sort(key=lambda post: (post['created_at'], post['id']), reverse=True)
+            return posts
+    # Read before the page, so a post stored in between is picked up on the next rerun
+    st.session_state.feed_head = latest_post_id(conn)
+    page, cursor = fetch_feed_page(conn)
+    st.session_state.feed_posts = [dict(post) for post in page]
+    st.session_state.feed_cursor = cursor
+    return st.session_state.feed_posts
+
+
+def _load_more():
+    with get_db() as conn:
+        page, cursor = fetch_feed_page(conn, st.session_state.feed_cursor)
+    st.session_state.feed_posts.extend(dict(post) for post in page)
+    st.session_state.feed_cursor = cursor
+
+
+def _like(post_id):
+    card = st.session_state.feed_cards[post_id]
+    if LIKE_WRITE_BEHIND:
+        added = get_like_buffer().add(post_id, st.session_state.user_id)
+    else:
+        with get_db() as conn:
+            added = like_post(conn, post_id, st.session_state.user_id)
+    # Nothing was stored for a repeated like, so the card stays as it is
+    if added:
+        card['likes'] += 1
+        card['liked'] = True
+
+
+def _load_card_comments(post_id):
+    card = st.session_state.feed_cards[post_id]
+    with get_db() as conn:
+        card['comments'] = load_comments(conn, [post_id])[post_id]
+    card['comment_count'] = len(card['comments'])
+    st.session_state.open_comments.add(post_id)
+
+
+def _add_comment(post_id):
+    content = st.session_state.get(f"comment_{post_id}", "")
+    with get_db() as conn:
+        conn.execute("INSERT INTO comments (post_id, user_id, content) VALUES (?, ?, ?)",
+                   (post_id, st.session_state.user_id, content))
+    st.session_state[f"comment_{post_id}"] = ""
+    _load_card_comments(post_id)
+
+
+@fragment
+def post_card(post_id):
+    """One feed card; a like or comment reruns only this card."""
+    post = st.session_state.feed_cards[post_id]
+    with st.container():
+        st.markdown(f"### {post['author']}")
+        st.markdown(f"*{post['created_at']}*")
+        st.markdown(post['content'])
+        
+        # None when the photo never reached this replica
+        thumb = thumbnail_path(post['image_hash']) if post['image_hash'] else None
+        if thumb:
+            st.image(thumb, use_column_width=True)
+        
+        # Like button
+        col1, col2 = st.columns([1, 10])
+        with col1:
+            st.button(f"{'❤️' if post['liked'] else '🤍'} {post['likes']}", key=f"like_{post_id}",
+                      disabled=post['liked'], on_click=_like, args=(post_id,))
+        
+        # Comments
+        with st.expander(t("💬 Comments ({count})").format(count=post['comment_count'])):
+            if post['comments'] is not None:
+                for comment in post['comments']:
+                    st.markdown(f"**{comment['author']}:** {comment['content']}")
+            elif post['comment_count']:
+                st.button(t("Show comments"), key=f"show_comments_{post_id}",
+                          on_click=_load_card_comments, args=(post_id,))
+            
+            st.text_input(t("Add comment..."), key=f"comment_{post_id}")
+            st.button(t("Post Comment"), key=f"btn_comment_{post_id}", on_click=_add_comment, args=(post_id,))
+        
+        st.markdown("---")
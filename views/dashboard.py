@@ -0,0 +1,55 @@
+"""Dashboard with shortcuts to the main features."""
+import streamlit as st
+
+from views.widgets import t
+
+
+def _open(page):
+    # Set before the rerun the click starts, so the new page is drawn in that same run
+    st.session_state.page = page
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("Dashboard")}</h1>', unsafe_allow_html=True)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.markdown(f"""
+        <div class="feature-card" onclick="window.location.href='#assistant'">
+            <h2>🤖</h2>
+            <h3>{t("AI Assistant")}</h3>
+            <p>{t("Get farming advice")}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        st.button(t("Open Assistant"), key="btn_assistant", on_click=_open, args=("assistant",))
+    
+    with col2:
+        st.markdown(f"""
+        <div class="feature-card">
+            <h2>📷</h2>
+            <h3>{t("Crop Analysis")}</h3>
+            <p>{t("Diagnose crop issues")}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        st.button(t("Analyze Crop"), key="btn_analysis", on_click=_open, args=("analysis",))
+    
+    with col3:
+        st.markdown(f"""
+        <div class="feature-card">
+            <h2>👥</h2>
+            <h3>{t("Community")}</h3>
+            <p>{t("Connect with farmers")}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        st.button(t("View Community"), key="btn_community", on_click=_open, args=("community",))
+    
+    with col4:
+        st.markdown(f"""
+        <div class="feature-card">
+            <h2>🛒</h2>
+            <h3>{t("Marketplace")}</h3>
+            <p>{t("Buy & sell products")}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        st.button(t("Visit Market"), key="btn_products", on_click=_open, args=("products",))
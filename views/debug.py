@@ -0,0 +1,80 @@
+"""Admin-only view of this process's page, SQL, model and sync timings."""
+import time
+
+import streamlit as st
+
+import metrics
+from services import get_outbox, start_sync
+
+SQL_ROWS_SHOWN = 25
+MODEL_COUNTERS = ("requests", "coalesced", "calls", "errors", "retries", "throttled", "failures", "offline")
+# JSON batches on the wire and before zlib; photos are sent as they are
+SYNC_BYTES = ("sent", "sent_uncompressed", "received", "received_uncompressed", "photos_sent", "photos_received")
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+def _table(rows, limit=None):
+    if not rows:
+        st.caption("No samples yet.")
+        return
+    st.table([{"name": row["name"], "status": row["status"], "count": row["count"],
+               "mean ms": _ms(row["mean"]), "p50 ms": _ms(row["p50"]), "p95 ms": _ms(row["p95"]),
+               "p99 ms": _ms(row["p99"]), "max ms": _ms(row["max"])}
+              for row in rows[:limit]])
+
+
+def show():
+    st.markdown('<h1 class="main-header">🛠 Debug</h1>', unsafe_allow_html=True)
+    if not metrics.ENABLED:
+        st.info("Instrumentation is off (KRISHI_METRICS=0).")
+        return
+    st.caption(f"Percentiles over the last {metrics.RESERVOIR_SIZE} samples of each series, "
+               "for this server process only.")
+
+    st.markdown("### Pages")
+    _table(metrics.REGISTRY.summary("page"))
+    st.markdown("### Fragments")
+    _table(metrics.REGISTRY.summary("fragment"))
+
+    st.markdown("### Model calls")
+    _table(metrics.REGISTRY.summary("model") + metrics.REGISTRY.summary("model_first_chunk")
+           + metrics.REGISTRY.summary("model_wait"))
+    # requests: asked for by the app; calls: attempts sent upstream (model_client.py)
+    counters = metrics.REGISTRY.counters()
+    endpoints = sorted({name for (counter, name) in counters if counter.startswith("model_")})
+    if endpoints:
+        st.table([{"endpoint": name, **{column: counters.get((f"model_{column}", name), 0)
+                                        for column in MODEL_COUNTERS}}
+                  for name in endpoints])
+
+    st.markdown("### Sync and queued requests")
+    syncer = start_sync()
+    if syncer is None:
+        st.caption("Sync is off (KRISHI_SYNC_URL is not set).")
+    else:
+        status = syncer.status()
+        if status["last_sync"]:
+            status["last_sync"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(status["last_sync"]))
+        status["online"] = {None: "not tried yet", True: "yes", False: "no"}[status["online"]]
+        st.table([status])
+        _table(metrics.REGISTRY.summary("sync"))
+        st.table([{column: counters.get(("sync_bytes", column), 0) for column in SYNC_BYTES}])
+    # Assistant questions and photos waiting for the model (outbox.py)
+    queued = get_outbox().counts()
+    if queued:
+        st.table([{"queued model requests": status, "count": count} for status, count in sorted(queued.items())])
+
+    st.markdown(f"### Slowest SQL statements (top {SQL_ROWS_SHOWN} by p95)")
+    _table(metrics.REGISTRY.summary("sql"), SQL_ROWS_SHOWN)
+
+    with st.expander("Prometheus text"):
+        text = metrics.REGISTRY.prometheus()
+        st.code(text, language="text")
+        st.download_button("Download", text, file_name="metrics.txt", key="metrics_download")
+
+    if st.button("Reset metrics", key="metrics_reset"):
+        metrics.REGISTRY.reset()
+        st.rerun()
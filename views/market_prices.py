@@ -0,0 +1,98 @@
+"""Mandi prices and price trends."""
+from datetime import timedelta
+
+import streamlit as st
+
+import prices as price_data
+from services import get_db
+from views.widgets import fragment, t
+
+
+# Price data changes at most daily, so queries are cached across sessions
+@st.cache_data(ttl=3600)
+def get_markets():
+    with get_db() as conn:
+        return price_data.list_markets(conn)
+
+@st.cache_data(ttl=3600)
+def get_latest_price_date():
+    with get_db() as conn:
+        return price_data.latest_price_date(conn)
+
+@st.cache_data(ttl=600)
+def get_latest_prices(market, start, end):
+    with get_db() as conn:
+        return price_data.latest_prices(conn, market, start, end)
+
+@st.cache_data(ttl=600)
+def get_price_trend(market, crop, period, start, end):
+    with get_db() as conn:
+        return price_data.price_trend(conn, market, crop, period, start, end)
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("💰 Market Prices")}</h1>', unsafe_allow_html=True)
+    
+    markets = get_markets()
+    if not markets:
+        st.info(t("No market prices available yet."))
+        return
+    price_table(markets)
+
+
+@fragment
+def price_table(markets):
+    """Market and date pickers with the price table; changing them reruns only this part."""
+    col1, col2 = st.columns(2)
+    with col1:
+        market = st.selectbox(t("Select Market"), markets, key="price_market", format_func=t)
+    with col2:
+        latest = get_latest_price_date()
+        date_range = st.date_input(t("Date range"), (latest - timedelta(days=30), latest), max_value=latest,
+                                   key="price_dates")
+    if len(date_range) != 2:
+        return
+    start, end = date_range
+    
+    prices = get_latest_prices(market, start, end)
+    
+    data = []
+    for p in prices:
+        data.append({
+            t("Crop"): t(p['crop']),
+            t("Variety"): t(p['variety']),
+            t("Min Price (₹/quintal)"): f"₹{p['min_price']}",
+            t("Max Price (₹/quintal)"): f"₹{p['max_price']}",
+            t("Modal Price (₹/quintal)"): f"₹{p['modal_price']}",
+            t("Date"): p['date']
+        })
+    
+    st.table(data)
+    
+    # Trends read the precomputed rollups rather than the raw price rows
+    st.markdown(f"### {t('Price Trend')}")
+    crops = sorted({p['crop'] for p in prices})
+    if crops:
+        price_trend(market, start, end, crops)
+
+
+@fragment
+def price_trend(market, start, end, crops):
+    """Nested in price_table, so picking a crop or granularity leaves the table alone."""
+    col1, col2 = st.columns(2)
+    with col1:
+        crop = st.selectbox(t("Crop"), crops, key="price_crop", format_func=t)
+    with col2:
+        period = st.radio(t("Granularity"), ["day", "week", "month"], horizontal=True, key="price_period",
+                          format_func=lambda p: t({"day": "Daily", "week": "Weekly", "month": "Monthly"}[p]))
+    
+    trend = get_price_trend(market, crop, period, start, end)
+    st.line_chart(
+        {
+            t("Date"): [point['period_start'] for point in trend],
+            t("Min"): [point['min_price'] for point in trend],
+            t("Max"): [point['max_price'] for point in trend],
+            t("Average modal"): [point['avg_modal_price'] for point in trend],
+        },
+        x=t("Date")
+    )
@@ -0,0 +1,108 @@
+"""Organic marketplace listings, search and nearby sellers."""
+import streamlit as st
+
+import geo
+import search
+from images import store_image, thumbnail_path, CARD_THUMB_SIZE
+from services import get_db
+from views.widgets import fragment, search_pages, more_results_button, t
+
+# Cards per page of the unfiltered listing (three columns)
+LISTING_PAGE_SIZE = 30
+
+
+# Shared by every session; cleared when this process lists a product, otherwise at most a minute stale
+@st.cache_data(ttl=60)
+def get_listings(limit):
+    with get_db() as conn:
+        rows = conn.execute('''SELECT p.*, u.name as seller FROM products p 
+                               JOIN users u ON p.user_id = u.id 
+                               ORDER BY p.created_at DESC, p.id DESC LIMIT ?''', (limit + 1,)).fetchall()
+    return [dict(row) for row in rows[:limit]], len(rows) > limit
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("🛒 Organic Marketplace")}</h1>', unsafe_allow_html=True)
+    
+    # Add product
+    with st.expander(t("List Your Product")):
+        name = st.text_input(t("Product Name"))
+        description = st.text_area(t("Description"))
+        price = st.text_input(t("Price (e.g., ₹100/kg)"))
+        location = st.text_input(t("Your Location"))
+        contact = st.text_input(t("Contact Number"))
+        prod_image = st.file_uploader(t("Product Image"), type=['jpg', 'jpeg', 'png'])
+        
+        if st.button(t("List Product"), use_container_width=True):
+            image_hash = None
+            if prod_image:
+                image_hash = store_image(prod_image.getvalue())
+            
+            lat, lon = geo.geocode(location) or (None, None)
+            
+            with get_db() as conn:
+                conn.execute("""INSERT INTO products (user_id, name, description, price, location, contact, image_hash, lat, lon) 
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                            (st.session_state.user_id, name, description, price, location, contact, image_hash, lat, lon))
+            get_listings.clear()
+            st.success(t("Product listed!"))
+            st.rerun()
+    
+    listings()
+
+
+@fragment
+def listings():
+    """Search, nearby filter and product grid; searching reruns only this part of the page."""
+    # Display products, or the best matches when searching
+    query = st.text_input(t("🔍 Search products, e.g. organic turmeric near Satara"), key="product_search").strip()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        near = st.text_input(t("📍 Sellers near (village, district or pincode)"), key="product_near").strip()
+    with col2:
+        radius_km = st.select_slider(t("Within (km)"), [5, 10, 25, 50, 100, 200], value=25)
+    
+    origin = geo.geocode(near) if near else None
+    if near and origin is None:
+        st.warning(t("Couldn't find \"{place}\". Try a district name or pincode.").format(place=near))
+    
+    has_more = False
+    if query:
+        pages = search_pages("product_search", query)
+        with get_db() as conn:
+            products, has_more = search.search_products(conn, query, page_size=pages * search.PAGE_SIZE)
+    elif origin:
+        with get_db() as conn:
+            products = geo.nearby_products(conn, *origin, radius_km)
+    else:
+        pages = search_pages("product_listing", "")
+        products, has_more = get_listings(pages * LISTING_PAGE_SIZE)
+    
+    if query and not products:
+        st.info(t("No products match your search."))
+    elif origin and not products:
+        st.info(t("No sellers within {radius} km.").format(radius=radius_km))
+    
+    cols = st.columns(3)
+    for idx, product in enumerate(products):
+        with cols[idx % 3]:
+            st.markdown(f"### {product['name']}")
+            # None when the photo never reached this replica
+            thumb = thumbnail_path(product['image_hash'], CARD_THUMB_SIZE) if product['image_hash'] else None
+            if thumb:
+                st.image(thumb, use_column_width=True)
+            st.markdown(f"**{t('Price')}:** {product['price']}")
+            if origin and not query:
+                distance = t("{distance} km away").format(distance=f"{product['distance_km']:.0f}")
+                st.markdown(f"**{t('Location')}:** {product['location']} ({distance})")
+            else:
+                st.markdown(f"**{t('Location')}:** {product['location']}")
+            st.markdown(f"**{t('Seller')}:** {product['seller']}")
+            st.markdown(f"**{t('Contact')}:** {product['contact']}")
+            st.markdown(f"*{product['description']}*")
+            st.markdown("---")
+    
+    if query:
+        more_results_button("product_search", has_more)
+    elif not origin:
+        more_results_button("product_listing", has_more)
@@ -0,0 +1,93 @@
+"""Government and private scheme listings, and the schemes a farmer is eligible for."""
+import streamlit as st
+
+import schemes as scheme_data
+from services import get_db
+from views.widgets import more_results_button, search_pages, t
+
+SCHEMES_PAGE_SIZE = 20
+
+
+# Keyed on the catalog version, so any change to the schemes loads a new catalog in every process.
+# cache_resource rather than cache_data: the catalog is read-only, and cache_data would
+# unpickle a fresh copy on every rerun (about 35ms for 5,000 schemes)
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_catalog(version):
+    with get_db() as conn:
+        return scheme_data.load_catalog(conn)
+
+
+def _scheme_card(scheme):
+    with st.container():
+        # Seeded scheme text is translated in the bundled catalog
+        st.markdown(f"### {t(scheme['name'])}")
+        st.markdown(f"*{t(scheme['description'])}*")
+        st.markdown(f"**{t('Eligibility')}:** {t(scheme['eligibility'])}")
+        if scheme['states']:
+            st.markdown(f"**{t('State')}:** {', '.join(scheme['states'])}")
+        if scheme['link'] and scheme['link'] != '#':
+            st.markdown(f"[{t('Learn More')}]({scheme['link']})")
+        st.markdown("---")
+
+
+def _scheme_list(key, schemes):
+    pages = search_pages(key, "")
+    for scheme in schemes[:pages * SCHEMES_PAGE_SIZE]:
+        _scheme_card(scheme)
+    more_results_button(key, len(schemes) > pages * SCHEMES_PAGE_SIZE)
+
+
+def _option(options, value):
+    return options.index(value) if value in options else 0
+
+
+def _profile_form(catalog, profile):
+    """Farm details used for matching; returns the profile, saved when submitted."""
+    with st.expander(t("🧑‍🌾 Your farm"), expanded=not profile):
+        with st.form("farm_profile"):
+            states = ["", *scheme_data.STATES]
+            state = st.selectbox(t("State"), states, index=_option(states, profile.get('state')),
+                                 format_func=lambda s: s or "—")
+            land_ha = st.number_input(t("Land (hectares)"), min_value=0.0, step=0.1,
+                                      value=float(profile.get('land_ha') or 0.0))
+            crops = ["", *catalog.choices("crop"), "Other"]
+            crop = st.selectbox(t("Main crop"), crops, index=_option(crops, profile.get('crop')),
+                                format_func=lambda c: t(c) if c else "—")
+            categories = ["", *scheme_data.CATEGORIES]
+            category = st.selectbox(t("Category"), categories, index=_option(categories, profile.get('category')),
+                                    format_func=lambda c: c or "—")
+            if st.form_submit_button(t("Save"), use_container_width=True):
+                profile = {'state': state or None, 'land_ha': land_ha, 'crop': crop or None,
+                           'category': category or None}
+                with get_db() as conn:
+                    scheme_data.save_profile(conn, st.session_state.user_id, profile)
+    return profile
+
+
+def show():
+    st.markdown(f'<h1 class="main-header">{t("📜 Government & Private Schemes")}</h1>', unsafe_allow_html=True)
+
+    # The version is one indexed row; the catalog itself comes from the cache
+    with get_db() as conn:
+        version = scheme_data.catalog_version(conn)
+        profile = scheme_data.load_profile(conn, st.session_state.user_id)
+    catalog = get_catalog(version)
+
+    profile = _profile_form(catalog, profile)
+
+    tab1, tab2, tab3 = st.tabs([t("Eligible for you"), t("Government Schemes"), t("Private Schemes")])
+
+    with tab1:
+        if not profile:
+            st.info(t("Add your farm details above to see the schemes you are eligible for."))
+        else:
+            eligible = catalog.eligible(profile)
+            if not eligible:
+                st.info(t("No schemes match your farm details."))
+            _scheme_list("schemes_eligible", eligible)
+
+    with tab2:
+        _scheme_list("schemes_government", catalog.by_type.get('government', []))
+
+    with tab3:
+        _scheme_list("schemes_private", catalog.by_type.get('private', []))
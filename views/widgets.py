@@ -0,0 +1,80 @@
+"""Widgets shared by several pages."""
+import functools
+import subprocess
+
+import streamlit as st
+
+import metrics
+from i18n import DEFAULT_LANGUAGE
+from services import get_model, get_speech_cache, get_translator
+from tts import TTSUnavailable
+
+
+def language():
+    return st.session_state.get('language', DEFAULT_LANGUAGE)
+
+
+def t(text):
+    """UI text in the session's language; catalog lookups only, never a model call"""
+    lang = language()
+    if lang == DEFAULT_LANGUAGE:
+        return text
+    return get_translator().gettext(text, lang)
+
+
+def speak_text(text):
+    """Play text as speech synthesized on the server"""
+    try:
+        # English sessions let the voice follow the script, e.g. for an answer in Marathi
+        lang = language()
+        clip = get_speech_cache().synthesize(text, None if lang == DEFAULT_LANGUAGE else lang)
+    except (TTSUnavailable, OSError, subprocess.SubprocessError):
+        st.warning(t("Audio is not available right now"))
+        return
+    st.audio(clip, format="audio/wav")
+
+
+def stream_answer(prompt, placeholder):
+    """Render the model's answer into placeholder as it streams and return the full text"""
+    answer = ""
+    for chunk in get_model().generate_content(prompt, stream=True):
+        try:
+            answer += chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety metadata) raise on .text
+            continue
+        placeholder.markdown(f'<div class="chat-message ai-message"><b>{t("Assistant")}:</b> {answer}▌</div>', unsafe_allow_html=True)
+    return answer
+
+
+def fragment(func):
+    """st.fragment whose runs are timed as "fragment" metrics.
+
+    Widgets inside a fragment rerun only the fragment. Buttons there change
+    state through on_click callbacks, which run before the rerun, instead
+    of calling st.rerun(), which would rebuild the whole page.
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        with metrics.timer("fragment", name):
+            return func(*args, **kwargs)
+    return st.fragment(timed)
+
+
+def search_pages(key, query):
+    """Number of result pages to show for query; resets when the query changes"""
+    if st.session_state.get(f"{key}_query") != query:
+        st.session_state[f"{key}_query"] = query
+        st.session_state[f"{key}_pages"] = 1
+    return st.session_state[f"{key}_pages"]
+
+
+def _next_page(key):
+    st.session_state[f"{key}_pages"] += 1
+
+
+def more_results_button(key, has_more):
+    if has_more:
+        st.button(t("More results"), key=f"{key}_more", use_container_width=True, on_click=_next_page, args=(key,))